@@ -1,5 +1,15 @@
-from .gallery_node import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
+from .gallery_node import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS, gallery_index, directory_sessions
+from .gallery_node import extraction_cache, extraction_flight, indexed_ratings, iter_tree_entries
+from .gallery_index import apply_ratings
+from . import settings
+from . import listing
+from . import timing
+from . import archives
 import os
+import json
+import struct
+import asyncio
+import threading
 import mimetypes
 from aiohttp import web
 
@@ -7,35 +17,232 @@ from aiohttp import web
 # It might fail if running in a standalone test environment, which is fine for basic node testing but required for full functionality.
 try:
     from server import PromptServer
-    from PIL import Image
-    from io import BytesIO
+    from . import thumbnails
+    from . import http_cache
+    from . import near_duplicates
+    from .workers import PoolBusy
+    from .watcher import DirectoryWatcher
+    from .prewarm import ThumbnailWarmer
     
     routes = PromptServer.instance.routes
 
+    def _notify_changes(directory, added, removed, modified):
+        # Called from the watcher thread; send_sync hands the message to the server loop
+        directory_sessions.invalidate(directory)
+        if settings.INDEX_ENABLED:
+            gallery_index.request_scan(directory)
+        PromptServer.instance.send_sync("gravity.gallery.changes", {
+            "directory": directory,
+            "added": added,
+            "removed": removed,
+            "modified": modified,
+        })
+
+    directory_watcher = DirectoryWatcher(_notify_changes, interval=settings.WATCH_INTERVAL_MS / 1000)
+
+    @routes.post("/gravity/gallery/watch")
+    @timing.metrics.timed_route("watch")
+    async def watch_gallery_directory(request):
+        """
+        Start or renew watching a directory. Galleries call this periodically;
+        a directory nobody renews is dropped when its lease expires.
+        """
+        data = await request.json()
+        dir_path = data.get("directory", "")
+        if not dir_path or not listing.roots_exist(dir_path):
+            return web.json_response({"error": "Directory not found"}, status=404)
+        roots = listing.parse_roots(dir_path)
+        for root in roots:
+            # Archives are only re-read when their mtime changes
+            if not archives.is_archive(root):
+                directory_watcher.watch(root)
+        # Change events name the root; galleries on several roots list absolute
+        # filenames, joined with the separator
+        return web.json_response({
+            "watching": dir_path,
+            "roots": roots,
+            "separator": os.sep,
+            "lease_seconds": directory_watcher.lease_seconds,
+        })
+
     @routes.get("/gravity/gallery/list")
+    @timing.metrics.timed_route("list")
     async def get_gallery_list(request):
         dir_path = request.rel_url.query.get("directory", "")
         if not dir_path:
             return web.json_response({"error": "No directory specified", "files": []})
         
-        if not os.path.isdir(dir_path):
+        if not listing.roots_exist(dir_path):
              return web.json_response({"error": "Directory not found", "files": []})
 
-        files = []
-        valid_extensions = {".png", ".jpg", ".jpeg", ".webp"}
-        
         try:
-            for f in os.listdir(dir_path):
-                if os.path.isfile(os.path.join(dir_path, f)):
-                    if os.path.splitext(f)[1].lower() in valid_extensions:
-                        files.append(f)
-            files.sort()
+            sort, order, offset, limit = listing.parse_page_params(request.rel_url.query)
+            scan = listing.parse_scan_params(request.rel_url.query)
+            collapse = request.rel_url.query.get("collapse") == "1"
+            distance = int(request.rel_url.query.get("distance", settings.DUPLICATE_DISTANCE))
+            if not 0 <= distance <= near_duplicates.MAX_DISTANCE:
+                raise ValueError(f"distance must be between 0 and {near_duplicates.MAX_DISTANCE}")
+        except ValueError as e:
+            return web.json_response({"error": str(e), "files": []}, status=400)
+
+        loop = asyncio.get_running_loop()
+        extra = {}
+        try:
+            if collapse:
+                entries, all_files, hashed = await loop.run_in_executor(
+                    None, _collapsed_entries, dir_path, sort, order, scan, distance)
+                # Files not thumbnailed yet have no hash and are never collapsed
+                extra = {"collapsed": True, "distance": distance, "total_files": all_files, "unhashed": all_files - hashed}
+            else:
+                entries = await loop.run_in_executor(None, _sorted_entries, dir_path, sort, order, scan)
         except Exception as e:
             return web.json_response({"error": str(e), "files": []})
 
-        return web.json_response({"files": files})
+        page, next_cursor = listing.paginate(entries, offset, limit)
+        return web.json_response({
+            "files": page,
+            "total": len(entries),
+            "offset": offset,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "sort": sort,
+            "order": order,
+            **extra,
+        })
+
+    def _sorted_entries(dir_path, sort, order, scan=listing.TOP_LEVEL):
+        # Shared with every other gallery on the folder: concurrent requests
+        # wait for one scan, and the listing is reused while fresh
+        return directory_sessions.sorted_entries(dir_path, sort, order, scan)
+
+    def _collapsed_entries(dir_path, sort, order, scan, distance):
+        # One entry per cluster of near-duplicates, kept with the shared listing
+        def compute(entries):
+            with timing.metrics.timer("dedupe.collapse"):
+                collapsed, hashed = near_duplicates.collapse(
+                    entries, listing.parse_roots(dir_path), near_duplicates.hash_store, distance)
+            return collapsed, len(entries), hashed
+        return directory_sessions.derived(dir_path, ("collapse", distance), compute, sort, order, scan)
+
+    # Entries per NDJSON write in the streaming listing
+    STREAM_BATCH_SIZE = 200
+
+    @routes.get("/gravity/gallery/list/stream")
+    @timing.metrics.timed_route("list_stream")
+    async def stream_gallery_list(request):
+        """
+        Listing as newline-delimited JSON, written while the directory is
+        still being scanned. Each line is an entry; the last line is
+        {"done": true, "total": N, "sorted": bool} or {"error": "..."}.
+        With sort (and order), a listing the server already holds is sent in
+        that order and "sorted" is true; a listing still being scanned is sent
+        as found and left to the client to sort.
+        """
+        dir_path = request.rel_url.query.get("directory", "")
+        if not dir_path:
+            return web.json_response({"error": "No directory specified", "files": []})
+        if not listing.roots_exist(dir_path):
+            return web.json_response({"error": "Directory not found", "files": []})
+        try:
+            scan = listing.parse_scan_params(request.rel_url.query)
+            sort = order = None
+            if "sort" in request.rel_url.query:
+                sort, order, _, _ = listing.parse_page_params(request.rel_url.query)
+        except ValueError as e:
+            return web.json_response({"error": str(e), "files": []}, status=400)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "Cache-Control": "no-store"})
+        await response.prepare(request)
+
+        loop = asyncio.get_running_loop()
+        batches = asyncio.Queue()
+        cancelled = threading.Event()
+        ordered = False
+
+        def produce():
+            # Runs on a worker thread; hands batches to the loop as they fill up
+            nonlocal ordered
+            try:
+                held = directory_sessions.peek_sorted(dir_path, sort, order, scan) if sort else None
+                ordered = held is not None
+                batch = []
+                for entry in held if ordered else _iter_entries(dir_path, scan):
+                    if cancelled.is_set():
+                        return
+                    batch.append(entry)
+                    if len(batch) >= STREAM_BATCH_SIZE:
+                        loop.call_soon_threadsafe(batches.put_nowait, batch)
+                        batch = []
+                loop.call_soon_threadsafe(batches.put_nowait, batch)
+                loop.call_soon_threadsafe(batches.put_nowait, None)
+            except Exception as e:
+                loop.call_soon_threadsafe(batches.put_nowait, e)
+
+        producer = loop.run_in_executor(None, produce)
+        total = 0
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    await response.write(json.dumps({"done": True, "total": total, "sorted": ordered}).encode() + b"\n")
+                    break
+                if isinstance(batch, Exception):
+                    await response.write(json.dumps({"error": str(batch)}).encode() + b"\n")
+                    break
+                if batch:
+                    total += len(batch)
+                    await response.write("".join(json.dumps(entry) + "\n" for entry in batch).encode())
+            await response.write_eof()
+        finally:
+            # Client went away (or we are done): stop the scanner thread
+            cancelled.set()
+            await producer
+        return response
+
+    def _iter_entries(dir_path, scan=listing.TOP_LEVEL):
+        entries = directory_sessions.peek(dir_path, scan)
+        if entries is not None:
+            yield from entries
+            return
+        if not listing.is_single_folder(dir_path, scan):
+            yield from iter_tree_entries(dir_path, scan)
+            return
+        yield from apply_ratings(listing.iter_directory(dir_path), indexed_ratings(dir_path))
+
+    @routes.get("/gravity/gallery/search")
+    @timing.metrics.timed_route("search")
+    async def search_gallery(request):
+        dir_path = request.rel_url.query.get("directory", "")
+        query = request.rel_url.query.get("q", "")
+        try:
+            offset = max(0, int(request.rel_url.query.get("offset", "0")))
+            limit = min(1000, max(1, int(request.rel_url.query.get("limit", "200"))))
+        except ValueError:
+            return web.json_response({"error": "Invalid offset or limit", "files": []}, status=400)
+
+        if not dir_path:
+            return web.json_response({"error": "No directory specified", "files": []})
+        if not os.path.isdir(dir_path):
+            return web.json_response({"error": "Directory not found", "files": []})
+        if not settings.INDEX_ENABLED:
+            return web.json_response({"error": "Search needs the gallery index (GRAVITY_GALLERY_INDEX=0)", "files": []})
+
+        loop = asyncio.get_running_loop()
+        try:
+            found = await loop.run_in_executor(None, gallery_index.search, dir_path, query, offset, limit)
+        except Exception as e:
+            return web.json_response({"error": str(e), "files": []})
+
+        if found is None:
+            # Not indexed yet; the first scan makes the folder searchable
+            gallery_index.request_scan(dir_path)
+            return web.json_response({"files": [], "total": 0, "offset": offset, "limit": limit, "indexing": True})
+
+        total, files = found
+        return web.json_response({"files": files, "total": total, "offset": offset, "limit": limit})
 
     @routes.get("/gravity/gallery/view")
+    @timing.metrics.timed_route("view")
     async def view_gallery_image(request):
         dir_path = request.rel_url.query.get("directory", "")
         filename = request.rel_url.query.get("filename", "")
@@ -44,42 +251,339 @@ try:
              return web.Response(status=400, text="Missing directory or filename")
              
         file_path = os.path.join(dir_path, filename)
-        if not os.path.exists(file_path):
+        try:
+            st = await _stat(file_path)
+        except OSError:
             return web.Response(status=404, text="File not found")
+
+        # The URL is not versioned, so clients revalidate every time
+        etag = http_cache.file_etag(st)
+        headers = http_cache.validator_headers(etag, st.st_mtime, http_cache.REVALIDATE)
+        if http_cache.is_not_modified(request, etag, st.st_mtime):
+            return web.Response(status=304, headers=headers)
             
         # Security check: straightforward implementation for local tool
-        return web.FileResponse(file_path)
+        return await _file_response(file_path, headers)
+
+    async def _stat(file_path):
+        # The first stat of an archive member reads the archive's member index
+        if archives.split_member_path(file_path) is None:
+            return os.stat(file_path)
+        return await asyncio.get_running_loop().run_in_executor(None, archives.stat, file_path)
+
+    async def _file_response(file_path, headers=None):
+        # Files are sent by aiohttp; archive members are read out of the archive
+        if archives.split_member_path(file_path) is None:
+            return web.FileResponse(file_path, headers=headers)
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(None, archives.read_file, file_path)
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        return web.Response(body=body, content_type=content_type, headers=headers)
+
+    async def _render_thumbnail(key, file_path, st, size, fmt, is_alive):
+        # Decode on the worker pool so the server loop stays responsive.
+        # Identical in-flight requests share one job, and jobs whose
+        # client disconnected while queued are skipped.
+        def save(data, dhash):
+            thumbnails.thumbnail_cache.put(key, data)
+            near_duplicates.hash_store.put(file_path, st, dhash)
+
+        async def store(result):
+            data, stages, dhash = result
+            # The cache write (and its first index load) and the hash write touch
+            # the disk, so they run off the loop; the job stays in flight until
+            # the entry is findable
+            await asyncio.get_running_loop().run_in_executor(None, save, data, dhash)
+            for stage, seconds in stages:
+                timing.metrics.observe(stage, seconds)
+
+        data, _, _ = await thumbnails.thumbnail_pool.run(
+            key,
+            thumbnails.render_thumbnail_timed,
+            file_path,
+            size,
+            fmt,
+            on_done=store,
+            is_alive=is_alive,
+        )
+        return data
+
+    def _backfill_hash(file_path, st, body):
+        # Thumbnails cached before hashes existed are hashed from the cached
+        # image, so collapsing works without re-rendering them
+        if near_duplicates.hash_store.has(file_path, st):
+            return
+        try:
+            near_duplicates.hash_store.put(file_path, st, near_duplicates.hash_image_bytes(body))
+        except OSError as e:
+            print(f"Gravity Gallery: could not hash {file_path}: {e}")
+
+    def _lookup_thumbnail(file_path, size, st, fmt):
+        key, body = thumbnails.lookup_thumbnail(file_path, size, st, fmt)
+        if body is not None:
+            _backfill_hash(file_path, st, body)
+        return key, body
+
+    def _client_alive(transport):
+        return lambda: transport is not None and not transport.is_closing()
 
     @routes.get("/gravity/gallery/thumbnail")
+    @timing.metrics.timed_route("thumbnail")
     async def view_gallery_thumbnail(request):
         dir_path = request.rel_url.query.get("directory", "")
         filename = request.rel_url.query.get("filename", "")
-        size = int(request.rel_url.query.get("size", "256"))
+        size = thumbnails.bucket_size(int(request.rel_url.query.get("size", "256")))
+        fmt = thumbnails.negotiate_format(request.headers.get("Accept"))
         
         if not dir_path or not filename:
              return web.Response(status=400, text="Missing directory or filename")
              
         file_path = os.path.join(dir_path, filename)
-        if not os.path.exists(file_path):
+        try:
+            st = await _stat(file_path)
+        except OSError:
             return web.Response(status=404, text="File not found")
+
+        # The gallery puts the file's mtime in the URL (v=), so such URLs never
+        # change content and can be cached for good; others must revalidate
+        etag = http_cache.file_etag(st, f"{size}-{fmt}")
+        cache_control = http_cache.IMMUTABLE if "v" in request.rel_url.query else http_cache.REVALIDATE
+        headers = http_cache.validator_headers(etag, st.st_mtime, cache_control)
+        headers["Vary"] = "Accept"
+        if http_cache.is_not_modified(request, etag, st.st_mtime):
+            return web.Response(status=304, headers=headers)
             
         try:
-            img = Image.open(file_path)
-            img.thumbnail((size, size))
-            
-            # Convert to RGB if necessary (e.g. for RGBA PNGs saving as JPEG)
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-                
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=70)
-            buffer.seek(0)
-            
-            return web.Response(body=buffer.read(), content_type="image/jpeg")
+            # Cache reads hit the disk (and the first one loads the cache index)
+            loop = asyncio.get_running_loop()
+            key, body = await loop.run_in_executor(None, _lookup_thumbnail, file_path, size, st, fmt)
+            cache_hit = body is not None
+            if not cache_hit:
+                body = await _render_thumbnail(key, file_path, st, size, fmt, _client_alive(request.transport))
+            headers["X-Gravity-Cache"] = "hit" if cache_hit else "miss"
+            return web.Response(body=body, content_type=thumbnails.content_type(fmt), headers=headers)
+        except PoolBusy:
+            return web.Response(status=503, text="Thumbnail queue full", headers={"Retry-After": "1"})
         except Exception as e:
              print(f"Error generating thumbnail for {filename}: {e}")
-             return web.FileResponse(file_path) # Fallback to full image
+             return await _file_response(file_path) # Fallback to full image
+
+
+    # Most thumbnails one batch request may ask for
+    THUMBNAIL_BATCH_MAX = 200
+
+    # Batch frame: index into filenames (uint32), status (uint8), body length (uint32)
+    THUMBNAIL_FRAME = struct.Struct(">IBI")
+    FRAME_OK = 0
+    FRAME_ERROR = 1  # Missing file or decode failure; the single route falls back to the full image
+    FRAME_BUSY = 2  # Worker queue full; retry later
+
+    @routes.post("/gravity/gallery/thumbnails")
+    @timing.metrics.timed_route("thumbnails")
+    async def view_gallery_thumbnails(request):
+        """
+        Many thumbnails of one directory in a single response: a stream of
+        frames in completion order (cache hits first), each a THUMBNAIL_FRAME
+        header followed by the image, encoded in the format named by the
+        X-Gravity-Thumbnail-Type response header (negotiated from Accept).
+        """
+        try:
+            data = await request.json()
+            dir_path = data.get("directory", "")
+            filenames = data.get("filenames") or []
+            size = thumbnails.bucket_size(int(data.get("size", 256)))
+        except (ValueError, TypeError, AttributeError):
+            return web.Response(status=400, text="Invalid request body")
+
+        if not dir_path or not isinstance(filenames, list):
+            return web.Response(status=400, text="Missing directory or filenames")
+        if len(filenames) > THUMBNAIL_BATCH_MAX:
+            return web.Response(status=400, text=f"At most {THUMBNAIL_BATCH_MAX} thumbnails per request")
+        fmt = thumbnails.negotiate_format(request.headers.get("Accept"))
+
+        def lookup_all():
+            found = []
+            with timing.metrics.timer("thumbnail.batch_lookup"):
+                for filename in filenames:
+                    file_path = os.path.join(dir_path, str(filename))
+                    try:
+                        st = archives.stat(file_path)
+                        key, body = thumbnails.lookup_thumbnail(file_path, size, st, fmt)
+                        found.append((file_path, st, key, body))
+                    except OSError:
+                        found.append((file_path, None, None, None))
+            for file_path, st, _, body in found:
+                if body is not None:
+                    _backfill_hash(file_path, st, body)
+            return found
+
+        # Stats and cache reads for the whole batch in one executor hop
+        loop = asyncio.get_running_loop()
+        found = await loop.run_in_executor(None, lookup_all)
+
+        response = web.StreamResponse(headers={
+            "Content-Type": "application/octet-stream",
+            "X-Gravity-Thumbnail-Type": thumbnails.content_type(fmt),
+        })
+        await response.prepare(request)
+
+        async def write_frame(index, status, body=b""):
+            await response.write(THUMBNAIL_FRAME.pack(index, status, len(body)) + body)
+
+        async def render(index, file_path, st, key):
+            try:
+                return index, FRAME_OK, await _render_thumbnail(key, file_path, st, size, fmt, _client_alive(request.transport))
+            except PoolBusy:
+                return index, FRAME_BUSY, b""
+            except Exception as e:
+                print(f"Error generating thumbnail for {file_path}: {e}")
+                return index, FRAME_ERROR, b""
+
+        jobs = []
+        try:
+            for index, (file_path, st, key, body) in enumerate(found):
+                if key is None:
+                    await write_frame(index, FRAME_ERROR)
+                elif body is not None:
+                    await write_frame(index, FRAME_OK, body)
+                else:
+                    jobs.append(asyncio.ensure_future(render(index, file_path, st, key)))
+
+            for next_done in asyncio.as_completed(jobs):
+                await write_frame(*(await next_done))
+            await response.write_eof()
+        finally:
+            # Client went away mid-stream: release the queued decodes
+            for job in jobs:
+                job.cancel()
+        return response
+
+    def _warm_thumbnail(directory, filename, size, fmt, is_alive):
+        # Runs on the warmer thread. Rendering goes through the same pool as
+        # gallery requests, so a request for a thumbnail being warmed joins it.
+        file_path = os.path.join(directory, filename)
+        try:
+            st = archives.stat(file_path)
+        except OSError:
+            return False
+        key = thumbnails.ThumbnailCache.make_key(file_path, st, size, fmt)
+        if thumbnails.thumbnail_cache.contains(key):
+            if not near_duplicates.hash_store.has(file_path, st):
+                body = thumbnails.thumbnail_cache.get(key)
+                if body is not None:
+                    _backfill_hash(file_path, st, body)
+            return False
+        asyncio.run_coroutine_threadsafe(
+            _render_thumbnail(key, file_path, st, size, fmt, is_alive),
+            PromptServer.instance.loop,
+        ).result()
+        return True
+
+    def _prompt_running():
+        # Warming pauses while ComfyUI executes prompts
+        queue = getattr(PromptServer.instance, "prompt_queue", None)
+        return queue is not None and queue.get_tasks_remaining() > 0
+
+    thumbnail_warmer = ThumbnailWarmer(
+        _warm_thumbnail,
+        cpu_share=settings.PREWARM_CPU_PERCENT / 100,
+        is_busy=_prompt_running,
+        rest_limit=settings.PREWARM_LIMIT,
+    )
+
+    # Most filenames one viewport report may carry
+    PREWARM_WINDOW_MAX = 1000
+
+    @routes.post("/gravity/gallery/prewarm")
+    @timing.metrics.timed_route("prewarm")
+    async def prewarm_gallery_thumbnails(request):
+        """
+        Viewport report from a gallery: {session, directory, size, sort, order,
+        recursive, depth, exclude, window, visible_start, visible_end}, where
+        window is the slice of its file list around the viewport. {session, stop: true} ends the session.
+        """
+        try:
+            data = await request.json()
+            session = str(data["session"])
+            if data.get("stop"):
+                thumbnail_warmer.stop(session)
+                return web.json_response({"stopped": session})
+            dir_path = data.get("directory", "")
+            size = thumbnails.bucket_size(int(data.get("size", 256)))
+            window = [str(name) for name in data.get("window") or []]
+            visible_start = int(data.get("visible_start", 0))
+            visible_end = int(data.get("visible_end", len(window)))
+            sort, order, _, _ = listing.parse_page_params({"sort": data.get("sort", "mtime"), "order": data.get("order", "desc")})
+            scan = listing.parse_scan_params(data)
+        except (KeyError, ValueError, TypeError, AttributeError):
+            return web.Response(status=400, text="Invalid request body")
+
+        if not settings.PREWARM_ENABLED:
+            return web.json_response({"enabled": False})
+        if not dir_path or not listing.roots_exist(dir_path):
+            return web.json_response({"error": "Directory not found"}, status=404)
+        if len(window) > PREWARM_WINDOW_MAX:
+            return web.Response(status=400, text=f"At most {PREWARM_WINDOW_MAX} filenames per report")
+
+        fmt = thumbnails.negotiate_format(request.headers.get("Accept"))
+
+        def rest():
+            return (entry["filename"] for entry in _sorted_entries(dir_path, sort, order, scan))
+
+        queued = thumbnail_warmer.update(
+            session,
+            (dir_path, size, fmt, sort, order, scan),
+            window,
+            visible_start,
+            visible_end,
+            rest if settings.PREWARM_LIMIT > 0 else None,
+        )
+        return web.json_response({"enabled": True, "queued": queued})
+
+    @routes.get("/gravity/gallery/stats")
+    async def gallery_stats(request):
+        """
+        Latency percentiles per route and per pipeline stage, counters, and
+        cache / pool statistics. ?reset=1 starts the measurements over.
+        """
+        stats = timing.metrics.snapshot()
+        stats.update({
+            "thumbnail_cache": thumbnails.thumbnail_cache.stats(),
+            "thumbnail_pool": thumbnails.thumbnail_pool.stats(),
+            "extraction_cache": extraction_cache.stats(),
+            "extraction_coalescing": extraction_flight.stats(),
+            "listings": directory_sessions.stats(),
+            "archives": archives.archive_store.stats(),
+            "hashes": near_duplicates.hash_store.stats(),
+            "prewarm": thumbnail_warmer.stats(),
+        })
+        if request.rel_url.query.get("reset") == "1":
+            timing.metrics.reset()
+        return web.json_response(stats)
+
+    # Longest profile one request may ask for
+    PROFILE_MAX_SECONDS = 60
+
+    @routes.get("/gravity/gallery/profile")
+    async def gallery_profile(request):
+        """
+        Sample every thread's stack for ?seconds= (default 10) at ?hz= (default
+        100) and return the folded stacks, most sampled first, for flame graph
+        tools. Needs GRAVITY_GALLERY_PROFILER=1.
+        """
+        if not settings.PROFILER_ENABLED:
+            return web.Response(status=404, text="Profiler disabled (set GRAVITY_GALLERY_PROFILER=1)")
+        try:
+            seconds = min(PROFILE_MAX_SECONDS, max(0.1, float(request.rel_url.query.get("seconds", "10"))))
+            hz = min(1000, max(1, int(request.rel_url.query.get("hz", "100"))))
+        except ValueError:
+            return web.Response(status=400, text="Invalid seconds or hz")
 
+        loop = asyncio.get_running_loop()
+        samples = await loop.run_in_executor(None, timing.profiler.profile, seconds, hz)
+        if samples is None:
+            return web.Response(status=409, text="A profile is already running")
+        return web.Response(text=timing.SamplingProfiler.folded(samples))
 
 except ImportError:
     print("ComfyUI Server not found. API routes for Gallery will not be registered.")
@@ -0,0 +1,311 @@
+import io
+import os
+import re
+import json
+import mmap
+import time
+import zlib
+import struct
+import hashlib
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict, namedtuple
+
+try:
+    from . import settings
+except ImportError:
+    import settings
+
+# Zip and uncompressed tar archives browsed like folders. Each archive's
+# member table (name, data offset, sizes) is read once from the zip central
+# directory or the tar headers and cached on disk, and members are read
+# straight out of a memory map of the archive: stored members are never
+# copied as a whole (the header-only metadata reader touches a few pages),
+# deflated members are inflated on their own.
+#
+# A member is addressed by joining the archive path and the member name,
+# e.g. os.path.join("/renders/2023.zip", "batch1/00001.png").
+
+ARCHIVE_EXTENSIONS = (".zip", ".cbz", ".tar")
+
+# Bumped when the on-disk index layout changes
+INDEX_VERSION = 1
+
+# Zip compression methods members can be read with
+_STORED = zipfile.ZIP_STORED
+_DEFLATED = zipfile.ZIP_DEFLATED
+
+_LOCAL_HEADER = struct.Struct("<4s22xHH")
+_LOCAL_HEADER_MAGIC = b"PK\x03\x04"
+
+# An archive extension followed by a path separator: where a member path splits
+_MEMBER_SPLIT = re.compile(
+    "(?:" + "|".join(re.escape(ext) for ext in ARCHIVE_EXTENSIONS) + ")(?=[/"
+    + re.escape(os.sep) + "])",
+    re.IGNORECASE,
+)
+
+# os.stat stand-in for members. Times are the archive's, so rewriting an
+# archive changes every member's ETag and cache key.
+MemberStat = namedtuple("MemberStat", ("st_size", "st_mtime", "st_mtime_ns"))
+
+# Member table row: (name, offset, compressed size, size, method, mtime).
+# offset is the zip local header or the tar data offset.
+_NAME, _OFFSET, _COMPRESSED, _SIZE, _METHOD, _MTIME = range(6)
+
+
+class ArchiveError(OSError):
+    pass
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def split_member_path(path):
+    """(archive path, member name) for a path inside an archive, else None."""
+    for match in _MEMBER_SPLIT.finditer(path):
+        archive = path[:match.end()]
+        if os.path.isfile(archive):
+            return archive, path[match.end() + 1:].replace(os.sep, "/")
+    return None
+
+
+def _read_zip(path):
+    members = []
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            # Encrypted members and exotic compression can't be read in place
+            if info.is_dir() or info.flag_bits & 0x1 or info.compress_type not in (_STORED, _DEFLATED):
+                continue
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            members.append((info.filename, info.header_offset, info.compress_size,
+                            info.file_size, info.compress_type, mtime))
+    return members
+
+
+def _read_tar(path):
+    members = []
+    try:
+        # "r:" refuses compressed tars, which have no random access
+        with tarfile.open(path, "r:") as tf:
+            for info in tf:
+                if info.isreg() and not info.issparse():
+                    members.append((info.name, info.offset_data, info.size, info.size, _STORED, float(info.mtime)))
+    except tarfile.ReadError as e:
+        raise ArchiveError(f"Not an uncompressed tar archive: {path} ({e})") from e
+    return members
+
+
+class _OpenArchive:
+    def __init__(self, path, identity, members):
+        self.path = path
+        self.identity = identity
+        self.is_zip = not path.lower().endswith(".tar")
+        self.members = members
+        self.by_name = {row[_NAME]: row for row in members}
+        self.data_offsets = {}  # zip member name -> data offset, from its local header
+        with open(path, "rb") as f:
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # Empty file
+                raise ArchiveError(f"Cannot map {path}: {e}") from e
+
+    def data_offset(self, row):
+        if not self.is_zip:
+            return row[_OFFSET]
+        offset = self.data_offsets.get(row[_NAME])
+        if offset is None:
+            header = row[_OFFSET]
+            magic, name_length, extra_length = _LOCAL_HEADER.unpack_from(self.map, header)
+            if magic != _LOCAL_HEADER_MAGIC:
+                raise ArchiveError(f"Bad local header for {row[_NAME]} in {self.path}")
+            offset = self.data_offsets[row[_NAME]] = header + _LOCAL_HEADER.size + name_length + extra_length
+        return offset
+
+    def open(self, name):
+        row = self.by_name.get(name)
+        if row is None:
+            raise FileNotFoundError(f"No member {name} in {self.path}")
+        start = self.data_offset(row)
+        if row[_METHOD] == _STORED:
+            return MemberFile(self.map, start, row[_SIZE])
+        data = zlib.decompress(memoryview(self.map)[start:start + row[_COMPRESSED]], -15, row[_SIZE] or 1)
+        return io.BytesIO(data)
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # A reader still has a view; the map closes when it is collected
+
+
+class MemberFile(io.RawIOBase):
+    """Seekable read-only file over a stored member's bytes in a memory map."""
+
+    def __init__(self, buffer, start, size):
+        super().__init__()
+        self._view = memoryview(buffer)[start:start + size]
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("Negative seek position")
+        self._pos = offset
+        return offset
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class ArchiveStore:
+    """
+    Member tables of archives, cached in index_dir per archive (rebuilt when
+    the archive's mtime or size changes), and up to max_open archives kept
+    memory-mapped, least recently used closed first.
+    """
+
+    def __init__(self, index_dir, max_open=8):
+        self.index_dir = index_dir
+        self.max_open = max_open
+        self.builds = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._open = OrderedDict()  # normalized path -> _OpenArchive
+
+    def _index_path(self, path):
+        return os.path.join(self.index_dir, hashlib.sha1(path.encode("utf-8")).hexdigest() + ".json")
+
+    def _load_index(self, path, identity):
+        try:
+            with open(self._index_path(path), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION or data.get("path") != path or tuple(data.get("identity", ())) != identity:
+            return None
+        return [tuple(row) for row in data["members"]]
+
+    def _save_index(self, path, identity, members):
+        index_path = self._index_path(path)
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "path": path, "identity": identity, "members": members}, f)
+            os.replace(tmp, index_path)
+        except OSError as e:
+            print(f"Gravity Gallery: could not save archive index: {e}")
+
+    def _members(self, path, identity):
+        members = self._load_index(path, identity)
+        if members is None:
+            try:
+                members = _read_tar(path) if path.lower().endswith(".tar") else _read_zip(path)
+            except zipfile.BadZipFile as e:
+                raise ArchiveError(f"Not a zip archive: {path} ({e})") from e
+            self.builds += 1
+            self._save_index(path, identity, members)
+        return members
+
+    def archive(self, path):
+        """The open archive at path, reopened (and re-indexed) if it changed."""
+        path = os.path.normcase(os.path.abspath(path))
+        st = os.stat(path)
+        identity = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            archive = self._open.get(path)
+            if archive is not None and archive.identity == identity:
+                self._open.move_to_end(path)
+                return archive
+
+        # One index build at a time; a second caller finds it open
+        with self._build_lock:
+            with self._lock:
+                archive = self._open.get(path)
+                if archive is not None and archive.identity == identity:
+                    return archive
+            archive = _OpenArchive(path, identity, self._members(path, identity))
+            with self._lock:
+                old = self._open.pop(path, None)
+                if old is not None:
+                    old.close()
+                self._open[path] = archive
+                while len(self._open) > self.max_open:
+                    self._open.popitem(last=False)[1].close()
+            return archive
+
+    def members(self, path):
+        """[(name, size, mtime)] of an archive's readable members, in archive order."""
+        return [(row[_NAME], row[_SIZE], row[_MTIME]) for row in self.archive(path).members]
+
+    def stat(self, archive_path, name):
+        archive = self.archive(archive_path)
+        row = archive.by_name.get(name)
+        if row is None:
+            raise FileNotFoundError(f"No member {name} in {archive_path}")
+        mtime_ns, _ = archive.identity
+        return MemberStat(row[_SIZE], mtime_ns / 1e9, mtime_ns)
+
+    def open(self, archive_path, name):
+        return self.archive(archive_path).open(name)
+
+    def stats(self):
+        with self._lock:
+            open_archives = len(self._open)
+            members = sum(len(a.members) for a in self._open.values())
+        return {"open": open_archives, "members": members, "index_builds": self.builds}
+
+
+archive_store = ArchiveStore(settings.ARCHIVE_INDEX_DIR, settings.ARCHIVES_OPEN_MAX)
+
+
+def open_file(path):
+    """Binary file object for a file, or for an archive member path."""
+    member = split_member_path(path)
+    if member is None:
+        return open(path, "rb")
+    return archive_store.open(*member)
+
+
+def stat(path):
+    """os.stat for a file, MemberStat for an archive member path."""
+    member = split_member_path(path)
+    if member is None:
+        return os.stat(path)
+    return archive_store.stat(*member)
+
+
+def exists(path):
+    try:
+        stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def read_file(path):
+    with open_file(path) as f:
+        return f.read()
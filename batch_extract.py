@@ -0,0 +1,194 @@
+"""
+Bulk prompt extraction for whole directories.
+
+    python batch_extract.py DIRECTORY [-o prompts.jsonl] [--format jsonl|csv] [--workers N]
+
+Files are handed to a process pool in chunks and results are written in
+filename order as they come back, with only a few chunks in flight at a
+time, so memory stays flat however large the folder is.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from . import listing
+except ImportError:
+    import listing
+
+OUTPUT_FORMATS = ("jsonl", "csv")
+
+# Record fields, in CSV column order (debug_info is added on request)
+RECORD_FIELDS = ("filename", "prompt", "negative_prompt", "steps", "sampler", "cfg", "seed", "width", "height", "resources")
+
+# Files per work unit sent to a worker process
+DEFAULT_CHUNK_SIZE = 64
+
+# Chunks queued per worker; bounds how many results are held at once
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+_worker_node = None
+
+
+def extract_chunk(directory, filenames, include_debug=False):
+    """Run the node's extraction over a list of files. Executed in worker processes."""
+    global _worker_node
+    if _worker_node is None:
+        # Imported here, gallery_node imports this module
+        try:
+            from .gallery_node import GravityGalleryNode
+        except ImportError:
+            from gallery_node import GravityGalleryNode
+        _worker_node = GravityGalleryNode()
+
+    records = []
+    for filename in filenames:
+        (prompt_string, debug_info, negative, steps, sampler,
+         cfg, seed, width, height, resources) = _worker_node._process_logic(directory, filename, 0, False)
+        record = dict(zip(RECORD_FIELDS, (
+            filename, prompt_string, negative, steps, sampler, cfg, seed, width, height,
+            json.loads(resources) if resources else [],
+        )))
+        if include_debug:
+            record["debug_info"] = debug_info
+        records.append(record)
+    return records
+
+
+class BatchStats:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def files_per_second(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return f"{self.done}/{self.total} files in {self.elapsed:.1f}s ({self.files_per_second:.1f} files/s)"
+
+
+def extract_directory(directory, workers=0, chunk_size=DEFAULT_CHUNK_SIZE, include_debug=False, stats=None):
+    """
+    Yield one record per image in directory, in filename order. workers=0
+    uses every core, workers=1 extracts in this process.
+    """
+    filenames = sorted(entry["filename"] for entry in listing.iter_entries(directory))
+    if stats is not None:
+        stats.total = len(filenames)
+    chunks = (filenames[i:i + chunk_size] for i in range(0, len(filenames), chunk_size))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            records = extract_chunk(directory, chunk, include_debug)
+            if stats is not None:
+                stats.done += len(records)
+            yield from records
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(extract_chunk, directory, chunk, include_debug))
+                if len(pending) < workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                    continue
+                records = pending.popleft().result()
+                if stats is not None:
+                    stats.done += len(records)
+                yield from records
+            while pending:
+                records = pending.popleft().result()
+                if stats is not None:
+                    stats.done += len(records)
+                yield from records
+        finally:
+            # Consumer stopped early or a chunk failed: drop what has not started
+            for future in pending:
+                future.cancel()
+
+
+def write_records(records, out, output_format, include_debug=False):
+    """Stream records to a text file object as JSON lines or CSV."""
+    if output_format == "csv":
+        fields = list(RECORD_FIELDS) + (["debug_info"] if include_debug else [])
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(dict(record, resources=json.dumps(record["resources"]) if record["resources"] else ""))
+    else:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def run_batch(directory, output_path, output_format="jsonl", workers=0,
+              chunk_size=DEFAULT_CHUNK_SIZE, include_debug=False, progress=None):
+    """
+    Extract every image in directory into output_path. progress(stats) is
+    called about once a second. Returns the final BatchStats.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if not listing.roots_exist(directory):
+        raise ValueError(f"Directory not found: {directory}")
+
+    stats = BatchStats(0)
+    records = extract_directory(directory, workers, chunk_size, include_debug, stats)
+
+    def reported(records):
+        last = time.perf_counter()
+        for record in records:
+            yield record
+            now = time.perf_counter()
+            if progress is not None and now - last >= 1.0:
+                last = now
+                progress(stats)
+
+    with open(output_path, "w", encoding="utf-8", newline="") as out:
+        write_records(reported(records), out, output_format, include_debug)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the prompts of every image in a directory.")
+    parser.add_argument("directory")
+    parser.add_argument("-o", "--output", help="output file (default: prompts.<format> in the current directory, '-' for stdout)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="files per work unit")
+    parser.add_argument("--debug-info", action="store_true", help="include the extractor's debug log")
+    args = parser.parse_args(argv)
+
+    def progress(stats):
+        print(f"\r{stats.summary()}", end="", file=sys.stderr, flush=True)
+
+    if args.output == "-":
+        if not listing.roots_exist(args.directory):
+            parser.error(f"directory not found: {args.directory}")
+        stats = BatchStats(0)
+        records = extract_directory(args.directory, args.workers, args.chunk_size, args.debug_info, stats)
+        write_records(records, sys.stdout, args.format, args.debug_info)
+    else:
+        output = args.output or f"prompts.{args.format}"
+        try:
+            stats = run_batch(args.directory, output, args.format, args.workers,
+                              args.chunk_size, args.debug_info, progress)
+        except ValueError as e:
+            parser.error(str(e))
+    print(f"\r{stats.summary()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
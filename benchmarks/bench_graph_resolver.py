@@ -0,0 +1,170 @@
+"""
+ComfyUI prompt-graph benchmark: the original per-node get_node_input walk
+against the indexed, memoized graph_resolver.PromptGraph.
+
+    python benchmarks/bench_graph_resolver.py [--nodes 2000 10000] [--depth 8 32] [--repeat 3]
+
+Synthetic graphs are built from sampler blocks: a positive and a negative
+CLIPTextEncode whose text comes through a chain of string nodes, combined
+conditioning, and a KSampler. Part of the text is shared between blocks so
+deduplication has work to do.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from graph_resolver import PromptGraph, is_text_node  # noqa: E402
+
+
+def make_graph(nodes, depth, shared=50, seed=0):
+    """Prompt JSON with roughly `nodes` nodes; string chains are `depth` long."""
+    rng = random.Random(seed)
+    graph = {}
+    next_id = [1]
+
+    def add(class_type, inputs):
+        node_id = str(next_id[0])
+        next_id[0] += 1
+        graph[node_id] = {"class_type": class_type, "inputs": inputs}
+        return node_id
+
+    def text_chain(text):
+        source = add("PrimitiveNode", {"value": text})
+        for _ in range(depth - 1):
+            source = add("Text Multiline", {"text": [source, 0]})
+        return source
+
+    block = 0
+    while len(graph) < nodes:
+        ckpt = add("CheckpointLoaderSimple", {"ckpt_name": "model.safetensors"})
+        if rng.random() < 0.5:
+            pos_text = f"shared style prompt {rng.randrange(shared)}"
+        else:
+            pos_text = f"unique prompt for block {block}, " + "detailed " * rng.randrange(1, 20)
+        pos = add("CLIPTextEncode", {"text": [text_chain(pos_text), 0], "clip": [ckpt, 1]})
+        extra = add("CLIPTextEncode", {"text": f"lighting {block % 7}", "clip": [ckpt, 1]})
+        combined = add("ConditioningCombine", {"conditioning_1": [pos, 0], "conditioning_2": [extra, 0]})
+        neg = add("CLIPTextEncode", {"text": [text_chain(f"negative {block % 10}"), 0], "clip": [ckpt, 1]})
+        latent = add("EmptyLatentImage", {"width": 1024, "height": 1024, "batch_size": 1})
+        add("KSampler", {
+            "model": [ckpt, 0], "positive": [combined, 0], "negative": [neg, 0],
+            "latent_image": [latent, 0], "seed": block, "steps": 20, "cfg": 7.0,
+        })
+        block += 1
+    return graph
+
+
+def legacy_get_node_input(node_id, input_key, prompt_json, visited=None):
+    # GravityGalleryNode.get_node_input
+    if visited is None:
+        visited = set()
+    if node_id in visited:
+        return None
+    visited.add(node_id)
+    if node_id not in prompt_json:
+        return None
+    inputs = prompt_json[node_id].get("inputs", {})
+    if input_key not in inputs:
+        return None
+    val = inputs[input_key]
+    if isinstance(val, (str, int, float, bool)):
+        return str(val)
+    if isinstance(val, list) and len(val) == 2:
+        source_node_id = str(val[0])
+        if source_node_id in prompt_json:
+            source_inputs = prompt_json[source_node_id].get("inputs", {})
+            for key in ["text", "string", "value", "string_field", "prompt"]:
+                if key in source_inputs:
+                    res = legacy_get_node_input(source_node_id, key, prompt_json, visited)
+                    if res:
+                        return res
+        return f"<Link to Node {source_node_id}>"
+    return str(val)
+
+
+def legacy_extract(prompt_json):
+    # The _process_logic loop before the resolver: re-walks links per node, list dedup
+    found_texts = []
+    for node_id, node_data in prompt_json.items():
+        class_type = node_data.get("class_type", "")
+        if "CLIPTextEncode" in class_type or "Text" in class_type or "String" in class_type:
+            text = legacy_get_node_input(node_id, "text", prompt_json)
+            if not text:
+                text = legacy_get_node_input(node_id, "string", prompt_json)
+            if not text:
+                text = legacy_get_node_input(node_id, "value", prompt_json)
+            if text and text.strip() and "<Link" not in text and text not in found_texts:
+                found_texts.append(text)
+    return found_texts, []
+
+
+def resolver_extract(prompt_json):
+    graph = PromptGraph(prompt_json)
+    roles = graph.classify()
+    positive, negative, seen = [], [], set()
+    for node_id, node_data in graph.nodes.items():
+        if is_text_node(node_data.get("class_type") or ""):
+            text = graph.node_text(node_id)
+            if text and text.strip() and "<Link" not in text and text not in seen:
+                seen.add(text)
+                (negative if roles.get(node_id) == "negative" else positive).append(text)
+    return positive, negative
+
+
+# Source nodes whose first value inputs are empty: the text comes from a
+# later one (the resolver tries each in VALUE_KEYS order)
+FALLBACK_GRAPH = {
+    "1": {"class_type": "PrimitiveNode", "inputs": {"text": "", "value": "empty first input"}},
+    "2": {"class_type": "CLIPTextEncode", "inputs": {"text": ["1", 0]}},
+    "3": {"class_type": "PrimitiveNode", "inputs": {"string": "", "string_field": "", "prompt": "last input"}},
+    "4": {"class_type": "CLIPTextEncode", "inputs": {"text": ["3", 0]}},
+    "5": {"class_type": "KSampler", "inputs": {"positive": ["2", 0], "negative": ["4", 0]}},
+}
+
+
+def check_fallback_keys():
+    graph = PromptGraph(FALLBACK_GRAPH)
+    assert graph.node_text("2") == "empty first input"
+    assert graph.node_text("4") == "last input"
+    assert resolver_extract(FALLBACK_GRAPH) == (["empty first input"], ["last input"])
+
+
+def timed(fn, graph, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(graph)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[2000, 10000], help="graph sizes")
+    parser.add_argument("--depth", type=int, nargs="+", default=[8, 32], help="string chain lengths per prompt")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    check_fallback_keys()
+    print(f"{'nodes':>7} {'depth':>6} {'texts':>6} {'legacy ms':>10} {'resolver ms':>12} {'speedup':>8} {'pos':>5} {'neg':>5}")
+    for depth in args.depth:
+        for n in args.nodes:
+            graph = make_graph(n, depth)
+            legacy_s, (legacy_texts, _) = timed(legacy_extract, graph, args.repeat)
+            resolver_s, (positive, negative) = timed(resolver_extract, graph, args.repeat)
+            # Same texts overall, the resolver only splits off the negatives
+            assert set(legacy_texts) == set(positive) | set(negative)
+            print(
+                f"{len(graph):>7} {depth:>6} {len(legacy_texts):>6} {1000 * legacy_s:>10.1f} "
+                f"{1000 * resolver_s:>12.1f} {legacy_s / resolver_s:>7.1f}x {len(positive):>5} {len(negative):>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Near-duplicate clustering benchmark: near_duplicates.cluster on synthetic
+64-bit hashes, against a brute-force Hamming distance check on a sample.
+
+    python benchmarks/bench_near_duplicates.py [--count 100000] [--group 4] [--flips 4] [--repeat 3]
+
+Hashes come in groups of --group: a random hash and copies of it with up to
+--flips bits flipped, like the renders of one seed sweep.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import near_duplicates  # noqa: E402
+
+
+def make_hashes(rng, count, group, flips):
+    bases = rng.integers(0, 2**64 - 1, count // group, dtype=np.uint64, endpoint=True)
+    hashes = [bases]
+    for _ in range(group - 1):
+        noise = np.zeros(len(bases), dtype=np.uint64)
+        for _ in range(flips):
+            noise |= np.uint64(1) << rng.integers(0, 64, len(bases)).astype(np.uint64)
+        hashes.append(bases ^ noise)
+    hashes = np.concatenate(hashes)
+    return hashes[rng.permutation(len(hashes))]
+
+
+def brute_force(hashes, max_distance):
+    # Union-find over every pair: the reference for small inputs
+    n = len(hashes)
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    values = [int(h) for h in hashes]
+    for a in range(n):
+        for b in range(a + 1, n):
+            if bin(values[a] ^ values[b]).count("1") <= max_distance:
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+    roots = [find(a) for a in range(n)]
+    first = {}
+    for a, root in enumerate(roots):
+        first.setdefault(root, a)
+    return np.array([first[root] for root in roots])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000, help="hashes to cluster")
+    parser.add_argument("--group", type=int, default=4, help="near-duplicates per group")
+    parser.add_argument("--flips", type=int, default=4, help="bits flipped in each copy (at most)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sample = make_hashes(rng, 800, args.group, args.flips)
+    hashes = make_hashes(rng, args.count, args.group, args.flips)
+
+    print(f"{'distance':>8} {'clusters':>9} {'seconds':>8}")
+    for distance in (4, 6, 8, near_duplicates.MAX_DISTANCE):
+        assert (near_duplicates.cluster(sample, distance) == brute_force(sample, distance)).all()
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            labels = near_duplicates.cluster(hashes, distance)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{distance:>8} {len(np.unique(labels)):>9} {best:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
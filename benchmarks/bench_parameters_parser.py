@@ -0,0 +1,90 @@
+"""
+A1111 / Civitai parameters benchmark: the original extract_positive_prompt
+(one str.find per stop phrase) against parameters_parser.
+
+    python benchmarks/bench_parameters_parser.py [--count 2000] [--repeat 5]
+
+"positive" only extracts the positive prompt, like the original function.
+"full" parses every field (negative prompt, settings, resources).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import parameters_parser  # noqa: E402
+
+WORDS = (
+    "masterpiece", "best quality", "1girl", "portrait", "cinematic lighting", "ultra detailed",
+    "(sharp focus:1.2)", "<lora:detail_tweaker:0.6>", "landscape", "sunset", "bokeh", "8k",
+)
+
+
+def legacy_positive_prompt(parameters_text):
+    # GravityGalleryNode.extract_positive_prompt before the parser
+    stop_phrases = [
+        "Negative prompt:", "Steps:", "Sampler:", "CFG scale:", "Seed:", "Size:",
+        "Clip skip:", "Created Date:", "Civitai resources:", "Civitai metadata:",
+    ]
+    earliest_index = len(parameters_text)
+    for phrase in stop_phrases:
+        index = parameters_text.find(phrase)
+        if index != -1 and index < earliest_index:
+            earliest_index = index
+    return parameters_text[:earliest_index].strip()
+
+
+def make_parameters(rng, prompt_words):
+    positive = ", ".join(rng.choice(WORDS) for _ in range(prompt_words))
+    negative = ", ".join(rng.choice(WORDS) for _ in range(prompt_words // 3))
+    resources = [
+        {"type": "lora", "weight": 0.6, "modelVersionId": rng.randrange(10**6)}
+        for _ in range(rng.randrange(4))
+    ]
+    settings = (
+        f"Steps: {rng.randrange(10, 60)}, Sampler: DPM++ 2M Karras, Schedule type: Karras, "
+        f"CFG scale: {rng.randrange(3, 12)}, Seed: {rng.randrange(2**32)}, Size: 832x1216, "
+        f'Model hash: 1a2b3c4d, Model: juggernautXL, Lora hashes: "detail_tweaker: 0a1b2c3d", Version: v1.9.4'
+    )
+    if resources:
+        settings += f", Civitai resources: {json.dumps(resources)}"
+    return f"{positive}\nNegative prompt: {negative}\n{settings}"
+
+
+def timed(fn, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000, help="parameters texts per prompt length")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'prompt words':>12} {'legacy us':>10} {'positive us':>12} {'full us':>9}")
+    for words in (20, 80, 300):
+        corpus = [make_parameters(rng, words) for _ in range(args.count)]
+        for text in corpus:
+            assert parameters_parser.positive_prompt(text) == legacy_positive_prompt(text)
+        per_call = 1e6 / len(corpus)
+        legacy = timed(legacy_positive_prompt, corpus, args.repeat) * per_call
+        positive = timed(parameters_parser.positive_prompt, corpus, args.repeat) * per_call
+        full = timed(parameters_parser.parse_parameters, corpus, args.repeat) * per_call
+        print(f"{words:>12} {legacy:>10.2f} {positive:>12.2f} {full:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
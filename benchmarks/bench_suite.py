@@ -0,0 +1,281 @@
+"""
+End-to-end benchmark suite over a synthetic corpus (see corpus.py): directory
+listing, thumbnailing, single-file extraction and whole-directory extraction.
+
+    python benchmarks/bench_suite.py [--corpus DIR] [--count 500] [--scale 1.0]
+        [--stages listing,thumbnails,extract,batch] [--save [PATH]] [--compare BASELINE]
+
+Each stage runs in a fresh subprocess with its own empty cache folder and the
+index disabled, so every stage measures cold work and peak RSS is the
+stage's own. Reported per stage: throughput, latency percentiles (per file,
+or per pass for listing and batch) and peak RSS (the "workers" row is the
+largest batch worker process; it is left out when the batch ran in-process
+with one worker).
+
+--save writes the results, with the commit and environment they came from,
+to PATH (default benchmarks/baselines/<commit>.json). --compare prints the
+change against such a file and exits with status 1 if a stage is slower
+than --tolerance percent.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import corpus  # noqa: E402
+from bench_thumbnails import peak_rss_kb  # noqa: E402
+
+STAGES = ("listing", "thumbnails", "extract", "batch")
+
+# (metric, True if higher is better) compared against baselines
+COMPARED = (("throughput", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("peak_rss_mb", False))
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(seconds, units):
+    """Throughput (units / total seconds) and percentiles of per-sample latencies."""
+    values = sorted(seconds)
+    total = sum(values)
+    return {
+        "samples": len(values),
+        "units": units,
+        "seconds": total,
+        "throughput": units / total if total > 0 else 0.0,
+        "p50_ms": 1000 * percentile(values, 0.50),
+        "p95_ms": 1000 * percentile(values, 0.95),
+        "p99_ms": 1000 * percentile(values, 0.99),
+        "max_ms": 1000 * values[-1] if values else 0.0,
+    }
+
+
+def timed_each(fn, items):
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def stage_listing(directory, files, args):
+    import listing
+    def one_pass(_):
+        entries = listing.scan_directory(directory)
+        listing.sort_entries(list(entries), "mtime", True)
+        listing.sort_entries(list(entries), "filename", False)
+    timings = timed_each(one_pass, range(args.repeat))
+    return latency_summary(timings, len(files) * args.repeat)
+
+
+def stage_thumbnails(directory, files, args):
+    import thumbnails
+    paths = [os.path.join(directory, record["filename"]) for record in files]
+    timings = timed_each(lambda path: thumbnails.render_thumbnail(path, args.thumb_size, args.thumb_format), paths)
+    return latency_summary(timings, len(paths))
+
+
+def stage_extract(directory, files, args):
+    from gallery_node import GravityGalleryNode
+    node = GravityGalleryNode()
+    timings = timed_each(lambda record: node.extract_prompt_details(os.path.join(directory, record["filename"])), files)
+    result = latency_summary(timings, len(files))
+    by_kind = {}
+    for record, seconds in zip(files, timings):
+        by_kind.setdefault(record["kind"], []).append(seconds)
+    result["kinds"] = {kind: latency_summary(values, len(values)) for kind, values in sorted(by_kind.items())}
+    return result
+
+
+def stage_batch(directory, files, args):
+    import batch_extract
+    from gallery_node import extraction_cache
+    def one_pass(_):
+        # With one worker, extraction runs in this process; keep every pass cold
+        extraction_cache.clear()
+        for _record in batch_extract.extract_directory(directory, workers=args.workers):
+            pass
+    timings = timed_each(one_pass, range(args.repeat))
+    result = latency_summary(timings, len(files) * args.repeat)
+    # Reaped worker processes only: with one worker there are none and the
+    # work shows in the stage's own peak RSS
+    if (args.workers or os.cpu_count() or 1) > 1:
+        result["children_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return result
+
+
+STAGE_FUNCTIONS = {
+    "listing": stage_listing,
+    "thumbnails": stage_thumbnails,
+    "extract": stage_extract,
+    "batch": stage_batch,
+}
+
+
+def run_worker(stage, directory, args):
+    files = corpus.load_manifest(directory)["files"]
+    base = peak_rss_kb()
+    result = STAGE_FUNCTIONS[stage](directory, files, args)
+    result["base_rss_mb"] = base / 1024
+    result["peak_rss_mb"] = peak_rss_kb() / 1024
+    print(json.dumps(result))
+
+
+def run_stage(stage, directory, args):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, GRAVITY_GALLERY_CACHE_DIR=cache_dir, GRAVITY_GALLERY_INDEX="0")
+        command = [sys.executable, __file__, "--worker", stage, directory, "--repeat", str(args.repeat),
+                   "--workers", str(args.workers), "--thumb-size", str(args.thumb_size),
+                   "--thumb-format", args.thumb_format]
+        out = subprocess.run(command, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    try:
+        from PIL import __version__ as pillow
+    except ImportError:
+        pillow = None
+    return {
+        "commit": commit or "unknown",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": pillow,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def prepare_corpus(directory, args):
+    """Reuse directory if it holds a corpus generated with the same parameters, else generate it."""
+    wanted = {"count": args.count, "seed": args.seed, "scale": args.scale, "max_nodes": args.max_nodes}
+    manifest = corpus.load_manifest(directory)
+    if manifest is not None and all(manifest["params"].get(k) == v for k, v in wanted.items()):
+        return manifest
+    print(f"Generating {args.count} files in {directory}...", file=sys.stderr)
+    return corpus.generate(directory, args.count, args.seed, max_nodes=args.max_nodes, scale=args.scale)
+
+
+def print_results(results):
+    print(f"{'stage':<18} {'files/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak RSS MB':>12}")
+    for stage, r in results["stages"].items():
+        print(f"{stage:<18} {r['throughput']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['max_ms']:>9.2f} {r['peak_rss_mb']:>12.1f}")
+        for kind, k in r.get("kinds", {}).items():
+            print(f"  {kind:<16} {k['throughput']:>9.1f} {k['p50_ms']:>9.2f} {k['p95_ms']:>9.2f} "
+                  f"{k['p99_ms']:>9.2f} {k['max_ms']:>9.2f}")
+        if "children_rss_mb" in r:
+            print(f"  {'workers':<16} {'':>9} {'':>9} {'':>9} {'':>9} {'':>9} {r['children_rss_mb']:>12.1f}")
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of each metric against baseline. Returns the regressed (stage, metric) pairs."""
+    print(f"\nAgainst {baseline['environment']['commit']} ({baseline['environment']['created']}), "
+          f"tolerance {tolerance:.0f}%:")
+    regressions = []
+    for stage, r in results["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is None:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED:
+            old, new = before.get(metric), r.get(metric)
+            if not old or new is None:
+                continue
+            change = 100.0 * (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = " (worse)"
+                regressions.append((stage, metric))
+            elif worse < -tolerance:
+                flag = " (better)"
+            changes.append(f"{metric} {change:+.1f}%{flag}")
+        print(f"  {stage:<12} " + ", ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="corpus folder, generated if missing or made with other parameters (default: a temporary folder)")
+    parser.add_argument("--count", type=int, default=500, help="corpus files")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+    parser.add_argument("--scale", type=float, default=1.0, help="corpus resolution scale")
+    parser.add_argument("--max-nodes", type=int, default=10000, help="largest ComfyUI graph in the corpus")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stages to run")
+    parser.add_argument("--repeat", type=int, default=3, help="passes for the listing and batch stages")
+    parser.add_argument("--workers", type=int, default=0, help="batch worker processes (default: all cores)")
+    parser.add_argument("--thumb-size", type=int, default=256)
+    parser.add_argument("--thumb-format", default="webp", help="jpeg, webp or avif")
+    parser.add_argument("--save", nargs="?", const="", help="write results to PATH (default benchmarks/baselines/<commit>.json)")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="percent change reported as a regression")
+    parser.add_argument("--worker", nargs=2, metavar=("STAGE", "CORPUS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args)
+        return
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGE_FUNCTIONS]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.abspath(args.corpus or tmp)
+        manifest = prepare_corpus(directory, args)
+        results = {
+            "environment": environment(),
+            "corpus": dict(corpus.summary(manifest), params=manifest["params"]),
+            "stages": {},
+        }
+        for stage in stages:
+            print(f"Running {stage}...", file=sys.stderr)
+            results["stages"][stage] = run_stage(stage, directory, args)
+
+    c = results["corpus"]
+    print(f"Corpus: {c['files']} files, {c['bytes'] / 2**20:.1f} MB, graphs up to {c['max_nodes']} nodes "
+          f"(commit {results['environment']['commit']})")
+    print_results(results)
+
+    if args.save is not None:
+        path = args.save or os.path.join(HERE, "baselines", f"{results['environment']['commit']}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"\nSaved {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["corpus"]["params"] != results["corpus"]["params"]:
+            print("\nWarning: the baseline was measured on a different corpus", file=sys.stderr)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
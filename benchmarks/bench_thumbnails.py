@@ -0,0 +1,129 @@
+"""
+Thumbnail decode benchmark: the original full-decode path against the
+reduced-resolution fast path in thumbnails.render_thumbnail, then the fast
+path encoding WebP and AVIF instead of JPEG.
+
+    python benchmarks/bench_thumbnails.py [--count 5] [--size 285]
+
+Each (format, mode) pair runs in a fresh subprocess so peak RSS is measured
+in isolation. Peak RSS is the whole worker process; the "base" column is the
+peak after imports, before any image was touched.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SOURCES = {
+    "jpeg-4mp": ((2448, 1632), "JPEG", ".jpg"),
+    "jpeg-8mp": ((3456, 2304), "JPEG", ".jpg"),
+    "png-4mp": ((2448, 1632), "PNG", ".png"),
+    "webp-4mp": ((2448, 1632), "WEBP", ".webp"),
+}
+
+
+def legacy_thumbnail(file_path, size):
+    # The thumbnail route before the fast path was added
+    from PIL import Image
+    img = Image.open(file_path)
+    img.thumbnail((size, size))
+    if img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=70)
+    return buffer.getvalue()
+
+
+def make_corpus(directory, count):
+    from PIL import Image
+    paths = {}
+    for name, (dims, fmt, ext) in SOURCES.items():
+        # Smooth gradients with some detail compress like real renders
+        base = Image.radial_gradient("L").resize(dims).convert("RGB")
+        noise = Image.effect_noise(dims, 40).convert("RGB")
+        img = Image.blend(base, noise, 0.3)
+        paths[name] = []
+        for i in range(count):
+            path = os.path.join(directory, f"{name}_{i}{ext}")
+            img.save(path, fmt, quality=92) if fmt != "PNG" else img.save(path, fmt)
+            paths[name].append(path)
+    return paths
+
+
+def peak_rss_kb():
+    # ru_maxrss survives exec on Linux (the child would report the parent's
+    # peak), so prefer the per-address-space high water mark when available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_worker(mode, files, size):
+    import thumbnails
+    if mode == "legacy":
+        fn = legacy_thumbnail
+    else:
+        fmt = "jpeg" if mode == "fast" else mode
+        def fn(path, size):
+            return thumbnails.render_thumbnail(path, size, fmt)
+
+    rss_before = peak_rss_kb()
+    timings = []
+    total_bytes = 0
+    for path in files:
+        start = time.perf_counter()
+        total_bytes += len(fn(path, size))
+        timings.append(time.perf_counter() - start)
+    rss_after = peak_rss_kb()
+
+    print(json.dumps({
+        "mean_kb": total_bytes / len(files) / 1024,
+        "mean_ms": 1000 * sum(timings) / len(timings),
+        "min_ms": 1000 * min(timings),
+        "base_rss_mb": rss_before / 1024,
+        "peak_rss_mb": rss_after / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=5, help="images per source format")
+    parser.add_argument("--size", type=int, default=285, help="requested thumbnail size")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "FILES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, files = args.worker
+        run_worker(mode, files.split(os.pathsep), args.size)
+        return
+
+    import thumbnails
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = make_corpus(tmp, args.count)
+        modes = ["legacy", "fast"] + [fmt for fmt in thumbnails.AVAILABLE_FORMATS if fmt != "jpeg"]
+        print(f"{'source':<10} {'mode':<7} {'mean ms':>9} {'min ms':>9} {'mean KB':>8} {'base MB':>8} {'peak RSS MB':>12}")
+        for name, files in corpus.items():
+            for mode in modes:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--size", str(args.size), "--worker", mode, os.pathsep.join(files)],
+                    capture_output=True, text=True, check=True,
+                )
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{name:<10} {mode:<7} {r['mean_ms']:>9.1f} {r['min_ms']:>9.1f} {r['mean_kb']:>8.1f} {r['base_rss_mb']:>8.1f} {r['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
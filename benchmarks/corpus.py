@@ -0,0 +1,259 @@
+"""
+Synthetic image corpus for the benchmark suite: PNG, WebP and JPEG files at
+generation resolutions, carrying the metadata flavours the extractor reads.
+
+    python benchmarks/corpus.py OUT_DIR [--count 500] [--seed 0] [--max-nodes 10000] [--scale 1.0]
+
+Kinds (share of the corpus is set with --mix):
+
+    comfyui-png      tEXt "prompt" and "workflow" chunks
+    comfyui-webp     EXIF Make "Prompt: ..." and ImageDescription "Workflow: ..."
+    a1111-png        tEXt "parameters"
+    civitai-utf8     JPEG, EXIF UserComment, ASCII prefix, UTF-8 parameters text
+    civitai-utf16le  JPEG, EXIF UserComment, UNICODE prefix, UTF-16LE parameters text
+    civitai-json     WebP, EXIF UserComment, UTF-8 JSON with extraMetadata
+    none             JPEG without metadata
+
+ComfyUI graph sizes are log-uniform between --min-nodes and --max-nodes, and
+the first ComfyUI file always has --max-nodes, so every corpus spans the
+range. The same arguments always produce the same files; OUT_DIR gets a
+manifest.json describing them.
+"""
+import os
+import sys
+import json
+import math
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_graph_resolver import make_graph  # noqa: E402
+from bench_parameters_parser import make_parameters  # noqa: E402
+
+MANIFEST = "manifest.json"
+
+# Generation sizes seen in the wild (SD 1.5, SDXL, upscaled)
+RESOLUTIONS = (
+    (512, 512), (512, 768), (768, 512), (768, 768),
+    (832, 1216), (1216, 832), (1024, 1024), (1536, 1536), (2048, 2048),
+)
+
+DEFAULT_MIX = {
+    "comfyui-png": 40,
+    "comfyui-webp": 10,
+    "a1111-png": 15,
+    "civitai-utf8": 10,
+    "civitai-utf16le": 10,
+    "civitai-json": 10,
+    "none": 5,
+}
+
+EXTENSIONS = {"PNG": ".png", "WEBP": ".webp", "JPEG": ".jpg"}
+
+# EXIF tags (see GravityGalleryNode.extract_prompt_details)
+TAG_IMAGE_DESCRIPTION = 0x010E
+TAG_MAKE = 0x010F
+TAG_EXIF_IFD = 0x8769
+TAG_USER_COMMENT = 0x9286
+
+
+def parse_mix(text):
+    """ "kind=weight,..." -> {kind: weight}"""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown corpus kind: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def ui_workflow(prompt):
+    """A UI workflow ({"nodes", "links"}) with the same nodes and links as an API prompt."""
+    nodes, links = [], []
+    for node_id, node in prompt.items():
+        widgets = []
+        for name, value in node["inputs"].items():
+            if isinstance(value, list):
+                links.append([len(links) + 1, int(value[0]), value[1], int(node_id), len(widgets), name.upper()])
+            else:
+                widgets.append(value)
+        nodes.append({"id": int(node_id), "type": node["class_type"], "pos": [0, 0], "widgets_values": widgets})
+    return {"last_node_id": len(nodes), "last_link_id": len(links), "nodes": nodes, "links": links, "version": 0.4}
+
+
+def civitai_json(rng, parameters):
+    positive, _, rest = parameters.partition("\nNegative prompt: ")
+    negative = rest.split("\n", 1)[0]
+    extra = {
+        "prompt": positive, "negativePrompt": negative, "steps": rng.randrange(10, 60),
+        "sampler": "DPM++ 2M Karras", "cfgScale": rng.randrange(3, 12), "seed": rng.randrange(2**32),
+        "width": 832, "height": 1216,
+    }
+    resources = [{"type": "checkpoint", "modelVersionId": rng.randrange(10**6)}]
+    return json.dumps({"resources": resources, "extraMetadata": json.dumps(extra)})
+
+
+class _Pixels:
+    """Base pictures per resolution: a gradient with noise, which compresses like a render."""
+
+    def __init__(self, seed, scale):
+        self.seed = seed
+        self.scale = scale
+        self._cache = {}
+
+    def get(self, dims):
+        from PIL import Image
+        dims = tuple(max(16, int(d * self.scale)) for d in dims)
+        img = self._cache.get(dims)
+        if img is None:
+            rng = random.Random(f"{self.seed}-{dims}")
+            # Low-resolution noise upscaled: detail without the cost (or size) of per-pixel noise
+            noise = Image.frombytes("RGB", (dims[0] // 4, dims[1] // 4), rng.randbytes(dims[0] // 4 * (dims[1] // 4) * 3))
+            base = Image.radial_gradient("L").resize(dims).convert("RGB")
+            img = self._cache[dims] = Image.blend(base, noise.resize(dims), 0.3)
+        return img
+
+
+def _exif(tags=None, user_comment=None):
+    from PIL import Image
+    exif = Image.Exif()
+    for tag, value in (tags or {}).items():
+        exif[tag] = value
+    if user_comment is not None:
+        exif.get_ifd(TAG_EXIF_IFD)[TAG_USER_COMMENT] = user_comment
+    return exif.tobytes()
+
+
+def write_file(path, kind, img, rng, nodes):
+    """Write one corpus file of kind. Returns its manifest record (minus filename)."""
+    from PIL import PngImagePlugin
+    record = {"kind": kind, "width": img.width, "height": img.height}
+
+    if kind == "comfyui-png":
+        prompt = make_graph(nodes, depth=rng.randrange(1, 4), seed=rng.randrange(2**32))
+        info = PngImagePlugin.PngInfo()
+        info.add_text("prompt", json.dumps(prompt))
+        info.add_text("workflow", json.dumps(ui_workflow(prompt)))
+        img.save(path, "PNG", pnginfo=info, compress_level=1)
+        record["nodes"] = len(prompt)
+    elif kind == "comfyui-webp":
+        prompt = make_graph(nodes, depth=rng.randrange(1, 4), seed=rng.randrange(2**32))
+        exif = _exif({
+            TAG_MAKE: "Prompt: " + json.dumps(prompt),
+            TAG_IMAGE_DESCRIPTION: "Workflow: " + json.dumps(ui_workflow(prompt)),
+        })
+        img.save(path, "WEBP", quality=80, method=0, exif=exif)
+        record["nodes"] = len(prompt)
+    elif kind == "a1111-png":
+        info = PngImagePlugin.PngInfo()
+        info.add_text("parameters", make_parameters(rng, rng.randrange(10, 120)))
+        img.save(path, "PNG", pnginfo=info, compress_level=1)
+    elif kind == "civitai-utf8":
+        text = make_parameters(rng, rng.randrange(10, 120))
+        img.save(path, "JPEG", quality=90, exif=_exif(user_comment=b"ASCII\0\0\0" + text.encode("utf-8")))
+    elif kind == "civitai-utf16le":
+        text = make_parameters(rng, rng.randrange(10, 120))
+        img.save(path, "JPEG", quality=90, exif=_exif(user_comment=b"UNICODE\0" + text.encode("utf-16le")))
+    elif kind == "civitai-json":
+        text = civitai_json(rng, make_parameters(rng, rng.randrange(10, 120)))
+        img.save(path, "WEBP", quality=80, method=0, exif=_exif(user_comment=b"ASCII\0\0\0" + text.encode("utf-8")))
+    else:
+        img.save(path, "JPEG", quality=90)
+    return record
+
+
+KIND_FORMATS = {
+    "comfyui-png": "PNG", "comfyui-webp": "WEBP", "a1111-png": "PNG", "civitai-utf8": "JPEG",
+    "civitai-utf16le": "JPEG", "civitai-json": "WEBP", "none": "JPEG",
+}
+
+
+def generate(directory, count=500, seed=0, mix=None, min_nodes=10, max_nodes=10000, scale=1.0, progress=None):
+    """
+    Write count files into directory (created if needed) and return the
+    manifest, which is also saved as directory/manifest.json.
+    """
+    mix = mix or DEFAULT_MIX
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    pixels = _Pixels(seed, scale)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    first_graph = True
+    files = []
+    for i, kind in enumerate(kinds):
+        nodes = 0
+        if kind.startswith("comfyui"):
+            if first_graph:
+                nodes, first_graph = max_nodes, False
+            else:
+                nodes = int(math.exp(rng.uniform(math.log(min_nodes), math.log(max_nodes))))
+        filename = f"{i:05d}_{kind}{EXTENSIONS[KIND_FORMATS[kind]]}"
+        img = pixels.get(rng.choice(RESOLUTIONS))
+        record = write_file(os.path.join(directory, filename), kind, img, rng, nodes)
+        record["filename"] = filename
+        record["bytes"] = os.path.getsize(os.path.join(directory, filename))
+        files.append(record)
+        if progress is not None:
+            progress(i + 1, count)
+
+    manifest = {
+        "params": {
+            "count": count, "seed": seed, "mix": mix, "min_nodes": min_nodes,
+            "max_nodes": max_nodes, "scale": scale,
+        },
+        "files": files,
+    }
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load_manifest(directory):
+    """The manifest of a generated corpus, or None."""
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def summary(manifest):
+    """{kind: files}, total bytes and the largest graph, for reports."""
+    kinds = {}
+    for record in manifest["files"]:
+        kinds[record["kind"]] = kinds.get(record["kind"], 0) + 1
+    return {
+        "files": len(manifest["files"]),
+        "bytes": sum(record["bytes"] for record in manifest["files"]),
+        "max_nodes": max((record.get("nodes", 0) for record in manifest["files"]), default=0),
+        "kinds": dict(sorted(kinds.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--count", type=int, default=500, help="files to write")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="kind=weight,... (default: " + ",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()) + ")")
+    parser.add_argument("--min-nodes", type=int, default=10, help="smallest ComfyUI graph")
+    parser.add_argument("--max-nodes", type=int, default=10000, help="largest ComfyUI graph")
+    parser.add_argument("--scale", type=float, default=1.0, help="resolution scale (e.g. 0.25 for a quick corpus)")
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f"\r{done}/{total} files", end="", file=sys.stderr, flush=True)
+
+    manifest = generate(args.directory, args.count, args.seed, args.mix, args.min_nodes,
+                        args.max_nodes, args.scale, progress)
+    print(file=sys.stderr)
+    print(json.dumps(summary(manifest), indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+try:
+    from . import listing
+    from . import timing
+except ImportError:
+    import listing
+    import timing
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function and callers arriving while it runs wait for it and get the same
+    result (or exception). Nothing is remembered once the call returns.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+class _Session:
+    def __init__(self, entries):
+        self.entries = entries
+        self.loaded_at = time.monotonic()
+        self.orders = {}  # (sort, order) -> sorted entries
+        self.derived = {}  # (name, sort, order) -> derived() results
+        self.filenames = None
+
+
+class DirectorySessions:
+    """
+    Process-wide directory listings shared by every gallery node and route.
+
+    A listing read with load(directory, options) is reused for fresh_seconds,
+    together with the sorted orders asked of it, and concurrent reads of a
+    directory share one load, so N galleries on one folder cost one scan.
+    Listings are kept per directory string and listing.ScanOptions.
+    invalidate() drops the listings a folder is part of early (e.g. when the
+    watcher saw a change).
+
+    Returned lists are shared between callers and must not be modified.
+    """
+
+    def __init__(self, load, fresh_seconds=2.0, max_directories=32):
+        self.load = load
+        self.fresh_seconds = fresh_seconds
+        self.max_directories = max_directories
+        self.loads = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # (normalized roots, options) -> _Session, least recently used first
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def _normalize(directory):
+        return os.path.normcase(os.path.abspath(directory))
+
+    def _key(self, directory, options):
+        return tuple(self._normalize(root) for root in listing.parse_roots(directory)), options
+
+    def _fresh(self, key):
+        # Called with the lock held
+        session = self._sessions.get(key)
+        if session is None or time.monotonic() - session.loaded_at >= self.fresh_seconds:
+            return None
+        self._sessions.move_to_end(key)
+        return session
+
+    def _load(self, key, directory, options):
+        session = _Session(self.load(directory, options))
+        with self._lock:
+            self.loads += 1
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_directories:
+                self._sessions.popitem(last=False)
+        return session
+
+    def _session(self, directory, options):
+        key = self._key(directory, options)
+        with self._lock:
+            session = self._fresh(key)
+            if session is not None:
+                self.hits += 1
+                return session
+        return self._flight.do(key, self._load, key, directory, options)
+
+    def entries(self, directory, options=listing.TOP_LEVEL):
+        """Unsorted {filename, mtime, size, rating} entries of a directory."""
+        return self._session(directory, options).entries
+
+    def peek(self, directory, options=listing.TOP_LEVEL):
+        """Entries of a directory if a fresh listing is held, else None (never loads)."""
+        with self._lock:
+            session = self._fresh(self._key(directory, options))
+        return session.entries if session is not None else None
+
+    def sorted_entries(self, directory, sort="mtime", order="desc", options=listing.TOP_LEVEL):
+        """Entries sorted like listing.sort_entries; each order is sorted once per listing."""
+        return self._sorted(self._session(directory, options), sort, order)
+
+    def peek_sorted(self, directory, sort="mtime", order="desc", options=listing.TOP_LEVEL):
+        """sorted_entries() if a fresh listing is held, else None (never loads)."""
+        with self._lock:
+            session = self._fresh(self._key(directory, options))
+        return self._sorted(session, sort, order) if session is not None else None
+
+    def _sorted(self, session, sort, order):
+        entries = session.orders.get((sort, order))
+        if entries is None:
+            entries = self._flight.do((id(session), sort, order), self._sort, session, sort, order)
+        return entries
+
+    def _sort(self, session, sort, order):
+        with timing.metrics.timer("listing.sort"):
+            entries = listing.sort_entries(list(session.entries), sort, order == "desc")
+        session.orders[(sort, order)] = entries
+        return entries
+
+    def derived(self, directory, name, compute, sort="mtime", order="desc", options=listing.TOP_LEVEL):
+        """
+        compute(sorted entries), kept with the listing like its sorted orders
+        (e.g. the duplicate-collapsed view). name must identify compute and
+        its arguments; concurrent callers share one computation.
+        """
+        session = self._session(directory, options)
+        key = (name, sort, order)
+        result = session.derived.get(key)
+        if result is None:
+            result = self._flight.do((id(session),) + key, self._derive, session, key, compute)
+        return result
+
+    def _derive(self, session, key, compute):
+        _, sort, order = key
+        result = session.derived[key] = compute(self._sorted(session, sort, order))
+        return result
+
+    def filenames(self, directory, options=listing.TOP_LEVEL):
+        """Filenames in plain sorted order (the order random picks index into)."""
+        session = self._session(directory, options)
+        if session.filenames is None:
+            session.filenames = sorted(entry["filename"] for entry in session.entries)
+        return session.filenames
+
+    def invalidate(self, directory):
+        """Drop every listing that includes directory (as a root or below one)."""
+        folder = self._normalize(directory)
+        with self._lock:
+            for key in list(self._sessions):
+                roots = key[0]
+                if any(folder == root or folder.startswith(root.rstrip(os.sep) + os.sep) for root in roots):
+                    del self._sessions[key]
+
+    def stats(self):
+        with self._lock:
+            directories = len(self._sessions)
+        return {
+            "directories": directories,
+            "loads": self.loads,
+            "hits": self.hits,
+            "coalesced": self._flight.coalesced,
+        }
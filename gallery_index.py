@@ -0,0 +1,336 @@
+import os
+import re
+import queue
+import sqlite3
+import threading
+
+try:
+    from .listing import IMAGE_EXTENSIONS
+except ImportError:
+    from listing import IMAGE_EXTENSIONS
+
+# Persistent per-directory index of image metadata, stored in SQLite (WAL mode
+# so the background scanner never blocks readers). Rescans are incremental:
+# only files whose mtime or size changed since the last scan are re-read.
+
+# Rows written per transaction while scanning
+SCAN_BATCH_SIZE = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    directory TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    prompt TEXT,
+    debug_info TEXT,
+    format TEXT,
+    rating REAL NOT NULL DEFAULT 0,
+    parameters TEXT,
+    PRIMARY KEY (directory, filename)
+);
+CREATE TABLE IF NOT EXISTS directories (
+    directory TEXT PRIMARY KEY,
+    file_count INTEGER NOT NULL
+);
+"""
+
+# Full-text index over extracted prompts. It is an external-content FTS5 table
+# kept in sync with "files" by triggers, so every index update is incremental.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE files_fts USING fts5(
+    prompt, content='files', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER files_fts_insert AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts(rowid, prompt) VALUES (new.rowid, new.prompt);
+END;
+CREATE TRIGGER files_fts_delete AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, prompt) VALUES ('delete', old.rowid, old.prompt);
+END;
+CREATE TRIGGER files_fts_update AFTER UPDATE OF prompt ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, prompt) VALUES ('delete', old.rowid, old.prompt);
+    INSERT INTO files_fts(rowid, prompt) VALUES (new.rowid, new.prompt);
+END;
+"""
+
+_XMP_RATING = re.compile(r"xmp:Rating(?:\s*=\s*[\"']|>)\s*(-?\d+(?:\.\d+)?)")
+EXIF_RATING_TAG = 0x4746
+
+
+def rating_from_metadata(info, exif):
+    """Star rating from an XMP packet or the EXIF Rating tag, 0 if absent."""
+    for key in ("XML:com.adobe.xmp", "xmp"):
+        xmp = info.get(key)
+        if isinstance(xmp, bytes):
+            xmp = xmp.decode("utf-8", errors="ignore")
+        if xmp:
+            match = _XMP_RATING.search(xmp)
+            if match:
+                return max(0.0, float(match.group(1)))
+    value = exif.get(EXIF_RATING_TAG) if exif else None
+    if isinstance(value, int):
+        return float(max(0, value))
+    return 0.0
+
+
+def apply_ratings(entries, ratings, key=None):
+    """
+    Yield listing entries with the indexed rating of every file that is
+    unchanged (same mtime and size) since it was indexed; others keep theirs.
+    ratings are keyed by filename, or by key(entry) when given.
+    """
+    for entry in entries:
+        known = ratings.get(entry["filename"] if key is None else key(entry))
+        # Listings carry float mtimes; one microsecond absorbs the rounding
+        if known is not None and known[1] == entry["size"] and abs(known[0] / 1e9 - entry["mtime"]) < 1e-6:
+            entry["rating"] = known[2]
+        yield entry
+
+
+def normalize_directory(directory):
+    return os.path.normcase(os.path.abspath(directory))
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, the last one
+    as a prefix so results update while typing. Words are quoted so FTS5
+    operators and punctuation in prompts are taken literally.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = ['"' + w.replace('"', '""') + '"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class GalleryIndex:
+    """
+    SQLite-backed index of image metadata per directory.
+
+    extractor(path) must return a dict with the keys prompt, debug_info,
+    format, width, height, rating and parameters (generation parameters as
+    JSON). It is only called for files that are new or changed since the
+    last scan.
+    """
+
+    def __init__(self, db_path, extractor):
+        self.db_path = db_path
+        self.extractor = extractor
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._worker = None
+        self.fts_enabled = None
+
+    def _connect(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+            self._init_fts(conn)
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+        if "parameters" not in columns:
+            try:
+                with conn:
+                    conn.execute("ALTER TABLE files ADD COLUMN parameters TEXT")
+                    # Invalidate every row so the next scan extracts the new column
+                    conn.execute("UPDATE files SET mtime_ns = -1")
+            except sqlite3.OperationalError:
+                pass  # Another thread added it first
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(directories)")}
+        if "dir_mtime_ns" in columns:
+            try:
+                with conn:
+                    # Only records which directories were scanned; the next scan refills it
+                    conn.execute("DROP TABLE directories")
+            except sqlite3.OperationalError:
+                pass  # Another thread dropped it first
+            conn.executescript(_SCHEMA)
+
+    def _init_fts(self, conn):
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files_fts'"
+        ).fetchone()
+        if exists:
+            self.fts_enabled = True
+            return
+        try:
+            with conn:
+                conn.executescript(_FTS_SCHEMA)
+                # Index rows written before full-text search existed
+                conn.execute("INSERT INTO files_fts(files_fts) VALUES ('rebuild')")
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: search falls back to LIKE scans
+            print(f"Gravity Gallery: full-text search unavailable ({e}), using slow search")
+            self.fts_enabled = False
+
+    def ratings(self, directory):
+        """{filename: (mtime_ns, size, rating)} of the indexed files of a directory."""
+        rows = self._connect().execute(
+            "SELECT filename, mtime_ns, size, rating FROM files WHERE directory = ?",
+            (normalize_directory(directory),),
+        )
+        return {filename: (mtime_ns, size, rating) for filename, mtime_ns, size, rating in rows}
+
+    def ratings_under(self, root):
+        """{normalized path: (mtime_ns, size, rating)} of the indexed files in root and its subfolders."""
+        key = normalize_directory(root)
+        prefix = key.rstrip(os.sep) + os.sep
+        # Subfolders sort between "root/" and the next separator value
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        rows = self._connect().execute(
+            "SELECT directory, filename, mtime_ns, size, rating FROM files "
+            "WHERE directory = ? OR (directory >= ? AND directory < ?)",
+            (key, prefix, upper),
+        )
+        return {
+            os.path.join(directory, filename): (mtime_ns, size, rating)
+            for directory, filename, mtime_ns, size, rating in rows
+        }
+
+    def lookup(self, path, mtime_ns, size):
+        """(prompt, debug_info, parameters) for a file if indexed at this exact mtime and size."""
+        directory, filename = os.path.split(path)
+        row = self._connect().execute(
+            "SELECT prompt, debug_info, parameters FROM files "
+            "WHERE directory = ? AND filename = ? AND mtime_ns = ? AND size = ? AND prompt IS NOT NULL",
+            (normalize_directory(directory), filename, mtime_ns, size),
+        ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def scan(self, directory):
+        """
+        Bring the index for a directory up to date. Returns counts of added,
+        updated and removed files.
+        """
+        key = normalize_directory(directory)
+        on_disk = {}
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                    st = entry.stat()
+                    on_disk[entry.name] = (st.st_mtime_ns, st.st_size)
+
+        conn = self._connect()
+        known = {
+            filename: (mtime_ns, size)
+            for filename, mtime_ns, size in conn.execute(
+                "SELECT filename, mtime_ns, size FROM files WHERE directory = ?", (key,)
+            )
+        }
+
+        removed = [name for name in known if name not in on_disk]
+        changed = [name for name, ident in on_disk.items() if known.get(name) != ident]
+
+        with conn:
+            conn.executemany(
+                "DELETE FROM files WHERE directory = ? AND filename = ?",
+                [(key, name) for name in removed],
+            )
+
+        for start in range(0, len(changed), SCAN_BATCH_SIZE):
+            rows = []
+            for name in changed[start:start + SCAN_BATCH_SIZE]:
+                mtime_ns, size = on_disk[name]
+                try:
+                    record = self.extractor(os.path.join(directory, name))
+                except Exception as e:
+                    # Kept with the file's identity (and no prompt), so it is only
+                    # tried again once the file changes
+                    record = {"prompt": None, "debug_info": f"Exception: {e}"}
+                rows.append((
+                    key, name, mtime_ns, size,
+                    record.get("width"), record.get("height"),
+                    record.get("prompt"), record.get("debug_info"),
+                    record.get("format"), record.get("rating") or 0.0,
+                    record.get("parameters"),
+                ))
+            with conn:
+                # Upsert rather than REPLACE so the full-text triggers see an update
+                conn.executemany(
+                    "INSERT INTO files "
+                    "(directory, filename, mtime_ns, size, width, height, prompt, debug_info, format, rating, parameters) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (directory, filename) DO UPDATE SET "
+                    "mtime_ns = excluded.mtime_ns, size = excluded.size, width = excluded.width, "
+                    "height = excluded.height, prompt = excluded.prompt, debug_info = excluded.debug_info, "
+                    "format = excluded.format, rating = excluded.rating, parameters = excluded.parameters",
+                    rows,
+                )
+
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO directories (directory, file_count) VALUES (?, ?)",
+                (key, len(on_disk)),
+            )
+
+        added = sum(1 for name in changed if name not in known)
+        return {"added": added, "updated": len(changed) - added, "removed": len(removed)}
+
+    def search(self, directory, text, offset=0, limit=100):
+        """
+        Files of a directory whose prompt matches text, best match first.
+        Returns (total, filenames) with filenames sliced by offset/limit, or
+        None if the directory has not been indexed yet.
+        """
+        conn = self._connect()
+        key = normalize_directory(directory)
+        if conn.execute("SELECT 1 FROM directories WHERE directory = ?", (key,)).fetchone() is None:
+            return None
+
+        if self.fts_enabled:
+            query = fts_query(text)
+            if query is None:
+                return 0, []
+            where = "FROM files_fts JOIN files ON files.rowid = files_fts.rowid WHERE files_fts MATCH ? AND files.directory = ?"
+            params = (query, key)
+            order = "ORDER BY files_fts.rank"
+        else:
+            words = re.findall(r"\w+", text)
+            if not words:
+                return 0, []
+            where = "FROM files WHERE " + " AND ".join("prompt LIKE ?" for _ in words) + " AND directory = ?"
+            params = tuple(f"%{w}%" for w in words) + (key,)
+            order = "ORDER BY filename"
+
+        (total,) = conn.execute(f"SELECT COUNT(*) {where}", params).fetchone()
+        rows = conn.execute(f"SELECT files.filename {where} {order} LIMIT ? OFFSET ?", params + (limit, offset))
+        return total, [filename for (filename,) in rows]
+
+    def request_scan(self, directory):
+        """Queue a background rescan of a directory (no-op if one is already queued)."""
+        key = normalize_directory(directory)
+        with self._pending_lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="gravity-gallery-index", daemon=True)
+                self._worker.start()
+        self._queue.put(directory)
+
+    def _run(self):
+        while True:
+            directory = self._queue.get()
+            # Cleared before scanning so changes made meanwhile queue another pass
+            with self._pending_lock:
+                self._pending.discard(normalize_directory(directory))
+            try:
+                self.scan(directory)
+            except Exception as e:
+                print(f"Gravity Gallery: index scan of {directory} failed: {e}")
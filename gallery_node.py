@@ -1,8 +1,63 @@
 import os
+import sys
 import json
 import random
-from PIL import Image, ExifTags
-import folder_paths
+import subprocess
+from PIL import Image
+
+try:
+    from . import settings
+    from . import listing
+    from . import timing
+    from . import archives
+    from . import metadata_reader
+    from .result_cache import LRUCache
+    from .gallery_index import GalleryIndex, apply_ratings, normalize_directory, rating_from_metadata
+    from .graph_resolver import PromptGraph, is_text_node
+    from .directory_sessions import DirectorySessions, SingleFlight
+    from . import batch_extract
+    from . import parameters_parser
+except ImportError:
+    import settings
+    import listing
+    import timing
+    import archives
+    import metadata_reader
+    from result_cache import LRUCache
+    from gallery_index import GalleryIndex, apply_ratings, normalize_directory, rating_from_metadata
+    from graph_resolver import PromptGraph, is_text_node
+    from directory_sessions import DirectorySessions, SingleFlight
+    import batch_extract
+    import parameters_parser
+
+# Where an extracted prompt came from
+FORMAT_CIVITAI = "Civitai"
+FORMAT_A1111 = "A1111"
+FORMAT_COMFYUI = "ComfyUI"
+FORMAT_WORKFLOW = "Workflow"
+
+# Node outputs: the prompt, the debug log, then the generation parameters
+# (blank / 0 when the metadata does not carry them)
+OUTPUT_TYPES = ("STRING", "STRING", "STRING", "INT", "STRING", "FLOAT", "INT", "INT", "INT", "STRING")
+OUTPUT_NAMES = ("prompt_string", "debug_info", "negative_prompt", "steps", "sampler", "cfg", "seed", "width", "height", "resources")
+
+# Optional inputs choosing which files the gallery lists (see listing.ScanOptions).
+# directory may also name several folders separated by os.pathsep.
+SCAN_INPUTS = {
+    "recursive": ("BOOLEAN", {"default": False}),
+    "max_depth": ("INT", {"default": listing.DEFAULT_MAX_DEPTH, "min": 0, "max": 64}),
+    "exclude": ("STRING", {"default": ""}),
+}
+
+# Node outputs per (absolute path, mtime_ns, size)
+extraction_cache = LRUCache(
+    settings.RESULT_CACHE_ENTRIES,
+    settings.RESULT_CACHE_BYTES,
+    sizeof=lambda result: sum(len(v) for v in result if isinstance(v, str)),
+)
+
+# Nodes executing the same file at once share one extraction
+extraction_flight = SingleFlight()
 
 class GravityGalleryNode:
     def __init__(self):
@@ -18,10 +73,11 @@ class GravityGalleryNode:
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
                 "randomize_output": ("BOOLEAN", {"default": False}),
             },
+            "optional": SCAN_INPUTS,
         }
 
-    RETURN_TYPES = ("STRING", "STRING")
-    RETURN_NAMES = ("prompt_string", "debug_info")
+    RETURN_TYPES = OUTPUT_TYPES
+    RETURN_NAMES = OUTPUT_NAMES
     FUNCTION = "process"
     CATEGORY = "Gravity"
     
@@ -30,86 +86,50 @@ class GravityGalleryNode:
     def VALIDATE_INPUTS(s, directory, thumbnail_size, image):
         return True
         
-    def get_node_input(self, node_id, input_key, prompt_json, visited=None):
-        if visited is None:
-            visited = set()
-        
-        if node_id in visited:
-            return None # Cycle detected
-        visited.add(node_id)
-        
-        if node_id not in prompt_json:
-            return None
-            
-        node = prompt_json[node_id]
-        inputs = node.get("inputs", {})
-        
-        # If the specific input key isn't there, we can't find it
-        if input_key not in inputs:
-            return None
-            
-        val = inputs[input_key]
-        
-        # If it's a raw string/int/float, return it
-        if isinstance(val, (str, int, float, bool)):
-             return str(val)
-             
-        # If it's a link: [node_id, slot_index]
-        if isinstance(val, list) and len(val) == 2:
-            source_node_id = str(val[0])
-            
-            # Recursive lookup
-            if source_node_id in prompt_json:
-                source_node = prompt_json[source_node_id]
-                source_inputs = source_node.get("inputs", {})
-                
-                # Common value keys for primitives or string nodes
-                for key in ["text", "string", "value", "string_field", "prompt"]:
-                    if key in source_inputs:
-                        res = self.get_node_input(source_node_id, key, prompt_json, visited)
-                        if res: 
-                            return res
-                            
-            return f"<Link to Node {source_node_id}>"
-            
-        return str(val)
-
     def extract_positive_prompt(self, parameters_text):
         """
         Extract only the positive prompt from A1111/Civitai parameters text.
         Stops extraction when hitting any metadata phrase.
         """
-        # Define the phrases that mark the end of the positive prompt
-        stop_phrases = [
-            "Negative prompt:",
-            "Steps:",
-            "Sampler:",
-            "CFG scale:",
-            "Seed:",
-            "Size:",
-            "Clip skip:",
-            "Created Date:",
-            "Civitai resources:",
-            "Civitai metadata:"
-        ]
-        
-        # Find the earliest occurrence of any stop phrase
-        earliest_index = len(parameters_text)
-        for phrase in stop_phrases:
-            index = parameters_text.find(phrase)
-            if index != -1 and index < earliest_index:
-                earliest_index = index
-        
-        # Extract everything before the first stop phrase
-        prompt = parameters_text[:earliest_index].strip()
-        return prompt
+        return parameters_parser.positive_prompt(parameters_text)
+
+    def read_image_metadata(self, image_path, debug_log):
+        """
+        Return (info, exif, exif_ifd) for an image: text metadata by key, and
+        the main IFD and EXIF sub-IFD tags by id. PNG and WebP are read by the
+        header-only reader; other formats, or files it cannot parse, use PIL.
+        image_path may be an archive member path (see archives.py).
+        """
+        with archives.open_file(image_path) as f:
+            try:
+                metadata = metadata_reader.read_metadata_file(f)
+                if metadata is not None:
+                    return metadata
+            except metadata_reader.MetadataError as e:
+                debug_log.append(f"Header reader failed ({e}), falling back to PIL.")
+
+            f.seek(0)
+            with Image.open(f) as img:
+                info = img.info.copy() # Copy so we can modify it
+                exif = img.getexif()
+                # 0x8769 is the EXIF IFD pointer (sub-directory containing UserComment)
+                exif_ifd = exif.get_ifd(0x8769) if exif else {}
+                return info, dict(exif), dict(exif_ifd)
 
-    def process(self, directory, image, thumbnail_size=100, seed=0, randomize_output=False):
-        return self._process_logic(directory, image, seed, randomize_output)
+    def process(self, directory, image, thumbnail_size=100, seed=0, randomize_output=False,
+                recursive=False, max_depth=listing.DEFAULT_MAX_DEPTH, exclude=""):
+        scan = listing.scan_options(recursive, max_depth, exclude)
+        return self._process_logic(directory, image, seed, randomize_output, scan)
 
-    def _process_logic(self, directory, image, seed, randomize_output):
+    @classmethod
+    def resolve_image(s, directory, image, seed, randomize_output, scan=listing.TOP_LEVEL):
+        """
+        Work out which file an execution reads. Returns (image_path, None), or
+        (None, result) when there is nothing to read and result is final.
+        scan (listing.ScanOptions) picks the files randomize_output draws from.
+        """
         if not directory:
-            return ("", "No directory provided")
+            return None, ("", "No directory provided")
             
         selected_image = image
         if isinstance(selected_image, (list, tuple)):
@@ -119,263 +139,370 @@ class GravityGalleryNode:
                 selected_image = ""
 
         if randomize_output:
-            if os.path.isdir(directory):
-                files = [f for f in os.listdir(directory) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp'))]
+            if listing.roots_exist(directory):
+                # Shared listing: several nodes on one folder cost one scan
+                files = directory_sessions.filenames(directory, scan)
                 if files:
-                    files.sort()
                     r = random.Random(seed)
                     selected_image = r.choice(files)
                 else:
-                    return ("", f"No images found in {directory}")
+                    return None, ("", f"No images found in {directory}")
             else:
-                return ("", f"Directory not found: {directory}")
+                return None, ("", f"Directory not found: {directory}")
 
         if not selected_image:
-            return ("", "No image selected")
+            return None, ("", "No image selected")
 
         image_path = os.path.join(directory, selected_image)
 
-        if not os.path.exists(image_path):
-            return (f"Error: File not found {image_path}", f"Path checked: {image_path}")
+        if not archives.exists(image_path):
+            return None, (f"Error: File not found {image_path}", f"Path checked: {image_path}")
+        return image_path, None
+
+    @staticmethod
+    def file_identity(image_path):
+        st = archives.stat(image_path)
+        return (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+
+    @classmethod
+    def execution_fingerprint(s, directory, image, seed, randomize_output, scan=listing.TOP_LEVEL):
+        """
+        Value for IS_CHANGED: changes exactly when the extracted output can.
+        """
+        image_path, result = s.resolve_image(directory, image, seed, randomize_output, scan)
+        if result is not None:
+            return "|".join(result)
+        try:
+            path, mtime_ns, size = s.file_identity(image_path)
+        except OSError:
+            return f"missing|{image_path}"
+        return f"{path}|{mtime_ns}|{size}|{f'{seed}|{scan}' if randomize_output else ''}"
+
+    @classmethod
+    def IS_CHANGED(s, directory="", image="", seed=0, randomize_output=False,
+                   recursive=False, max_depth=listing.DEFAULT_MAX_DEPTH, exclude="", **kwargs):
+        scan = listing.scan_options(recursive, max_depth, exclude)
+        return s.execution_fingerprint(directory, image, seed, randomize_output, scan)
+
+    def _process_logic(self, directory, image, seed, randomize_output, scan=listing.TOP_LEVEL):
+        timings = timing.CallTimings()
+        image_path, result = self.resolve_image(directory, image, seed, randomize_output, scan)
+        timings.mark("extract.resolve")
+        if result is not None:
+            return self.outputs(*result)
+
+        # Results are memoized per file identity, so re-running a queue over the
+        # same folder parses each file only once
+        try:
+            identity = self.file_identity(image_path)
+        except OSError:
+            return self.outputs(f"Error: File not found {image_path}", f"Path checked: {image_path}")
+        result = extraction_flight.do(identity, self._cached_outputs, identity, image_path, timings)
+        timing.metrics.observe("extract.total", timings.elapsed)
+        if settings.DEBUG_TIMINGS:
+            # Appended to this call's output only; cached results stay clean
+            result = (result[0], f"{result[1]}\n{timings.summary()}") + result[2:]
+        return result
+
+    def _cached_outputs(self, identity, image_path, timings=None):
+        timings = timings if timings is not None else timing.CallTimings()
+        cached = extraction_cache.get(identity)
+        if cached is not None:
+            timing.metrics.count("extract.cache_hit")
+        if cached is None and settings.INDEX_ENABLED:
+            row = None
+            try:
+                row = gallery_index.lookup(*identity)
+            except Exception as e:
+                print(f"Gravity Gallery: index lookup failed: {e}")
+            if row is not None:
+                prompt_string, debug_info, generation = row
+                cached = self.outputs(prompt_string, debug_info, json.loads(generation) if generation else None)
+                extraction_cache.put(identity, cached)
+                timing.metrics.count("extract.index_hit")
+            timings.mark("extract.index_lookup")
+        if cached is not None:
+            return cached
+
+        timing.metrics.count("extract.miss")
+        try:
+            prompt_string, debug_info, _, generation = self.extract_prompt_details(image_path, timings=timings)
+        except Exception as e:
+            return self.outputs(f"Error reading image: {e}", f"Exception: {str(e)}")
+
+        result = self.outputs(prompt_string, debug_info, generation)
+        extraction_cache.put(identity, result)
+        return result
+
+    @staticmethod
+    def outputs(prompt_string, debug_info, generation=None):
+        """Node output tuple (see OUTPUT_NAMES) from a prompt, debug log and generation record."""
+        g = generation or parameters_parser.empty_record()
+        return (
+            prompt_string,
+            debug_info,
+            g["negative"],
+            g["steps"],
+            g["sampler"],
+            g["cfg"],
+            g["seed"],
+            g["width"],
+            g["height"],
+            json.dumps(g["resources"]) if g["resources"] else "",
+        )
+
+    def extract_prompt(self, image_path):
+        """Extract (prompt_string, debug_info) from an image's metadata."""
+        prompt_string, debug_info, _, _ = self.extract_prompt_details(image_path)
+        return (prompt_string, debug_info)
 
+    def extract_prompt_details(self, image_path, metadata=None, timings=None):
+        """
+        Like extract_prompt, but returns (prompt_string, debug_info, format,
+        generation). format is the metadata flavour the prompt came from:
+        "Civitai" (UserComment), "A1111" (parameters), "ComfyUI" (prompt
+        graph), "Workflow" (workflow only) or None. generation is a
+        parameters_parser record (negative prompt, steps, sampler...) or None.
+        metadata may pass an (info, exif, exif_ifd) tuple that was already read.
+        timings (a timing.CallTimings) gets a mark after each stage.
+        """
         debug_log = []
+        generation = None
+        timings = timings if timings is not None else timing.CallTimings()
+        if metadata is None:
+            metadata = self.read_image_metadata(image_path, debug_log)
+            timings.mark("extract.read_metadata")
+        info, exif, exif_ifd = metadata
+        
+        # WEBP Handling: Extract Metadata from Exif Tags
+        # ComfyUI often saves metadata in:
+        # 270 (0x010e) ImageDescription -> Full Workflow
+        # 271 (0x010f) Make -> Prompt / Generation Nodes
+        # 0x0110 Model -> Prompt
+        # 0x8298 Copyright -> Workflow
+        # 0x9286 UserComment -> Workflow/Prompt
         try:
-            with Image.open(image_path) as img:
-                info = img.info.copy() # Copy so we can modify it
+            if exif or exif_ifd:
+                # Priority list: (Tag ID, Name, Target Key)
+                # Main IFD tags
+                target_tags = {
+                    270: "ImageDescription", 
+                    271: "Make", 
+                    0x0110: "Model", 
+                    0x8298: "Copyright"
+                }
                 
-                # WEBP Handling: Extract Metadata from Exif Tags
-                # ComfyUI often saves metadata in:
-                # 270 (0x010e) ImageDescription -> Full Workflow
-                # 271 (0x010f) Make -> Prompt / Generation Nodes
-                # 0x0110 Model -> Prompt
-                # 0x8298 Copyright -> Workflow
-                # 0x9286 UserComment -> Workflow/Prompt
-                try:
-                    exif = img.getexif()
-                    if exif:
-                        # Get EXIF IFD (sub-directory) which contains UserComment
-                        exif_ifd = exif.get_ifd(0x8769)  # 0x8769 is the EXIF IFD pointer
-                        
-                        # Priority list: (Tag ID, Name, Target Key)
-                        # Main IFD tags
-                        target_tags = {
-                            270: "ImageDescription", 
-                            271: "Make", 
-                            0x0110: "Model", 
-                            0x8298: "Copyright"
-                        }
-                        
-                        # EXIF IFD tags (including UserComment)
-                        exif_ifd_tags = {
-                            0x9286: "UserComment"
-                        }
-                        
-                        debug_log.append(f"Main EXIF tags found: {list(exif.keys())}")
-                        if exif_ifd:
-                            debug_log.append(f"EXIF IFD tags found: {list(exif_ifd.keys())}")
+                # EXIF IFD tags (including UserComment)
+                exif_ifd_tags = {
+                    0x9286: "UserComment"
+                }
+                
+                debug_log.append(f"Main EXIF tags found: {list(exif.keys())}")
+                if exif_ifd:
+                    debug_log.append(f"EXIF IFD tags found: {list(exif_ifd.keys())}")
+                
+                # Process both main EXIF and EXIF IFD tags
+                all_tags = [(key, val, target_tags[key]) for key, val in exif.items() if key in target_tags]
+                if exif_ifd:
+                    all_tags.extend([(key, val, exif_ifd_tags[key]) for key, val in exif_ifd.items() if key in exif_ifd_tags])
+                
+                for key, val, tag_name in all_tags:
+                    # Decode Bytes
+                    val_str = ""
+                    if tag_name == "UserComment":
+                        # Character code prefix, UTF-16 (common for Civitai) or UTF-8;
+                        # text values may still start with the prefix name
+                        val_str = parameters_parser.decode_user_comment(val if isinstance(val, (bytes, str)) else str(val))
+                    elif isinstance(val, bytes):
+                        try:
+                            if val.startswith(b'ASCII\0\0\0'):
+                                val_str = val[8:].decode('utf-8')
+                            elif val.startswith(b'UNICODE\0'):
+                                val_str = val[8:].decode('utf-16')
+                            elif val.startswith(b'Exif\0\0'):
+                                val_str = val[6:].decode('utf-8')
+                            
+                        except:
+                            val_str = str(val)
+                    else:
+                        val_str = str(val)
+                    
+                    debug_log.append(f"Exif {tag_name} found. Length: {len(val_str)}")
+                    
+                    # Special handling for UserComment - extract only the positive prompt
+                    if tag_name == "UserComment":
+                        debug_log.append(f"  -> UserComment raw content: {val_str[:100]}...")
                         
-                        # Process both main EXIF and EXIF IFD tags
-                        all_tags = [(key, val, target_tags[key]) for key, val in exif.items() if key in target_tags]
-                        if exif_ifd:
-                            all_tags.extend([(key, val, exif_ifd_tags[key]) for key, val in exif_ifd.items() if key in exif_ifd_tags])
+                        # Newer Civitai format: JSON with a nested extraMetadata JSON string
+                        generation = parameters_parser.parse_civitai_json(val_str)
+                        if generation is not None:
+                            debug_log.append(f"  -> Extracted prompt from extraMetadata.prompt")
+                        else:
+                            # Plain A1111-style parameters text
+                            generation = parameters_parser.parse_parameters(val_str)
+                        extracted_prompt = generation["positive"]
                         
-                        for key, val, tag_name in all_tags:
-                            # Decode Bytes
-                            val_str = ""
-                            if isinstance(val, bytes):
-                                try:
-                                    # Handle EXIF UserComment encoding prefixes
-                                    if tag_name == "UserComment":
-                                        # Try UTF-16LE first (common for Civitai UserComment), then UTF-8
-                                        try:
-                                            # Check if it looks like UTF-16LE (every other byte is \x00 for ASCII chars)
-                                            if len(val) > 10 and val[1:20:2].count(b'\x00'[0]) > 5:
-                                                val_str = val.decode('utf-16le', errors='ignore').replace('\x00', '')
-                                            else:
-                                                val_str = val.decode('utf-8', errors='ignore').replace('\x00', '')
-                                        except:
-                                            val_str = val.decode('utf-8', errors='ignore').replace('\x00', '')
-                                    
-                                    elif val.startswith(b'ASCII\0\0\0'):
-                                        val_str = val[8:].decode('utf-8')
-                                    elif val.startswith(b'UNICODE\0'):
-                                        val_str = val[8:].decode('utf-16')
-                                    elif val.startswith(b'Exif\0\0'):
-                                        val_str = val[6:].decode('utf-8')
-                                    
-                                except:
-                                    val_str = str(val)
-                            else:
-                                val_str = str(val)
+                        if extracted_prompt:
+                            info["usercomment_prompt"] = extracted_prompt
+                            debug_log.append(f"  -> Extracted prompt from UserComment: {len(extracted_prompt)} chars")
+                        else:
+                            generation = None
+                        continue
+                    
+                    # Remove "Workflow:" or "Prompt:" prefixes
+                    if val_str.startswith("Workflow:"):
+                        val_str = val_str[9:].strip()
+                    elif val_str.startswith("Prompt:"):
+                        val_str = val_str[7:].strip()
+                    
+                    # Attempt JSON Parse
+                    try:
+                        potential_json = json.loads(val_str)
+                        if isinstance(potential_json, dict):
+                            # Strategy: Populate generic keys if found in JSON
+                            # But also respect the tag's semantic meaning
                             
-                            debug_log.append(f"Exif {tag_name} found. Length: {len(val_str)}")
+                            # If JSON explicitly has "prompt" or "workflow" keys, use them.
+                            if "prompt" in potential_json:
+                                info["prompt"] = json.dumps(potential_json["prompt"])
+                                debug_log.append(f"  -> Found 'prompt' key inside {tag_name}")
+                            if "workflow" in potential_json:
+                                info["workflow"] = json.dumps(potential_json["workflow"])
+                                debug_log.append(f"  -> Found 'workflow' key inside {tag_name}")
                             
-                            # Special handling for UserComment - extract only the positive prompt
-                            if tag_name == "UserComment":
-                                # Remove EXIF encoding marker prefixes if present
-                                for prefix in ['UNICODE', 'ASCII', 'JIS', 'UNDEFINED']:
-                                    if val_str.startswith(prefix):
-                                        val_str = val_str[len(prefix):].lstrip()
-                                        debug_log.append(f"  -> Stripped '{prefix}' prefix from UserComment")
-                                        break
-                                
-                                debug_log.append(f"  -> UserComment raw content: {val_str[:100]}...")
-                                
-                                # Try to parse as JSON (for newer Civitai format with extraMetadata)
-                                extracted_prompt = None
-                                try:
-                                    usercomment_json = json.loads(val_str)
-                                    if isinstance(usercomment_json, dict):
-                                        # Check for extraMetadata field (newer Civitai format)
-                                        if "extraMetadata" in usercomment_json:
-                                            extra_meta_str = usercomment_json["extraMetadata"]
-                                            # Parse the nested JSON string
-                                            extra_meta = json.loads(extra_meta_str)
-                                            if "prompt" in extra_meta:
-                                                extracted_prompt = extra_meta["prompt"]
-                                                debug_log.append(f"  -> Extracted prompt from extraMetadata.prompt")
-                                except (json.JSONDecodeError, TypeError):
-                                    # Not JSON, treat as plain text
-                                    pass
+                            # If the tag is strictly "Make" or "Model", and the JSON looks like a node map
+                            # (keys are IDs), assume it is the PROMPT
+                            if tag_name in ["Make", "Model"]:
+                                # Verification it looks like a prompt map
+                                is_node_map = True
+                                if len(potential_json) > 0:
+                                     for k, v in potential_json.items():
+                                         if not isinstance(v, dict) or "inputs" not in v:
+                                             is_node_map = False
+                                             break
                                 
-                                # If we didn't find JSON prompt, extract from plain text
-                                if not extracted_prompt:
-                                    extracted_prompt = self.extract_positive_prompt(val_str)
-                                
-                                if extracted_prompt:
-                                    info["usercomment_prompt"] = extracted_prompt
-                                    debug_log.append(f"  -> Extracted prompt from UserComment: {len(extracted_prompt)} chars")
-                                continue
-                            
-                            # Remove "Workflow:" or "Prompt:" prefixes
-                            if val_str.startswith("Workflow:"):
-                                val_str = val_str[9:].strip()
-                            elif val_str.startswith("Prompt:"):
-                                val_str = val_str[7:].strip()
-                            
-                            # Attempt JSON Parse
-                            try:
-                                potential_json = json.loads(val_str)
-                                if isinstance(potential_json, dict):
-                                    # Strategy: Populate generic keys if found in JSON
-                                    # But also respect the tag's semantic meaning
-                                    
-                                    # If JSON explicitly has "prompt" or "workflow" keys, use them.
-                                    if "prompt" in potential_json:
-                                        info["prompt"] = json.dumps(potential_json["prompt"])
-                                        debug_log.append(f"  -> Found 'prompt' key inside {tag_name}")
-                                    if "workflow" in potential_json:
-                                        info["workflow"] = json.dumps(potential_json["workflow"])
-                                        debug_log.append(f"  -> Found 'workflow' key inside {tag_name}")
-                                    
-                                    # If the tag is strictly "Make" or "Model", and the JSON looks like a node map
-                                    # (keys are IDs), assume it is the PROMPT
-                                    if tag_name in ["Make", "Model"]:
-                                        # Verification it looks like a prompt map
-                                        is_node_map = True
-                                        if len(potential_json) > 0:
-                                             for k, v in potential_json.items():
-                                                 if not isinstance(v, dict) or "inputs" not in v:
-                                                     is_node_map = False
-                                                     break
-                                        
-                                        if is_node_map:
-                                             if "prompt" not in info: # Don't overwrite if we found explicit "prompt" key earlier
-                                                 info["prompt"] = val_str
-                                                 debug_log.append(f"  -> Used {tag_name} content as 'prompt'")
-
-                                    # If the tag is "ImageDescription", "Copyright"
-                                    # and contains "nodes" & "links", assume it is the WORKFLOW
-                                    if tag_name in ["ImageDescription", "Copyright"]:
-                                        if "nodes" in potential_json and "links" in potential_json:
-                                             if "workflow" not in info:
-                                                 info["workflow"] = val_str
-                                                 debug_log.append(f"  -> Used {tag_name} content as 'workflow'")
-                                                 
-                            except json.JSONDecodeError:
-                                pass
-
-                except Exception as ex:
-                    debug_log.append(f"Error reading Exif: {ex}")
-
-                text_output = ""
-                
-                # 0. Try UserComment first (Civitai images)
-                if "usercomment_prompt" in info:
-                    debug_log.append("Found extracted prompt from UserComment (Civitai format).")
-                    text_output += f"{info['usercomment_prompt']}\n"
-                    return (text_output, "\n".join(debug_log))
+                                if is_node_map:
+                                     if "prompt" not in info: # Don't overwrite if we found explicit "prompt" key earlier
+                                         info["prompt"] = val_str
+                                         debug_log.append(f"  -> Used {tag_name} content as 'prompt'")
+
+                            # If the tag is "ImageDescription", "Copyright"
+                            # and contains "nodes" & "links", assume it is the WORKFLOW
+                            if tag_name in ["ImageDescription", "Copyright"]:
+                                if "nodes" in potential_json and "links" in potential_json:
+                                     if "workflow" not in info:
+                                         info["workflow"] = val_str
+                                         debug_log.append(f"  -> Used {tag_name} content as 'workflow'")
+                                         
+                    except json.JSONDecodeError:
+                        pass
+
+        except Exception as ex:
+            debug_log.append(f"Error reading Exif: {ex}")
+        if exif or exif_ifd:
+            timings.mark("extract.exif")
+
+        text_output = ""
+        
+        # 0. Try UserComment first (Civitai images)
+        if "usercomment_prompt" in info:
+            debug_log.append("Found extracted prompt from UserComment (Civitai format).")
+            text_output += f"{info['usercomment_prompt']}\n"
+            return (text_output, "\n".join(debug_log), FORMAT_CIVITAI, generation)
+        
+        # 1. Try Automatic1111 "parameters"
+        if "parameters" in info:
+            debug_log.append("Found 'parameters' in metadata (A1111 format).")
+            # The positive prompt ends at the first metadata phrase, the rest is parsed into fields
+            generation = parameters_parser.parse_parameters(info['parameters'])
+            extracted_prompt = generation["positive"]
+            text_output += f"{extracted_prompt}\n"
+            debug_log.append(f"Extracted prompt length: {len(extracted_prompt)} chars")
+            timings.mark("extract.parameters")
+            return (text_output, "\n".join(debug_log), FORMAT_A1111, generation)
+
+        # 2. Try ComfyUI "prompt"
+        if "prompt" in info:
+            debug_log.append("Found 'prompt' in metadata (ComfyUI format). Parsing JSON...")
+            try:
+                prompt_json = json.loads(info["prompt"])
+                timings.mark("extract.json")
+                found_texts = []
+                negative_texts = []
+                seen_texts = set()
+                sampler = {}
                 
-                # 1. Try Automatic1111 "parameters"
-                if "parameters" in info:
-                    debug_log.append("Found 'parameters' in metadata (A1111 format).")
-                    # Extract only the positive prompt by stopping at metadata phrases
-                    extracted_prompt = self.extract_positive_prompt(info['parameters'])
-                    text_output += f"{extracted_prompt}\n"
-                    debug_log.append(f"Extracted prompt length: {len(extracted_prompt)} chars")
-                    return (text_output, "\n".join(debug_log))
-
-                # 2. Try ComfyUI "prompt"
-                if "prompt" in info:
-                    debug_log.append("Found 'prompt' in metadata (ComfyUI format). Parsing JSON...")
-                    try:
-                        prompt_json = json.loads(info["prompt"])
-                        found_texts = []
+                # Debug: list all nodes types
+                if isinstance(prompt_json, dict):
+                    graph = PromptGraph(prompt_json)
+                    node_types = [d.get("class_type") for d in graph.nodes.values()]
+                    debug_log.append(f"Nodes found: {node_types}")
+
+                    # Which text nodes feed a sampler's positive / negative input
+                    roles = graph.classify()
+                    sampler = graph.sampler_settings()
+
+                    for node_id, node_data in graph.nodes.items():
+                        class_type = node_data.get("class_type") or ""
                         
-                        # Debug: list all nodes types
-                        if isinstance(prompt_json, dict):
-                            node_types = [d.get("class_type") for d in prompt_json.values() if isinstance(d, dict)]
-                            debug_log.append(f"Nodes found: {node_types}")
+                        # We look for nodes that generate text for conditioning
+                        if is_text_node(class_type):
+                            debug_log.append(f"Inspecting Node {node_id} ({class_type})...")
+                            
+                            # 'text', then 'string', then 'value'
+                            resolved_text = graph.node_text(node_id)
 
-                            for node_id, node_data in prompt_json.items():
-                                class_type = node_data.get("class_type", "")
-                                
-                                # We look for nodes that generate text for conditioning
-                                if "CLIPTextEncode" in class_type or "Text" in class_type or "String" in class_type:
-                                    debug_log.append(f"Inspecting Node {node_id} ({class_type})...")
-                                    
-                                    # Try to find 'text' input
-                                    resolved_text = self.get_node_input(node_id, "text", prompt_json)
-                                    if not resolved_text:
-                                         # Try 'string' or 'value'
-                                         resolved_text = self.get_node_input(node_id, "string", prompt_json)
-                                    if not resolved_text:
-                                         resolved_text = self.get_node_input(node_id, "value", prompt_json)
-
-                                    if resolved_text and isinstance(resolved_text, str) and resolved_text.strip():
-                                         if "<Link" not in resolved_text: # specific validation
-                                             if resolved_text not in found_texts: # Simple deduplication
-                                                 found_texts.append(resolved_text)
-                                                 debug_log.append(f"  -> Extracted: {resolved_text[:50]}...")
-                                             else:
-                                                 debug_log.append(f"  -> Duplicate skipped: {resolved_text[:20]}...")
+                            if resolved_text and isinstance(resolved_text, str) and resolved_text.strip():
+                                 if "<Link" not in resolved_text: # specific validation
+                                     if resolved_text not in seen_texts:
+                                         seen_texts.add(resolved_text)
+                                         # prompt_string keeps every text; negatives also fill negative_prompt
+                                         found_texts.append(resolved_text)
+                                         if roles.get(node_id) == "negative":
+                                             negative_texts.append(resolved_text)
+                                             debug_log.append(f"  -> Extracted (negative): {resolved_text[:50]}...")
                                          else:
-                                             debug_log.append(f"  -> Unresolved Link: {resolved_text}")
-                                    else:
-                                        debug_log.append("  -> No text value found.")
-                        
-                        if found_texts:
-                            text_output += "\n---\n".join(found_texts)
-                        else:
-                             text_output += f"Raw Prompt Data:\n{info['prompt']}\n"
-                             debug_log.append("No valid text found in target nodes. Returning raw dump.")
-                             
-                    except json.JSONDecodeError:
-                        text_output += f"Prompt (Raw):\n{info['prompt']}\n"
-                        debug_log.append("JSON Decode Error on prompt metadata.")
-                
-                if not text_output and "workflow" in info:
-                     text_output += "Workflow metadata found but no prompt text extracted."
-                     debug_log.append("Only 'workflow' metadata found.")
+                                             debug_log.append(f"  -> Extracted: {resolved_text[:50]}...")
+                                     else:
+                                         debug_log.append(f"  -> Duplicate skipped: {resolved_text[:20]}...")
+                                 else:
+                                     debug_log.append(f"  -> Unresolved Link: {resolved_text}")
+                            else:
+                                debug_log.append("  -> No text value found.")
 
-                if not text_output:
-                    debug_log.append("No metadata found.")
-                    return ("No standard prompt metadata found.", "\n".join(debug_log))
-                
-                return (text_output, "\n".join(debug_log))
+                timings.mark("extract.graph")
+
+                if negative_texts or sampler:
+                    generation = parameters_parser.empty_record()
+                    generation["negative"] = "\n---\n".join(negative_texts)
+                    generation["steps"] = parameters_parser.to_int(sampler.get("steps"))
+                    generation["sampler"] = sampler.get("sampler", "")
+                    generation["cfg"] = parameters_parser.to_float(sampler.get("cfg"))
+                    generation["seed"] = parameters_parser.to_int(sampler.get("seed"))
+                    generation["width"] = parameters_parser.to_int(sampler.get("width"))
+                    generation["height"] = parameters_parser.to_int(sampler.get("height"))
                 
-        except Exception as e:
-            return (f"Error reading image: {e}", f"Exception: {str(e)}")
+                if found_texts:
+                    text_output += "\n---\n".join(found_texts)
+                else:
+                     text_output += f"Raw Prompt Data:\n{info['prompt']}\n"
+                     debug_log.append("No valid text found in target nodes. Returning raw dump.")
+                     
+            except json.JSONDecodeError:
+                text_output += f"Prompt (Raw):\n{info['prompt']}\n"
+                debug_log.append("JSON Decode Error on prompt metadata.")
+        
+        if not text_output and "workflow" in info:
+             text_output += "Workflow metadata found but no prompt text extracted."
+             debug_log.append("Only 'workflow' metadata found.")
+
+        if not text_output:
+            debug_log.append("No metadata found.")
+            return ("No standard prompt metadata found.", "\n".join(debug_log), None, None)
+        
+        metadata_format = FORMAT_COMFYUI if "prompt" in info else FORMAT_WORKFLOW
+        return (text_output, "\n".join(debug_log), metadata_format, generation)
+        
 
 
 class GravityGalleryConfig:
@@ -388,6 +515,7 @@ class GravityGalleryConfig:
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
                 "randomize_output": ("BOOLEAN", {"default": False}),
             },
+            "optional": SCAN_INPUTS,
         }
 
     RETURN_TYPES = ("GALLERY_CONFIG",)
@@ -395,8 +523,17 @@ class GravityGalleryConfig:
     FUNCTION = "get_config"
     CATEGORY = "Gravity"
 
-    def get_config(self, directory, thumbnail_size, seed, randomize_output):
-        return ({"directory": directory, "thumbnail_size": thumbnail_size, "seed": seed, "randomize_output": randomize_output},)
+    def get_config(self, directory, thumbnail_size, seed, randomize_output,
+                   recursive=False, max_depth=listing.DEFAULT_MAX_DEPTH, exclude=""):
+        return ({
+            "directory": directory,
+            "thumbnail_size": thumbnail_size,
+            "seed": seed,
+            "randomize_output": randomize_output,
+            "recursive": recursive,
+            "max_depth": max_depth,
+            "exclude": exclude,
+        },)
 
 class GravityGalleryMini(GravityGalleryNode):
     @classmethod
@@ -408,8 +545,8 @@ class GravityGalleryMini(GravityGalleryNode):
             },
         }
 
-    RETURN_TYPES = ("STRING", "STRING")
-    RETURN_NAMES = ("prompt_string", "debug_info")
+    RETURN_TYPES = OUTPUT_TYPES
+    RETURN_NAMES = OUTPUT_NAMES
     FUNCTION = "process_small"
     CATEGORY = "Gravity"
 
@@ -417,21 +554,215 @@ class GravityGalleryMini(GravityGalleryNode):
     def VALIDATE_INPUTS(s, gallery_config, image):
         return True
 
+    @classmethod
+    def IS_CHANGED(s, gallery_config=None, image="", **kwargs):
+        if not gallery_config:
+            # Config comes from a link and may not be resolved yet; always run,
+            # the extraction cache keeps that cheap
+            return float("nan")
+        return s.execution_fingerprint(
+            gallery_config.get("directory", ""),
+            image,
+            gallery_config.get("seed", 0),
+            gallery_config.get("randomize_output", False),
+            s.config_scan(gallery_config),
+        )
+
+    @staticmethod
+    def config_scan(gallery_config):
+        return listing.scan_options(
+            gallery_config.get("recursive", False),
+            gallery_config.get("max_depth", listing.DEFAULT_MAX_DEPTH),
+            gallery_config.get("exclude", ""),
+        )
+
     def process_small(self, gallery_config, image):
         directory = gallery_config.get("directory", "")
         seed = gallery_config.get("seed", 0)
         randomize_output = gallery_config.get("randomize_output", False)
         
-        return self._process_logic(directory, image, seed, randomize_output)
+        return self._process_logic(directory, image, seed, randomize_output, self.config_scan(gallery_config))
+
+class GravityGalleryBatch:
+    """Extracts the prompts of every image in a directory to a JSONL or CSV file."""
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "directory": ("STRING", {"default": ""}),
+                "output_format": (list(batch_extract.OUTPUT_FORMATS),),
+                "workers": ("INT", {"default": 0, "min": 0, "max": 256}),
+                "chunk_size": ("INT", {"default": batch_extract.DEFAULT_CHUNK_SIZE, "min": 1, "max": 4096}),
+                "include_debug": ("BOOLEAN", {"default": False}),
+            },
+            "optional": {
+                "output_path": ("STRING", {"default": ""}),
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("output_path", "summary")
+    FUNCTION = "process_batch"
+    CATEGORY = "Gravity"
+    OUTPUT_NODE = True
+
+    @classmethod
+    def IS_CHANGED(s, directory="", **kwargs):
+        # Re-run when files are added or removed (or an archive is rewritten);
+        # edits in place are picked up through the per-file extraction cache anyway
+        try:
+            return "|".join(f"{root}|{archives.stat(root).st_mtime_ns}" for root in listing.parse_roots(directory))
+        except OSError:
+            return f"missing|{directory}"
+
+    @staticmethod
+    def default_output_path(directory, output_format):
+        name = f"gravity_prompts_{os.path.basename(os.path.normpath(directory)) or 'root'}.{output_format}"
+        try:
+            import folder_paths
+            return os.path.join(folder_paths.get_output_directory(), name)
+        except ImportError:
+            # Next to an archive rather than inside it
+            folder = os.path.dirname(directory) if archives.is_archive(directory) else directory
+            return os.path.join(folder, name)
+
+    def process_batch(self, directory, output_format, workers, chunk_size, include_debug, output_path=""):
+        if not directory:
+            return ("", "No directory provided")
+        output_path = os.path.abspath(output_path or self.default_output_path(directory, output_format))
+
+        # The command-line tool runs in its own process: a process pool can't
+        # be forked from the multithreaded (possibly CUDA-holding) server, and
+        # spawned workers can't import this package by its folder name
+        command = [
+            sys.executable, os.path.abspath(batch_extract.__file__),
+            "-o", output_path, "--format", output_format,
+            "--workers", str(workers), "--chunk-size", str(chunk_size),
+        ]
+        if include_debug:
+            command.append("--debug-info")
+        command += ["--", directory]
+
+        last_line = ""
+        try:
+            # Text mode reads the tool's \r progress updates as separate lines
+            with subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                  text=True, encoding="utf-8", errors="replace") as process:
+                for line in process.stderr:
+                    line = line.strip()
+                    if line:
+                        last_line = line
+                        print(f"Gravity Gallery batch: {line}")
+        except OSError as e:
+            return ("", f"Batch extraction failed: {e}")
+        if process.returncode != 0:
+            return ("", f"Batch extraction failed: {last_line or f'exit code {process.returncode}'}")
+
+        print(f"Gravity Gallery batch: wrote {output_path}")
+        return (output_path, last_line)
+
+def index_record(image_path):
+    """Everything the gallery index stores for one file."""
+    node = GravityGalleryNode()
+    metadata = node.read_image_metadata(image_path, [])
+    prompt_string, debug_info, metadata_format, generation = node.extract_prompt_details(image_path, metadata)
+
+    # Through archives.open_file, so archive members are measured in place
+    with archives.open_file(image_path) as f:
+        dimensions = metadata_reader.read_image_size_file(f)
+        if dimensions is None:
+            # Lazy open only parses the header
+            with Image.open(f) as img:
+                dimensions = img.size
+
+    info, exif, _ = metadata
+    return {
+        "prompt": prompt_string,
+        "debug_info": debug_info,
+        "format": metadata_format,
+        "width": dimensions[0],
+        "height": dimensions[1],
+        "rating": rating_from_metadata(info, exif),
+        "parameters": json.dumps(generation) if generation else None,
+    }
+
+
+gallery_index = GalleryIndex(settings.INDEX_DB_PATH, extractor=index_record)
+
+
+def indexed_ratings(directory):
+    """
+    {filename: (mtime_ns, size, rating)} from the index for a plain folder
+    ({} if disabled or unreadable), and queue a background refresh of it.
+    """
+    if not settings.INDEX_ENABLED:
+        return {}
+    try:
+        with timing.metrics.timer("listing.index"):
+            return gallery_index.ratings(directory)
+    except Exception as e:
+        print(f"Gravity Gallery: index read failed: {e}")
+        return {}
+    finally:
+        gallery_index.request_scan(directory)
+
+
+def iter_tree_entries(directory, scan):
+    """
+    Entries of a recursive or multi-folder listing, with ratings from the
+    index for files it holds unchanged at any depth. The folder roots are
+    refreshed in the background; subfolders are indexed once opened.
+    """
+    roots = listing.parse_roots(directory)
+    ratings = {}
+    if settings.INDEX_ENABLED:
+        for root in roots:
+            if archives.is_archive(root):
+                continue
+            try:
+                with timing.metrics.timer("listing.index"):
+                    ratings.update(gallery_index.ratings_under(root))
+            except Exception as e:
+                print(f"Gravity Gallery: index read failed: {e}")
+            gallery_index.request_scan(root)
+    entries = listing.iter_entries(directory, scan, settings.SCAN_THREADS)
+    if not ratings:
+        return entries
+    # Filenames are relative to the first root, or absolute for several roots
+    return apply_ratings(entries, ratings, lambda e: normalize_directory(os.path.join(roots[0], e["filename"])))
+
+
+def load_directory_entries(directory, scan=listing.TOP_LEVEL):
+    """
+    Unsorted listing of a directory. A plain single folder is one scandir
+    pass (so mtimes and sizes are always the files' own), with ratings from
+    the index for files unchanged since they were indexed; the index is
+    refreshed in the background. Recursive and multi-folder listings are
+    parallel tree walks, rated the same way (see iter_tree_entries).
+    """
+    if not listing.is_single_folder(directory, scan):
+        entries = iter_tree_entries(directory, scan)
+        with timing.metrics.timer("listing.tree_scan"):
+            return list(entries)
+
+    ratings = indexed_ratings(directory)
+    with timing.metrics.timer("listing.scan"):
+        return list(apply_ratings(listing.iter_directory(directory), ratings))
+
+
+directory_sessions = DirectorySessions(load_directory_entries, settings.LISTING_FRESH_MS / 1000)
 
 NODE_CLASS_MAPPINGS = {
     "GravityGalleryNode": GravityGalleryNode,
     "GravityGalleryConfig": GravityGalleryConfig,
-    "GravityGalleryMini": GravityGalleryMini
+    "GravityGalleryMini": GravityGalleryMini,
+    "GravityGalleryBatch": GravityGalleryBatch,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "GravityGalleryNode": "Gravity Gallery Prompt Extractor",
     "GravityGalleryConfig": "Gravity Gallery Config",
-    "GravityGalleryMini": "Gravity Gallery Mini"
+    "GravityGalleryMini": "Gravity Gallery Mini",
+    "GravityGalleryBatch": "Gravity Gallery Batch Extract",
 }
@@ -0,0 +1,184 @@
+# Resolver for ComfyUI prompt graphs (the "prompt" metadata: node id -> {class_type, inputs}).
+# Inputs are indexed once per graph and every followed link is memoized, so large
+# workflows are walked once instead of once per text node. Literal inputs are read
+# straight from the index and links are only split out where classify() walks.
+
+# Inputs tried, in order, on a text node
+TEXT_INPUT_KEYS = ("text", "string", "value")
+
+# Inputs followed on the source node of a link (primitives, string nodes...)
+VALUE_KEYS = ("text", "string", "value", "string_field", "prompt")
+
+# Sampler-side inputs that carry conditioning
+ROLE_INPUTS = ("positive", "negative")
+
+# Inputs that never lead to prompt text, skipped when tracing conditioning back
+NON_CONDITIONING_INPUTS = {"clip", "model", "vae", "latent_image", "samples", "noise", "sigmas", "sampler"}
+
+
+def is_text_node(class_type):
+    """Node types that may hold prompt text: CLIPTextEncode, *Text*, *String*."""
+    # "CLIPTextEncode" contains "Text"
+    return "Text" in class_type or "String" in class_type
+
+
+def _is_link(value):
+    # [source node id, output slot]
+    return type(value) is list and len(value) == 2
+
+
+class PromptGraph:
+    """
+    Indexed view of a ComfyUI prompt graph.
+
+    resolve() follows links like the node's original recursive walk did, but
+    iteratively (deep chains don't hit the recursion limit) and with results
+    cached per (node id, input).
+    """
+
+    def __init__(self, prompt_json):
+        self.nodes = {}
+        # node id -> inputs dict
+        self.inputs = {}
+        # Nodes with a positive or negative input (samplers); links are
+        # only split out for the nodes classify() walks
+        self.role_nodes = []
+        for node_id, node in prompt_json.items():
+            if not isinstance(node, dict):
+                continue
+            node_id = str(node_id)
+            self.nodes[node_id] = node
+            inputs = node.get("inputs")
+            if isinstance(inputs, dict):
+                self.inputs[node_id] = inputs
+                if "positive" in inputs or "negative" in inputs:
+                    self.role_nodes.append(node_id)
+        self._memo = {}
+
+    def links(self, node_id):
+        """[(input name, source node id)] for the linked inputs of a node."""
+        return [
+            (key, str(value[0]))
+            for key, value in self.inputs.get(node_id, {}).items()
+            if _is_link(value)
+        ]
+
+    def resolve(self, node_id, input_key):
+        """
+        Value of an input as a string. A link is followed into each
+        value-like input of its source node in VALUE_KEYS order, until one
+        gives a non-empty value. Links where none does give
+        "<Link to Node N>", missing inputs and cycles give None.
+        """
+        # Fast path: literal and missing inputs need no walk, and only
+        # followed links are memoized
+        inputs = self.inputs.get(node_id)
+        if inputs is None or input_key not in inputs:
+            return None
+        value = inputs[input_key]
+        if type(value) is not list or len(value) != 2:
+            return str(value)
+        memo = self._memo
+        current = (node_id, input_key)
+        if current in memo:
+            return memo[current]
+
+        frames = []  # [(node id, input), source id, remaining source keys] per link being followed
+        on_path = set()  # node ids whose link is being followed
+        cyclic = False
+
+        while True:
+            result = None
+            nid, key = current
+            if current in memo:
+                result = memo[current]
+            elif nid in on_path:
+                cyclic = True
+            else:
+                inputs = self.inputs.get(nid)
+                if inputs is not None and key in inputs:
+                    value = inputs[key]
+                    if type(value) is list and len(value) == 2:
+                        source = str(value[0])
+                        source_inputs = self.inputs.get(source, {})
+                        keys = iter([k for k in VALUE_KEYS if k in source_inputs])
+                        frames.append((current, source, keys))
+                        on_path.add(nid)
+                    else:
+                        result = str(value)
+
+            # Hand the result back up the chain, or try the next key of a source
+            while frames:
+                step, source, keys = frames[-1]
+                if not result:
+                    next_key = next(keys, None)
+                    if next_key is not None:
+                        current = (source, next_key)
+                        break
+                    result = f"<Link to Node {source}>"
+                # Results inside a cycle depend on where the walk started
+                if not cyclic:
+                    memo[step] = result
+                frames.pop()
+                on_path.discard(step[0])
+            else:
+                return result
+
+    def node_text(self, node_id):
+        """Text of a text node from its text/string/value input, or None."""
+        for key in TEXT_INPUT_KEYS:
+            text = self.resolve(node_id, key)
+            if text:
+                return text
+        return None
+
+    def classify(self):
+        """
+        Map node id -> "positive", "negative" or "both" for every node that
+        feeds a sampler's positive/negative conditioning input. Nodes that
+        reach no sampler are absent.
+        """
+        roles = {}
+        for role in ROLE_INPUTS:
+            stack = [str(self.inputs[nid][role][0]) for nid in self.role_nodes if _is_link(self.inputs[nid].get(role))]
+            visited = set()
+            while stack:
+                nid = stack.pop()
+                if nid in visited or nid not in self.nodes:
+                    continue
+                visited.add(nid)
+                roles[nid] = role if roles.get(nid, role) == role else "both"
+                for key, value in self.inputs.get(nid, {}).items():
+                    if key not in NON_CONDITIONING_INPUTS and _is_link(value):
+                        stack.append(str(value[0]))
+        return roles
+
+    def sampler_settings(self):
+        """
+        Literal steps/cfg/seed/sampler_name and latent size of the first
+        sampler (a node with both positive and negative inputs), following
+        links to primitives. Values are strings; missing ones are left out.
+        """
+        for node_id in self.role_nodes:
+            inputs = dict(self.links(node_id))
+            if "positive" in inputs and "negative" in inputs:
+                break
+        else:
+            return {}
+
+        settings = {}
+        fields = (("steps", ("steps",)), ("cfg", ("cfg",)), ("seed", ("seed", "noise_seed")), ("sampler", ("sampler_name",)))
+        for field, keys in fields:
+            for key in keys:
+                value = self.resolve(node_id, key)
+                if value and "<Link" not in value:
+                    settings[field] = value
+                    break
+
+        latent = inputs.get("latent_image")
+        if latent is not None:
+            for field in ("width", "height"):
+                value = self.resolve(latent, field)
+                if value and "<Link" not in value:
+                    settings[field] = value
+        return settings
@@ -0,0 +1,51 @@
+from email.utils import formatdate
+
+# HTTP validators for file-backed responses: ETags from the source file's
+# mtime and size, Last-Modified, and conditional request checks so unchanged
+# files are answered with 304 Not Modified.
+
+# Cache-Control for URLs that change whenever their content does
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Cache-Control for URLs whose content may change: cache, but revalidate
+REVALIDATE = "no-cache"
+
+
+def file_etag(stat, variant=None):
+    """
+    Strong ETag (quoted) from a file's mtime and size, in the same form
+    aiohttp's FileResponse uses. variant distinguishes derived responses,
+    such as thumbnail sizes, of the same file.
+    """
+    tag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    if variant is not None:
+        tag = f"{tag}-{variant}"
+    return f'"{tag}"'
+
+
+def validator_headers(etag, mtime, cache_control):
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+
+def _etag_list(header):
+    return [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+def is_not_modified(request, etag, mtime):
+    """
+    True when the request's If-None-Match / If-Modified-Since show the
+    client already has this version. If-None-Match wins when both are sent.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = _etag_list(if_none_match)
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.if_modified_since
+    if if_modified_since is not None:
+        # HTTP dates have one second resolution
+        return int(mtime) <= if_modified_since.timestamp()
+    return False
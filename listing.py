@@ -0,0 +1,249 @@
+import os
+import itertools
+from fnmatch import fnmatch
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from . import archives
+except ImportError:
+    import archives
+
+# Directory listing for the gallery: one os.scandir pass that yields
+# structured entries, plus server-side sorting and pagination. Recursive and
+# multi-folder listings walk the tree on a thread pool. A zip or tar archive
+# can stand in for a folder (see archives.py).
+
+# Also the files the node's randomize_output picks from (.bmp included, as the
+# node always accepted it)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+SORT_FIELDS = ("mtime", "filename", "rating", "size")
+
+# Folder levels below a root a recursive scan descends by default
+DEFAULT_MAX_DEPTH = 8
+
+# Folders scanned at once by a tree walk; scans wait on I/O, not CPU
+DEFAULT_SCAN_THREADS = 16
+
+# How a directory is listed: recursive descends up to max_depth folder levels
+# below each root; exclude is a tuple of globs matched against names and
+# root-relative paths ("/"-separated), pruning matching folders
+ScanOptions = namedtuple("ScanOptions", ("recursive", "max_depth", "exclude"))
+
+TOP_LEVEL = ScanOptions(False, DEFAULT_MAX_DEPTH, ())
+
+
+def scan_options(recursive=False, max_depth=DEFAULT_MAX_DEPTH, exclude=""):
+    """ScanOptions from node inputs; exclude is a comma-separated glob list."""
+    if isinstance(exclude, str):
+        exclude = exclude.split(",")
+    exclude = tuple(p.strip() for p in exclude if p.strip())
+    return ScanOptions(bool(recursive), max(0, int(max_depth)), exclude)
+
+
+def parse_scan_params(query):
+    """Read recursive/depth/exclude from a request query. Raises ValueError on bad input."""
+    recursive = str(query.get("recursive", "")).lower() in ("1", "true", "yes")
+    return scan_options(recursive, int(query.get("depth", DEFAULT_MAX_DEPTH)), query.get("exclude", ""))
+
+
+def parse_roots(directory):
+    """
+    Root folders of a directory string. Several folders can be given
+    separated by os.pathsep, like PATH; a string naming an existing
+    folder or archive is always one root.
+    """
+    if os.pathsep not in directory or os.path.isdir(directory) or archives.is_archive(directory):
+        return [directory]
+    return [root.strip() for root in directory.split(os.pathsep) if root.strip()]
+
+
+def roots_exist(directory):
+    roots = parse_roots(directory)
+    return bool(roots) and all(os.path.isdir(root) or archives.is_archive(root) for root in roots)
+
+
+def is_single_folder(directory, options=TOP_LEVEL):
+    """True for a plain listing of one folder (what the metadata index holds)."""
+    if options.recursive or options.exclude:
+        return False
+    roots = parse_roots(directory)
+    return len(roots) == 1 and not archives.is_archive(roots[0])
+
+
+def _entry(filename, st):
+    return {
+        "filename": filename,
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "rating": 0,
+    }
+
+
+def iter_directory(directory):
+    """Yield image files as {filename, mtime, size, rating} dicts as scandir finds them."""
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue  # Vanished while listing
+            yield _entry(entry.name, st)
+
+
+def _scan_folder(path, rel, depth, max_depth, exclude, absolute):
+    # One folder of a tree walk: returns (entries, subfolders to walk)
+    files = []
+    folders = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                child_rel = f"{rel}/{name}" if rel else name
+                if exclude and any(fnmatch(name, p) or fnmatch(child_rel, p) for p in exclude):
+                    continue
+                try:
+                    # Symlinked folders are not followed, so links can't loop
+                    if entry.is_dir(follow_symlinks=False):
+                        if depth < max_depth:
+                            folders.append((entry.path, child_rel, depth + 1))
+                        continue
+                    if not name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue  # Vanished while listing
+                files.append(_entry(entry.path if absolute else child_rel, st))
+    except OSError:
+        pass  # Unreadable or vanished subfolder; the rest of the tree still lists
+    return files, folders
+
+
+def iter_tree(roots, max_depth=DEFAULT_MAX_DEPTH, exclude=(), absolute=False, workers=DEFAULT_SCAN_THREADS):
+    """
+    Yield image entries of roots and their subfolders down to max_depth, in
+    no particular order. Each folder is one os.scandir task on a thread pool
+    and subfolders are queued as soon as they are found, so a network mount
+    is read many folders at a time instead of one after the other.
+
+    Filenames are paths relative to their root with "/" separators, or
+    absolute paths when absolute is set (several roots).
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gravity-gallery-scan")
+    pending = set()
+
+    def submit(path, rel, depth):
+        pending.add(pool.submit(_scan_folder, path, rel, depth, max_depth, exclude, absolute))
+
+    try:
+        for root in roots:
+            submit(os.path.abspath(root) if absolute else root, "", 0)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                files, folders = future.result()
+                # Queue subfolders first so workers stay busy while we yield
+                for folder in folders:
+                    submit(*folder)
+                yield from files
+    finally:
+        # Consumer stopped early: drop the folders not started yet
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_archive(path, exclude=(), absolute=False):
+    """
+    Yield the image members of an archive from its member table. Every
+    member is listed, however deep (archives hold finished batches, not
+    working folders); exclude prunes like it does in a tree walk.
+    Filenames are member names, or member paths when absolute is set.
+    """
+    for name, size, mtime in archives.archive_store.members(path):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        if exclude:
+            parts = name.split("/")
+            if any(fnmatch(part, p) or fnmatch("/".join(parts[:i + 1]), p)
+                   for i, part in enumerate(parts) for p in exclude):
+                continue
+        yield {"filename": os.path.join(path, name) if absolute else name, "mtime": mtime, "size": size, "rating": 0}
+
+
+def iter_entries(directory, options=TOP_LEVEL, workers=DEFAULT_SCAN_THREADS):
+    """
+    Yield the entries of a directory string (one or several roots) as
+    options ask. A plain single folder is one scandir pass; anything else
+    is a parallel tree walk, with absolute filenames for several roots.
+    Archive roots are listed from their member table.
+    """
+    if is_single_folder(directory, options):
+        return iter_directory(directory)
+    roots = parse_roots(directory)
+    absolute = len(roots) > 1
+    folders = [root for root in roots if not archives.is_archive(root)]
+    packed = (iter_archive(root, options.exclude, absolute) for root in roots if archives.is_archive(root))
+    walk = iter_tree(
+        folders,
+        options.max_depth if options.recursive else 0,
+        options.exclude,
+        absolute=absolute,
+        workers=workers,
+    ) if folders else ()
+    return itertools.chain(itertools.chain.from_iterable(packed), walk)
+
+
+def scan_directory(directory):
+    """List image files as {filename, mtime, size, rating} dicts in one scandir pass."""
+    return list(iter_directory(directory))
+
+
+def sort_entries(entries, sort="mtime", descending=True):
+    """
+    Sort entries in place. Ties on mtime/size break by filename, ties on
+    rating by newest first, so paging through a listing is stable.
+    """
+    if sort == "filename":
+        entries.sort(key=lambda e: e["filename"].lower(), reverse=descending)
+    elif sort == "rating":
+        # Secondary key is always "newest first", whatever the direction
+        entries.sort(key=lambda e: e["mtime"], reverse=True)
+        entries.sort(key=lambda e: e.get("rating") or 0, reverse=descending)
+    else:
+        entries.sort(key=lambda e: e["filename"])
+        entries.sort(key=lambda e: e[sort], reverse=descending)
+    return entries
+
+
+def parse_page_params(query):
+    """
+    Read sort/order/offset/cursor/limit from a request query. cursor is the
+    opaque next_cursor of a previous page and takes precedence over offset.
+    No limit means the whole listing. Raises ValueError on bad input.
+    """
+    sort = query.get("sort", "filename")
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort field: {sort}")
+    order = query.get("order", "asc" if sort == "filename" else "desc")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unknown order: {order}")
+
+    offset = int(query.get("cursor") or query.get("offset") or 0)
+    limit = query.get("limit")
+    limit = int(limit) if limit else None
+    if offset < 0 or (limit is not None and limit < 1):
+        raise ValueError("offset must be >= 0 and limit >= 1")
+    return sort, order, offset, limit
+
+
+def paginate(entries, offset, limit):
+    """Return (page, next_cursor); next_cursor is None on the last page."""
+    if limit is None:
+        return entries[offset:], None
+    end = offset + limit
+    return entries[offset:end], (str(end) if end < len(entries) else None)
@@ -0,0 +1,230 @@
+import struct
+import zlib
+
+# Header-only metadata reader. Only the container structure is parsed, pixel
+# data is never touched: PNG reading stops at the first IDAT chunk and WebP
+# reading jumps straight to the RIFF EXIF chunk. Every read is bounded, so a
+# corrupt length field cannot make us slurp a whole file into memory.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Largest metadata chunk we are willing to read (ComfyUI workflows can be big)
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Main IFD tags that ComfyUI / Civitai use for metadata
+IFD0_TAGS = {270, 271, 0x0110, 0x8298}
+# EXIF sub-IFD tags
+EXIF_IFD_TAGS = {0x9286}
+EXIF_IFD_POINTER = 0x8769
+
+# TIFF field type -> size in bytes of one value
+_TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+
+class MetadataError(Exception):
+    pass
+
+
+def _read_exact(f, n):
+    if n > MAX_CHUNK_BYTES:
+        raise MetadataError(f"Chunk of {n} bytes exceeds limit")
+    data = f.read(n)
+    if len(data) != n:
+        raise MetadataError("Unexpected end of file")
+    return data
+
+
+def _decode_text(data):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def _inflate(data):
+    d = zlib.decompressobj()
+    out = d.decompress(data, MAX_CHUNK_BYTES)
+    if d.unconsumed_tail:
+        raise MetadataError("Compressed text chunk exceeds limit")
+    return out
+
+
+def _parse_png_text(chunk_type, data):
+    """Return (keyword, text) for a tEXt/zTXt/iTXt chunk."""
+    keyword, _, rest = data.partition(b"\0")
+    keyword = keyword.decode("latin-1")
+
+    if chunk_type == b"tEXt":
+        return keyword, rest.decode("latin-1")
+
+    if chunk_type == b"zTXt":
+        # compression method byte, then zlib stream
+        return keyword, _inflate(rest[1:]).decode("latin-1")
+
+    # iTXt: compression flag, method, language tag\0, translated keyword\0, text
+    compressed = rest[:1] == b"\x01"
+    rest = rest[2:]
+    _, _, rest = rest.partition(b"\0")
+    _, _, text = rest.partition(b"\0")
+    if compressed:
+        text = _inflate(text)
+    return keyword, text.decode("utf-8", errors="replace")
+
+
+def parse_tiff_tags(data):
+    """
+    Parse the IFD0 and EXIF IFD tags we care about from a TIFF structure
+    (the payload of an EXIF block). Returns (ifd0, exif_ifd) dicts mapping
+    tag id to str (ASCII fields) or bytes (everything else).
+    """
+    if data.startswith(b"Exif\0\0"):
+        data = data[6:]
+    if len(data) < 8:
+        raise MetadataError("EXIF block too short")
+
+    if data[:2] == b"II":
+        endian = "<"
+    elif data[:2] == b"MM":
+        endian = ">"
+    else:
+        raise MetadataError("Bad TIFF byte order")
+
+    def read_ifd(offset, wanted):
+        tags = {}
+        pointer = None
+        if offset + 2 > len(data):
+            return tags, pointer
+        (count,) = struct.unpack_from(endian + "H", data, offset)
+        for i in range(count):
+            pos = offset + 2 + i * 12
+            if pos + 12 > len(data):
+                break
+            tag, typ, n = struct.unpack_from(endian + "HHI", data, pos)
+            if tag == EXIF_IFD_POINTER:
+                (pointer,) = struct.unpack_from(endian + "I", data, pos + 8)
+                continue
+            if tag not in wanted:
+                continue
+            size = _TIFF_TYPE_SIZES.get(typ, 1) * n
+            if size <= 4:
+                raw = data[pos + 8:pos + 8 + size]
+            else:
+                (value_offset,) = struct.unpack_from(endian + "I", data, pos + 8)
+                raw = data[value_offset:value_offset + size]
+            if typ == 2:
+                tags[tag] = _decode_text(raw.rstrip(b"\0"))
+            else:
+                tags[tag] = raw
+        return tags, pointer
+
+    (ifd0_offset,) = struct.unpack_from(endian + "I", data, 4)
+    ifd0, pointer = read_ifd(ifd0_offset, IFD0_TAGS)
+    exif_ifd = {}
+    if pointer:
+        exif_ifd, _ = read_ifd(pointer, EXIF_IFD_TAGS)
+    return ifd0, exif_ifd
+
+
+def read_png_metadata(f):
+    info = {}
+    ifd0, exif_ifd = {}, {}
+
+    if f.read(8) != PNG_SIGNATURE:
+        raise MetadataError("Not a PNG file")
+
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", header)
+
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+
+        if chunk_type in (b"tEXt", b"zTXt", b"iTXt"):
+            keyword, text = _parse_png_text(chunk_type, _read_exact(f, length))
+            info[keyword] = text
+            f.seek(4, 1)  # CRC
+        elif chunk_type == b"eXIf":
+            ifd0, exif_ifd = parse_tiff_tags(_read_exact(f, length))
+            f.seek(4, 1)
+        else:
+            f.seek(length + 4, 1)
+
+    return info, ifd0, exif_ifd
+
+
+def read_webp_metadata(f):
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        raise MetadataError("Not a WebP file")
+
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        fourcc, length = struct.unpack("<4sI", chunk)
+        if fourcc == b"EXIF":
+            ifd0, exif_ifd = parse_tiff_tags(_read_exact(f, length))
+            return {}, ifd0, exif_ifd
+        # Chunks are padded to an even size
+        f.seek(length + (length & 1), 1)
+
+    return {}, {}, {}
+
+
+def read_metadata(path):
+    """
+    Read prompt-related metadata from a PNG or WebP file without decoding it.
+
+    Returns (info, exif, exif_ifd): PNG text chunks by keyword, and the
+    ImageDescription/Make/Model/Copyright and UserComment EXIF tags by id.
+    Returns None for other formats so the caller can fall back to PIL.
+    Raises MetadataError for malformed files.
+    """
+    with open(path, "rb") as f:
+        return read_metadata_file(f)
+
+
+def read_metadata_file(f):
+    """read_metadata for an open binary file positioned at its start."""
+    magic = f.read(12)
+    f.seek(0)
+    if magic.startswith(PNG_SIGNATURE):
+        return read_png_metadata(f)
+    if magic[:4] == b"RIFF" and magic[8:12] == b"WEBP":
+        return read_webp_metadata(f)
+    return None
+
+
+def read_image_size(path):
+    """
+    Return (width, height) from the PNG IHDR or WebP VP8X/VP8/VP8L header,
+    or None for other formats.
+    """
+    with open(path, "rb") as f:
+        return read_image_size_file(f)
+
+
+def read_image_size_file(f):
+    """read_image_size for an open binary file positioned at its start."""
+    head = f.read(30)
+    f.seek(0)
+
+    if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        fourcc = head[12:16]
+        if fourcc == b"VP8X":
+            w = int.from_bytes(head[24:27], "little") + 1
+            h = int.from_bytes(head[27:30], "little") + 1
+            return w, h
+        if fourcc == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+            w, h = struct.unpack("<HH", head[26:30])
+            return w & 0x3FFF, h & 0x3FFF
+        if fourcc == b"VP8L" and head[20:21] == b"\x2f":
+            bits = int.from_bytes(head[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+
+    return None
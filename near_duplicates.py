@@ -0,0 +1,309 @@
+import os
+import sqlite3
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+try:
+    from . import archives, settings
+except ImportError:
+    import archives
+    import settings
+
+# Near-duplicate detection for seed sweeps and re-renders. Every rendered
+# thumbnail also yields a 64-bit difference hash (dHash) of the image, stored
+# per file in SQLite. Clustering is multi-index hashing in NumPy: two hashes
+# within d bits of each other agree to within d // 4 bits on at least one of
+# their four 16-bit bands, so candidate pairs come from sorted band lookups
+# instead of comparing every pair, and are then checked on the full hash.
+
+# dHash grid: 8 rows of 9 pixels give 8x8 left/right gradient bits
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+BANDS = 4
+BAND_BITS = 16
+
+# Largest distance cluster() accepts. Each band is probed with every value
+# within max_distance // BANDS bits of its own, 17 probes up to 7 bits and 137
+# up to 11; beyond that unrelated images start to match anyway.
+MAX_DISTANCE = 11
+
+# Distinct hashes one band value may hold before the band stops being
+# searched for it (near-flat images hash alike and would pair with each other
+# quadratically)
+BUCKET_LIMIT = 4096
+
+# Candidate pairs expanded at once, bounding memory on crowded bands
+_PAIR_CHUNK = 1 << 22
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def dhash(img):
+    """64-bit difference hash of a PIL image: one bit per horizontally adjacent pixel pair."""
+    gray = img.convert("L").resize((HASH_WIDTH, HASH_HEIGHT), Image.Resampling.BOX)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_image_bytes(data):
+    """dHash of an encoded image, e.g. a cached thumbnail."""
+    with Image.open(BytesIO(data)) as img:
+        return dhash(img)
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _band_masks(radius):
+    """16-bit masks with at most radius bits set, 0 first."""
+    masks = np.arange(1 << BAND_BITS, dtype=np.int64)
+    return masks[_popcount(masks.astype(np.uint64)) <= radius]
+
+
+class HashStore:
+    """
+    dHashes keyed by normalized file path, with the file size and mtime_ns
+    they were computed for; a hash whose file has changed since is ignored.
+    Archive members carry the archive's mtime_ns, as archives.stat reports.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.writes = 0
+        self._local = threading.local()
+
+    def _connect(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(hashes)")}
+        if "mtime_ns" not in columns:
+            try:
+                with conn:
+                    # Rows from before mtimes were kept never match, so they are hashed again
+                    conn.execute("ALTER TABLE hashes ADD COLUMN mtime_ns INTEGER NOT NULL DEFAULT -1")
+            except sqlite3.OperationalError:
+                pass  # Another thread added it first
+
+    @staticmethod
+    def _normalize(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def put(self, path, st, value):
+        # A lost hash only means the file is not collapsed until it is hashed again
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                    (self._normalize(path), st.st_size, st.st_mtime_ns, _to_signed(value)),
+                )
+            self.writes += 1
+        except sqlite3.Error as e:
+            print(f"Gravity Gallery: could not save image hash: {e}")
+
+    def has(self, path, st):
+        """Whether a hash of the file as it is now (per its stat result) is stored."""
+        try:
+            row = self._connect().execute(
+                "SELECT size, mtime_ns FROM hashes WHERE path = ?", (self._normalize(path),)
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None and row == (st.st_size, st.st_mtime_ns)
+
+    def under(self, root):
+        """{normalized path: (size, mtime_ns, hash)} of every file below root, as unsigned hashes."""
+        prefix = self._normalize(root).rstrip(os.sep) + os.sep
+        # Paths below root sort between "root/" and the next separator value
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        rows = self._connect().execute(
+            "SELECT path, size, mtime_ns, hash FROM hashes WHERE path >= ? AND path < ?", (prefix, upper)
+        )
+        return {path: (size, mtime_ns, value & 0xFFFFFFFFFFFFFFFF) for path, size, mtime_ns, value in rows}
+
+    def stats(self):
+        try:
+            count = self._connect().execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+        except sqlite3.Error:
+            count = None
+        return {"hashes": count, "writes": self.writes}
+
+
+def _expand(order, lo, counts, start):
+    # (i, j) for every row i = start + k and each of its counts[k] matches order[lo[k]:]
+    total = int(counts.sum())
+    firsts = np.cumsum(counts) - counts
+    i = np.repeat(np.arange(start, start + len(counts)), counts)
+    j = order[np.repeat(lo, counts) + np.arange(total) - np.repeat(firsts, counts)]
+    return i, j
+
+
+def _merge(labels, i, j):
+    """Join the clusters of each pair (i[k], j[k]) in labels, in place."""
+    while len(i):
+        li, lj = labels[i], labels[j]
+        differ = li != lj
+        if not differ.any():
+            return
+        i, j, li, lj = i[differ], j[differ], li[differ], lj[differ]
+        low = np.minimum(li, lj)
+        # Hook both roots onto the smaller one, then jump pointers to the roots
+        np.minimum.at(labels, li, low)
+        np.minimum.at(labels, lj, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels[:] = jumped
+
+
+def _cluster_unique(hashes, max_distance):
+    """Label of each (distinct) hash: the smallest index in its cluster."""
+    n = len(hashes)
+    labels = np.arange(n)
+    masks = _band_masks(max_distance // BANDS)
+    for band in range(BANDS):
+        keys = ((hashes >> np.uint64(band * BAND_BITS)) & np.uint64(0xFFFF)).astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        # starts[v]:starts[v + 1] is where band value v sits in order
+        starts = np.searchsorted(keys[order], np.arange((1 << BAND_BITS) + 1))
+        for mask in masks:
+            probes = keys ^ mask
+            lo = starts[probes]
+            counts = starts[probes + 1] - lo
+            counts[counts > BUCKET_LIMIT] = 0
+            ends = np.cumsum(counts)
+            if not ends[-1]:
+                continue
+            # Rows per chunk so each chunk expands to about _PAIR_CHUNK candidates
+            cuts = np.searchsorted(ends, np.arange(_PAIR_CHUNK, ends[-1], _PAIR_CHUNK)).tolist()
+            for start, stop in zip([0] + cuts, cuts + [n]):
+                if start == stop:
+                    continue
+                i, j = _expand(order, lo[start:stop], counts[start:stop], start)
+                keep = i < j
+                i, j = i[keep], j[keep]
+                close = _popcount(hashes[i] ^ hashes[j]) <= max_distance
+                _merge(labels, i[close], j[close])
+    return labels
+
+
+def cluster(hashes, max_distance=6):
+    """
+    Cluster label of each 64-bit hash: hashes within max_distance bits are
+    in one cluster (transitively). The label is the smallest index in the
+    cluster. Exact unless more than BUCKET_LIMIT distinct hashes share a
+    16-bit band value; such a band is not searched for them.
+    """
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(hashes) < 2:
+        return np.arange(len(hashes))
+    # Identical hashes are one node, so a folder of copies stays cheap
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    labels = _cluster_unique(unique, max_distance)
+    # Relabel by first occurrence in the input
+    first = np.full(len(unique), len(hashes), dtype=np.int64)
+    np.minimum.at(first, labels[inverse], np.arange(len(hashes)))
+    return first[labels[inverse]]
+
+
+def _stat_mtime(path, entry, archive_mtimes):
+    # The mtime a hash was stored with: the file's own, or for an archive
+    # member the archive's (listings show the member's date instead)
+    member = archives.split_member_path(path)
+    if member is None:
+        return entry["mtime"]
+    archive = member[0]
+    if archive not in archive_mtimes:
+        try:
+            archive_mtimes[archive] = os.stat(archive).st_mtime
+        except OSError:
+            archive_mtimes[archive] = None
+    return archive_mtimes[archive]
+
+
+def collapse(entries, roots, store, max_distance=6):
+    """
+    One entry per cluster of near-duplicate images, in the order of entries:
+    the first entry of each cluster stands for it and gets "duplicates" (the
+    number of others). Entries without a current hash are kept as they are.
+    roots are the listed folders; entry filenames are relative to the first
+    (or absolute, as in multi-folder listings).
+    Returns (collapsed entries, number of entries that had a hash).
+    """
+    known = {}
+    for root in roots:
+        known.update(store.under(root))
+    base = HashStore._normalize(roots[0])
+    archive_mtimes = {}
+    hashed, values = [], []
+    for index, entry in enumerate(entries):
+        path = os.path.join(base, entry["filename"])
+        found = known.get(os.path.normcase(path))
+        if found is None or found[0] != entry["size"]:
+            continue
+        mtime = _stat_mtime(path, entry, archive_mtimes)
+        # Same tolerance as gallery_index.apply_ratings: listings carry float seconds
+        if mtime is not None and abs(found[1] / 1e9 - mtime) < 1e-6:
+            hashed.append(index)
+            values.append(found[2])
+
+    if len(values) < 2:
+        return entries, len(values)
+    labels = cluster(np.array(values, dtype=np.uint64), max_distance)
+    sizes = np.bincount(labels, minlength=len(values))
+
+    dropped = set()
+    duplicates = {}
+    for position, label in enumerate(labels.tolist()):
+        if label == position:
+            if sizes[label] > 1:
+                duplicates[hashed[position]] = int(sizes[label]) - 1
+        else:
+            dropped.add(hashed[position])
+
+    collapsed = []
+    for index, entry in enumerate(entries):
+        if index in dropped:
+            continue
+        count = duplicates.get(index)
+        collapsed.append(entry if count is None else dict(entry, duplicates=count))
+    return collapsed, len(values)
+
+
+hash_store = HashStore(settings.HASH_DB_PATH)
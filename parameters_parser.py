@@ -0,0 +1,236 @@
+import re
+import json
+
+# Parser for A1111-style "parameters" text and Civitai UserComment payloads.
+# Everything is found with precompiled patterns in one left-to-right pass and
+# returned as a generation record:
+#
+#   positive, negative  prompt texts
+#   steps, sampler, cfg, seed, width, height
+#   resources           [{"type", "name", "hash", ...}] (models, LoRAs, embeddings)
+#   settings            every "Key: value" of the settings block, as written
+
+# Phrases that end the positive prompt, wherever they appear
+STOP_PHRASES = (
+    "Negative prompt:",
+    "Steps:",
+    "Sampler:",
+    "CFG scale:",
+    "Seed:",
+    "Size:",
+    "Clip skip:",
+    "Created Date:",
+    "Civitai resources:",
+    "Civitai metadata:",
+)
+
+# Leftmost match of the alternation = earliest stop phrase
+_STOP_RE = re.compile("|".join(re.escape(p) for p in STOP_PHRASES))
+
+# A negative prompt runs until the settings line, which A1111 starts with
+# "Steps:"; failing that, until a line starting with any other settings key
+_STEPS_LINE_RE = re.compile(r"\n[ \t]*(?=Steps:)")
+_SETTINGS_START_RE = re.compile(
+    r"(?:^|\n)[ \t]*(?=(?:" + "|".join(re.escape(p) for p in STOP_PHRASES[1:]) + "))"
+)
+
+_KEY_RE = re.compile(r'[\s,]*([^:,\n"]+?):[ \t]*')
+_QUOTED_RE = re.compile(r'"((?:\\.|[^\\"])*)"')
+_PLAIN_RE = re.compile(r"[^,\n]*")
+_SIZE_RE = re.compile(r"(\d+)\s*x\s*(\d+)")
+_HASH_LIST_RE = re.compile(r"\s*([^:,]+?)\s*:\s*([0-9A-Fa-f]+)")
+
+_json_decoder = json.JSONDecoder()
+
+# settings key -> resource type, for the name: hash lists A1111 writes
+_HASH_LIST_KEYS = {"Lora hashes": "lora", "TI hashes": "embed"}
+
+# UserComment character code prefixes (EXIF 2.3, 8 bytes)
+_USER_COMMENT_PREFIXES = (b"ASCII\0\0\0", b"UNICODE\0", b"JIS\0\0\0\0\0", b"\0" * 8)
+
+
+def empty_record():
+    return {
+        "positive": "",
+        "negative": "",
+        "steps": 0,
+        "sampler": "",
+        "cfg": 0.0,
+        "seed": 0,
+        "width": 0,
+        "height": 0,
+        "resources": [],
+        "settings": {},
+    }
+
+
+def to_int(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return 0
+
+
+def to_float(value):
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def positive_prompt(text):
+    """Text before the first stop phrase, stripped."""
+    m = _STOP_RE.search(text)
+    return (text[:m.start()] if m else text).strip()
+
+
+def parse_settings(text, pos=0):
+    """Parse a `Key: value, Key: "quoted", Key: [json]` block into a dict."""
+    settings = {}
+    end = len(text)
+    while pos < end:
+        m = _KEY_RE.match(text, pos)
+        if m is None:
+            break
+        key = m.group(1).strip()
+        pos = m.end()
+
+        first = text[pos:pos + 1]
+        value = None
+        if first == '"':
+            q = _QUOTED_RE.match(text, pos)
+            if q is not None:
+                value = q.group(1).replace('\\"', '"').replace("\\\\", "\\")
+                pos = q.end()
+        elif first in ("[", "{"):
+            try:
+                value, pos = _json_decoder.raw_decode(text, pos)
+            except ValueError:
+                pass
+        if value is None:
+            p = _PLAIN_RE.match(text, pos)
+            value = p.group().strip()
+            pos = p.end()
+
+        settings[key] = value
+        if pos == m.start():
+            break
+    return settings
+
+
+def _resources_from_settings(settings):
+    civitai = settings.get("Civitai resources")
+    if isinstance(civitai, list):
+        return [r for r in civitai if isinstance(r, dict)]
+
+    resources = []
+    if settings.get("Model") or settings.get("Model hash"):
+        resources.append({
+            "type": "checkpoint",
+            "name": settings.get("Model", ""),
+            "hash": settings.get("Model hash", ""),
+        })
+    for key, kind in _HASH_LIST_KEYS.items():
+        value = settings.get(key)
+        if isinstance(value, str):
+            for name, digest in _HASH_LIST_RE.findall(value):
+                resources.append({"type": kind, "name": name, "hash": digest})
+    return resources
+
+
+def parse_parameters(text):
+    """Parse A1111 / Civitai "parameters" text into a generation record."""
+    record = empty_record()
+    m = _STOP_RE.search(text)
+    if m is None:
+        record["positive"] = text.strip()
+        return record
+    record["positive"] = text[:m.start()].strip()
+
+    settings_at = m.start()
+    if text.startswith("Negative prompt:", m.start()):
+        negative_at = m.end()
+        s = _STEPS_LINE_RE.search(text, negative_at) or _SETTINGS_START_RE.search(text, negative_at)
+        settings_at = s.end() if s else len(text)
+        record["negative"] = text[negative_at:settings_at].strip()
+
+    settings = parse_settings(text, settings_at)
+    record["settings"] = settings
+    record["steps"] = to_int(settings.get("Steps"))
+    record["sampler"] = str(settings.get("Sampler", ""))
+    record["cfg"] = to_float(settings.get("CFG scale"))
+    record["seed"] = to_int(settings.get("Seed"))
+    size = _SIZE_RE.match(str(settings.get("Size", "")))
+    if size:
+        record["width"], record["height"] = int(size.group(1)), int(size.group(2))
+    record["resources"] = _resources_from_settings(settings)
+    return record
+
+
+def parse_civitai_json(text):
+    """
+    Generation record from a Civitai JSON UserComment ({"extraMetadata": "..."}),
+    or None if text is not one or carries no prompt.
+    """
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+        extra = data.get("extraMetadata") if isinstance(data, dict) else None
+        if isinstance(extra, str):
+            extra = json.loads(extra)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(extra, dict) or "prompt" not in extra:
+        return None
+
+    record = empty_record()
+    record["positive"] = extra.get("prompt") or ""
+    record["negative"] = extra.get("negativePrompt") or ""
+    record["steps"] = to_int(extra.get("steps"))
+    record["sampler"] = str(extra.get("sampler") or "")
+    record["cfg"] = to_float(extra.get("cfgScale"))
+    record["seed"] = to_int(extra.get("seed"))
+    record["width"] = to_int(extra.get("width"))
+    record["height"] = to_int(extra.get("height"))
+    resources = data.get("resources") or extra.get("resources") or []
+    record["resources"] = [r for r in resources if isinstance(r, dict)] if isinstance(resources, list) else []
+    record["settings"] = {k: v for k, v in extra.items() if k not in ("prompt", "negativePrompt")}
+    return record
+
+
+def _looks_utf16le(data):
+    # ASCII text in UTF-16LE has a zero in every odd byte
+    return len(data) > 10 and data[1:20:2].count(0) > 5
+
+
+def decode_user_comment(value):
+    """Decode an EXIF UserComment, honouring its character code prefix."""
+    if isinstance(value, bytes):
+        prefix, payload = value[:8], value[8:]
+        if prefix == b"UNICODE\0":
+            # Byte order is the writer's; sniff it from where the zeros are
+            if payload[:2] == b"\xff\xfe" or _looks_utf16le(payload):
+                text = payload.decode("utf-16le", errors="ignore")
+            else:
+                text = payload.decode("utf-16be", errors="ignore")
+        elif prefix in _USER_COMMENT_PREFIXES:
+            text = payload.decode("utf-8", errors="ignore")
+        elif _looks_utf16le(value):
+            text = value.decode("utf-16le", errors="ignore")
+        else:
+            text = value.decode("utf-8", errors="ignore")
+        value = text.replace("\x00", "").lstrip("\ufeff")
+
+    # Prefixes that survived as text (e.g. decoded by another reader)
+    for prefix in ("UNICODE", "ASCII", "JIS", "UNDEFINED"):
+        if value.startswith(prefix):
+            return value[len(prefix):].lstrip()
+    return value
+
+
+def parse_user_comment(value):
+    """Generation record from a Civitai / A1111 EXIF UserComment (bytes or str)."""
+    text = decode_user_comment(value)
+    record = parse_civitai_json(text)
+    return record if record is not None else parse_parameters(text)
@@ -0,0 +1,236 @@
+import time
+import heapq
+import threading
+from concurrent.futures import CancelledError
+
+try:
+    from .workers import PoolBusy
+except ImportError:
+    from workers import PoolBusy
+
+# Queue tiers, warmed in this order
+TIER_VISIBLE = 0  # In the gallery's viewport
+TIER_NEAR = 1  # Reported around the viewport, by distance from it
+TIER_REST = 2  # The rest of the directory, in sort order
+
+
+class _Session:
+    def __init__(self, view):
+        self.view = view  # (directory, size, fmt, sort, order, scan options)
+        self.generation = 0
+        self.queue = []  # heap of (tier, rank, filename)
+        self.wanted = set()
+        self.done = set()
+        self.rest = None  # remaining filenames in sort order, once loaded
+        self.rest_source = None
+        self.rest_loading = False
+        self.expires = 0.0
+        self.updated = 0.0
+
+    def head_tier(self):
+        if self.queue:
+            return self.queue[0][0]
+        if self.rest is None or self.rest:
+            return TIER_REST
+        return None
+
+
+class ThumbnailWarmer:
+    """
+    Renders thumbnails for open galleries in the background, ahead of the
+    user scrolling to them.
+
+    Each gallery is a session that reports the slice of its file list around
+    the viewport. Files in the viewport are warmed first, then the rest of
+    that slice by distance from the viewport, then (up to rest_limit files)
+    the whole directory in sort order. Every report replaces the session's
+    queue, so files that scrolled out of reach are dropped, and the job in
+    flight is cancelled if it was not started yet. Sessions expire when not
+    renewed, like watcher leases.
+
+    warm(directory, filename, size, fmt, is_alive) is called on the warmer
+    thread and returns True if it rendered a thumbnail (False when it was
+    already cached). After each render the warmer sleeps in proportion to the
+    render time, so it uses at most cpu_share of one core, and it does
+    nothing while is_busy() returns True (ComfyUI is running a prompt).
+    """
+
+    def __init__(self, warm, cpu_share=0.25, is_busy=None, rest_limit=2000,
+                 lease_seconds=30.0, busy_poll=1.0):
+        self.warm = warm
+        self.cpu_share = min(1.0, max(0.01, cpu_share))
+        self.is_busy = is_busy
+        self.rest_limit = rest_limit
+        self.lease_seconds = lease_seconds
+        self.busy_poll = busy_poll
+        self.warmed = 0
+        self.already_cached = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.busy_waits = 0
+        self._cond = threading.Condition()
+        self._sessions = {}
+        self._thread = None
+
+    def update(self, session_id, view, window, visible_start, visible_end, rest=None):
+        """
+        Report a gallery's viewport. view is (directory, size, fmt, ...),
+        the rest identifying the listing (sort, order, scan options); a new
+        view starts the session over. window is the slice of the gallery's
+        file list around the viewport, of which window[visible_start:
+        visible_end] is on screen. rest() returns the directory's filenames
+        in sort order; it is called on the warmer thread.
+        Returns the number of files queued.
+        """
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if session is None or session.view != view:
+                session = _Session(view)
+                self._sessions[session_id] = session
+            session.generation += 1
+            session.updated = time.monotonic()
+            session.expires = session.updated + self.lease_seconds
+            session.rest_source = rest
+            if rest is None:
+                session.rest = []
+
+            queue = []
+            for i, filename in enumerate(window):
+                if filename in session.done:
+                    continue
+                if visible_start <= i < visible_end:
+                    queue.append((TIER_VISIBLE, i - visible_start, filename))
+                elif i < visible_start:
+                    queue.append((TIER_NEAR, visible_start - i, filename))
+                else:
+                    queue.append((TIER_NEAR, i - visible_end + 1, filename))
+            heapq.heapify(queue)
+            session.queue = queue
+            session.wanted = set(window)
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="gravity-gallery-prewarm", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return len(queue)
+
+    def stop(self, session_id):
+        with self._cond:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                session.generation += 1
+
+    def _pick(self):
+        # Lowest tier first; among equals, the gallery that reported last
+        now = time.monotonic()
+        for session_id in [s for s, session in self._sessions.items() if session.expires < now]:
+            self._sessions.pop(session_id).generation += 1
+
+        best = None
+        for session in self._sessions.values():
+            tier = session.head_tier()
+            if tier is None or (tier == TIER_REST and session.rest_loading):
+                continue
+            rank = (tier, -session.updated)
+            if best is None or rank < best[0]:
+                best = (rank, session)
+        if best is None:
+            return None
+
+        session = best[1]
+        if session.queue:
+            tier, _, filename = heapq.heappop(session.queue)
+        elif session.rest is None:
+            session.rest_loading = True
+            return session, TIER_REST, None, session.generation
+        else:
+            tier, filename = TIER_REST, session.rest.pop()
+        return session, tier, filename, session.generation
+
+    def _load_rest(self, session):
+        try:
+            names = list(session.rest_source())
+        except Exception as e:
+            print(f"Gravity Gallery: pre-warm listing failed: {e}")
+            names = []
+        with self._cond:
+            session.rest_loading = False
+            if session.rest is None:
+                # Reversed so the next file in sort order pops off the end
+                names = [name for name in names[:self.rest_limit] if name not in session.done]
+                session.rest = names[::-1]
+
+    def _run(self):
+        while True:
+            if self.is_busy is not None and self.is_busy():
+                self.busy_waits += 1
+                time.sleep(self.busy_poll)
+                continue
+
+            with self._cond:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                picked = self._pick()
+                if picked is None:
+                    self._cond.wait(self.busy_poll)
+                    continue
+
+            session, tier, filename, generation = picked
+            if filename is None:
+                self._load_rest(session)
+                continue
+            if filename in session.done:
+                continue
+
+            def is_alive(session=session, filename=filename, generation=generation):
+                # Still wanted after the latest viewport report?
+                if session.expires < time.monotonic():
+                    return False
+                return session.generation == generation or filename in session.wanted
+
+            directory, size, fmt = session.view[:3]
+            start = time.perf_counter()
+            try:
+                rendered = self.warm(directory, filename, size, fmt, is_alive)
+            except PoolBusy:
+                # Requests from the gallery have the queue; try again shortly
+                with self._cond:
+                    if tier != TIER_REST:
+                        heapq.heappush(session.queue, (tier, 0, filename))
+                    else:
+                        session.rest.append(filename)
+                time.sleep(self.busy_poll)
+                continue
+            except CancelledError:
+                # Scrolled out of reach before a worker picked it up
+                self.cancelled += 1
+                continue
+            except Exception as e:
+                print(f"Gravity Gallery: pre-warm of {filename} failed: {e}")
+                self.failed += 1
+                rendered = False
+            elapsed = time.perf_counter() - start
+
+            session.done.add(filename)
+            if not rendered:
+                self.already_cached += 1
+                continue
+            self.warmed += 1
+            # Duty cycle: busy for elapsed, idle for the rest of the share
+            time.sleep(elapsed * (1.0 - self.cpu_share) / self.cpu_share)
+
+    def stats(self):
+        with self._cond:
+            queued = sum(len(s.queue) + len(s.rest or ()) for s in self._sessions.values())
+            sessions = len(self._sessions)
+        return {
+            "sessions": sessions,
+            "queued": queued,
+            "cpu_share": self.cpu_share,
+            "warmed": self.warmed,
+            "already_cached": self.already_cached,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "busy_waits": self.busy_waits,
+        }
@@ -0,0 +1,62 @@
+import os
+
+# Runtime settings for the gallery. Every value can be overridden with an
+# environment variable so it can be tuned without editing the node source.
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+EXTENSION_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Root folder for everything the gallery persists between ComfyUI restarts
+CACHE_DIR = os.environ.get("GRAVITY_GALLERY_CACHE_DIR", os.path.join(EXTENSION_DIR, ".cache"))
+
+# On-disk thumbnail cache
+THUMBNAIL_CACHE_DIR = os.path.join(CACHE_DIR, "thumbnails")
+THUMBNAIL_CACHE_BYTES = _env_int("GRAVITY_GALLERY_THUMB_CACHE_MB", 512) * 1024 * 1024
+
+# Thumbnail worker pool. Decoding runs on threads by default, set
+# GRAVITY_GALLERY_THUMB_PROCESSES=1 to use worker processes instead.
+THUMBNAIL_WORKERS = _env_int("GRAVITY_GALLERY_THUMB_WORKERS", min(4, os.cpu_count() or 1))
+THUMBNAIL_MAX_PENDING = _env_int("GRAVITY_GALLERY_THUMB_QUEUE", 256)
+THUMBNAIL_USE_PROCESSES = _env_int("GRAVITY_GALLERY_THUMB_PROCESSES", 0) == 1
+
+# In-memory cache of extraction results, keyed by file identity
+RESULT_CACHE_ENTRIES = _env_int("GRAVITY_GALLERY_RESULT_CACHE_ENTRIES", 4096)
+RESULT_CACHE_BYTES = _env_int("GRAVITY_GALLERY_RESULT_CACHE_MB", 64) * 1024 * 1024
+
+# Persistent SQLite index of per-directory metadata (GRAVITY_GALLERY_INDEX=0 disables it)
+INDEX_ENABLED = _env_int("GRAVITY_GALLERY_INDEX", 1) == 1
+INDEX_DB_PATH = os.path.join(CACHE_DIR, "gallery_index.sqlite3")
+
+# Perceptual hashes of rendered thumbnails, and the Hamming distance (in bits
+# of 64) within which "collapse duplicates" treats two images as one
+HASH_DB_PATH = os.path.join(CACHE_DIR, "image_hashes.sqlite3")
+DUPLICATE_DISTANCE = _env_int("GRAVITY_GALLERY_DUPLICATE_DISTANCE", 6)
+
+# Member tables of browsed zip/tar archives, and how many archives stay memory-mapped
+ARCHIVE_INDEX_DIR = os.path.join(CACHE_DIR, "archives")
+ARCHIVES_OPEN_MAX = _env_int("GRAVITY_GALLERY_ARCHIVES_OPEN", 8)
+
+# How long a directory listing is shared between galleries and routes before it is re-read
+LISTING_FRESH_MS = _env_int("GRAVITY_GALLERY_LISTING_FRESH_MS", 2000)
+
+# Folders read at once by recursive / multi-folder scans (they wait on I/O, so more than cores)
+SCAN_THREADS = _env_int("GRAVITY_GALLERY_SCAN_THREADS", 16)
+
+# Directory change notifications for open galleries
+WATCH_INTERVAL_MS = _env_int("GRAVITY_GALLERY_WATCH_INTERVAL_MS", 2000)
+
+# Background thumbnail pre-warming for open galleries
+PREWARM_ENABLED = _env_int("GRAVITY_GALLERY_PREWARM", 1) == 1
+PREWARM_CPU_PERCENT = _env_int("GRAVITY_GALLERY_PREWARM_CPU_PERCENT", 25)
+PREWARM_LIMIT = _env_int("GRAVITY_GALLERY_PREWARM_LIMIT", 2000)
+
+# Per-stage timings appended to debug_info, and the /gravity/gallery/profile sampling profiler
+DEBUG_TIMINGS = _env_int("GRAVITY_GALLERY_DEBUG_TIMINGS", 0) == 1
+PROFILER_ENABLED = _env_int("GRAVITY_GALLERY_PROFILER", 0) == 1
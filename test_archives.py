@@ -0,0 +1,103 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+import archives
+from archives import ArchiveStore, split_member_path
+
+
+@pytest.fixture
+def tree(tmp_path):
+    with zipfile.ZipFile(tmp_path / "renders.zip", "w") as zf:
+        zf.writestr("batch1/00001.png", b"stored", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("batch1/00002.png", b"deflated" * 100, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("inner.zip/00003.png", b"not nested")
+    with tarfile.open(tmp_path / "Old.TAR", "w") as tf:
+        data = b"from tar"
+        info = tarfile.TarInfo("00004.png")
+        info.size = len(data)
+        tf.addfile(info, io.BytesIO(data))
+    # A folder whose name looks like an archive
+    (tmp_path / "looks.zip").mkdir()
+    (tmp_path / "looks.zip" / "a.png").write_bytes(b"plain")
+    return tmp_path
+
+
+def test_split_member_path(tree):
+    zip_path = str(tree / "renders.zip")
+
+    assert split_member_path(os.path.join(zip_path, "batch1", "00001.png")) == (zip_path, "batch1/00001.png")
+    assert split_member_path(zip_path + "/batch1/00001.png") == (zip_path, "batch1/00001.png")
+    # The first archive on the path holds the rest, even a name like "inner.zip"
+    assert split_member_path(os.path.join(zip_path, "inner.zip", "00003.png")) == (zip_path, "inner.zip/00003.png")
+    # Extensions match case-insensitively
+    assert split_member_path(os.path.join(str(tree), "Old.TAR", "00004.png")) == (str(tree / "Old.TAR"), "00004.png")
+
+
+def test_split_member_path_rejects(tree):
+    assert split_member_path(str(tree / "renders.zip")) is None  # The archive itself
+    assert split_member_path(os.path.join(str(tree), "looks.zip", "a.png")) is None  # A folder
+    assert split_member_path(os.path.join(str(tree), "renders.zipper", "a.png")) is None
+    assert split_member_path(os.path.join(str(tree), "missing.zip", "a.png")) is None
+    assert split_member_path(str(tree / "plain.png")) is None
+
+
+def test_members_read_in_place(tree, monkeypatch):
+    store = ArchiveStore(str(tree / "index"))
+    monkeypatch.setattr(archives, "archive_store", store)
+    zip_path = str(tree / "renders.zip")
+
+    assert sorted(name for name, _, _ in store.members(zip_path)) == ["batch1/00001.png", "batch1/00002.png", "inner.zip/00003.png"]
+    assert archives.read_file(os.path.join(zip_path, "batch1", "00001.png")) == b"stored"
+    assert archives.read_file(os.path.join(zip_path, "batch1", "00002.png")) == b"deflated" * 100
+    assert archives.read_file(os.path.join(str(tree), "Old.TAR", "00004.png")) == b"from tar"
+
+    st = archives.stat(os.path.join(zip_path, "batch1", "00002.png"))
+    assert st.st_size == 800
+    assert st.st_mtime_ns == os.stat(zip_path).st_mtime_ns
+    with pytest.raises(FileNotFoundError):
+        archives.stat(os.path.join(zip_path, "batch1", "missing.png"))
+
+
+def test_member_index_is_reused(tree):
+    zip_path = str(tree / "renders.zip")
+    store = ArchiveStore(str(tree / "index"))
+    store.members(zip_path)
+    assert store.builds == 1
+
+    # A second store (e.g. after a restart) loads the saved index
+    again = ArchiveStore(str(tree / "index"))
+    again.members(zip_path)
+    assert again.builds == 0
+
+    # Rewriting the archive rebuilds it
+    with zipfile.ZipFile(zip_path, "a") as zf:
+        zf.writestr("batch2/00005.png", b"new")
+    os.utime(zip_path, ns=(0, os.stat(zip_path).st_mtime_ns + 10**9))
+    assert "batch2/00005.png" in [name for name, _, _ in again.members(zip_path)]
+    assert again.builds == 1
+
+
+def test_index_record_reads_members(tmp_path, monkeypatch):
+    import gallery_node
+
+    monkeypatch.setattr(archives, "archive_store", ArchiveStore(str(tmp_path / "index")))
+    meta = PngImagePlugin.PngInfo()
+    meta.add_text("parameters", "a lighthouse\nSteps: 20, Sampler: Euler")
+    png, jpeg = io.BytesIO(), io.BytesIO()
+    Image.new("RGB", (32, 16)).save(png, "PNG", pnginfo=meta)
+    Image.new("RGB", (24, 12)).save(jpeg, "JPEG")
+    zip_path = str(tmp_path / "renders.zip")
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("a.png", png.getvalue())
+        zf.writestr("b.jpg", jpeg.getvalue())
+
+    record = gallery_node.index_record(os.path.join(zip_path, "a.png"))
+    assert (record["prompt"].strip(), record["width"], record["height"]) == ("a lighthouse", 32, 16)
+    # No size in the header: measured by PIL, still inside the archive
+    record = gallery_node.index_record(os.path.join(zip_path, "b.jpg"))
+    assert (record["width"], record["height"]) == (24, 12)
@@ -0,0 +1,108 @@
+import time
+import threading
+
+import pytest
+
+import listing
+from directory_sessions import DirectorySessions, SingleFlight
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def start(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def load():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return ["a.png"]
+
+    leader = start(lambda: results.append(flight.do("key", load)), 1)
+    assert entered.wait(5)
+    followers = start(lambda: results.append(flight.do("key", load)), 3)
+    # Followers have joined the running call before it is let finish
+    wait_for(lambda: flight.coalesced == 3)
+    release.set()
+    for t in leader + followers:
+        t.join(5)
+
+    assert calls == [1]
+    assert len(results) == 4 and all(r is results[0] for r in results)
+    assert flight.stats() == {"calls": 1, "coalesced": 3, "in_flight": 0}
+
+    # Nothing is remembered once the call returned
+    flight.do("key", load)
+    assert len(calls) == 2
+
+
+def test_single_flight_shares_the_error():
+    flight = SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+    errors = []
+
+    def load():
+        entered.set()
+        release.wait(5)
+        raise OSError("share gone")
+
+    def call():
+        try:
+            flight.do("key", load)
+        except OSError as e:
+            errors.append(e)
+
+    threads = start(call, 1)
+    assert entered.wait(5)
+    threads += start(call, 2)
+    wait_for(lambda: flight.coalesced == 2)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(errors) == 3 and all(e is errors[0] for e in errors)
+    assert flight.stats()["in_flight"] == 0
+    # A failed call is not cached either
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: int("x"))
+
+
+def test_sessions_share_one_load(tmp_path):
+    (tmp_path / "b.png").write_bytes(b"x")
+    (tmp_path / "a.bmp").write_bytes(b"x")
+    entered, release = threading.Event(), threading.Event()
+
+    def load(directory, options):
+        entered.set()
+        release.wait(5)
+        return list(listing.iter_entries(directory, options))
+
+    sessions = DirectorySessions(load, fresh_seconds=60)
+    results = []
+    threads = start(lambda: results.append(sessions.filenames(str(tmp_path))), 1)
+    assert entered.wait(5)
+    threads += start(lambda: results.append(sessions.filenames(str(tmp_path))), 2)
+    wait_for(lambda: sessions.stats()["coalesced"] == 2)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert results == [["a.bmp", "b.png"]] * 3
+    assert sessions.stats()["loads"] == 1
+
+    sessions.invalidate(str(tmp_path))
+    assert sessions.peek(str(tmp_path)) is None
@@ -0,0 +1,167 @@
+import os
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+import listing
+from gallery_index import GalleryIndex, apply_ratings, fts_query, rating_from_metadata
+
+
+class Extractor:
+    """Prompt is the file's text; "corrupt" files raise. Counts calls per file."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, path):
+        self.calls.append(os.path.basename(path))
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        if text == "corrupt":
+            raise ValueError("cannot decode")
+        rating = float(text.split("stars=")[1]) if "stars=" in text else 0.0
+        return {"prompt": text, "debug_info": "ok", "format": "test", "width": 1, "height": 1, "rating": rating}
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    for name, text in [("a.png", "a red fox"), ("b.png", "a blue bird stars=4"), ("c.jpg", "red sunset")]:
+        (folder / name).write_text(text, encoding="utf-8")
+    (folder / "notes.txt").write_text("red herring", encoding="utf-8")
+    return folder
+
+
+@pytest.fixture
+def index(tmp_path):
+    extractor = Extractor()
+    return GalleryIndex(str(tmp_path / "index" / "gallery.sqlite3"), extractor), extractor
+
+
+def bump(path, text=None):
+    # A different mtime even on coarse filesystem clocks
+    if text is not None:
+        path.write_text(text, encoding="utf-8")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_rescans_are_incremental(folder, index):
+    gallery_index, extractor = index
+
+    assert gallery_index.scan(str(folder)) == {"added": 3, "updated": 0, "removed": 0}
+    assert sorted(extractor.calls) == ["a.png", "b.png", "c.jpg"]
+
+    extractor.calls.clear()
+    assert gallery_index.scan(str(folder)) == {"added": 0, "updated": 0, "removed": 0}
+    assert extractor.calls == []
+
+    bump(folder / "a.png", "a grey fox")
+    (folder / "c.jpg").unlink()
+    (folder / "d.webp").write_text("green field", encoding="utf-8")
+    assert gallery_index.scan(str(folder)) == {"added": 1, "updated": 1, "removed": 1}
+    assert sorted(extractor.calls) == ["a.png", "d.webp"]
+
+
+def test_search_follows_updates(folder, index):
+    gallery_index, _ = index
+    assert gallery_index.search(str(folder), "red") is None  # Not indexed yet
+
+    gallery_index.scan(str(folder))
+    total, names = gallery_index.search(str(folder), "red")
+    assert (total, sorted(names)) == (2, ["a.png", "c.jpg"])
+    assert gallery_index.search(str(folder), "blu") == (1, ["b.png"])  # Last word is a prefix
+
+    # Updated prompts leave the full-text index through the update trigger,
+    # deleted files through the delete trigger
+    bump(folder / "a.png", "a grey fox")
+    (folder / "c.jpg").unlink()
+    gallery_index.scan(str(folder))
+    assert gallery_index.search(str(folder), "red") == (0, [])
+    assert gallery_index.search(str(folder), "grey fox") == (1, ["a.png"])
+    assert gallery_index.search(str(folder), "...") == (0, [])
+
+
+def test_search_paging_and_other_directories(folder, index, tmp_path):
+    gallery_index, _ = index
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "x.png").write_text("red fox again", encoding="utf-8")
+    gallery_index.scan(str(folder))
+    gallery_index.scan(str(other))
+
+    total, first = gallery_index.search(str(folder), "red", offset=0, limit=1)
+    _, second = gallery_index.search(str(folder), "red", offset=1, limit=1)
+    assert total == 2
+    assert sorted(first + second) == ["a.png", "c.jpg"]
+    assert gallery_index.search(str(other), "fox") == (1, ["x.png"])
+
+
+def test_failed_extraction_is_retried_only_when_the_file_changes(folder, index):
+    gallery_index, extractor = index
+    (folder / "bad.png").write_text("corrupt", encoding="utf-8")
+
+    assert gallery_index.scan(str(folder))["added"] == 4
+    st = os.stat(folder / "bad.png")
+    assert gallery_index.lookup(str(folder / "bad.png"), st.st_mtime_ns, st.st_size) is None
+
+    extractor.calls.clear()
+    gallery_index.scan(str(folder))
+    gallery_index.scan(str(folder))
+    assert extractor.calls == []
+
+    bump(folder / "bad.png", "fixed prompt")
+    assert gallery_index.scan(str(folder)) == {"added": 0, "updated": 1, "removed": 0}
+    st = os.stat(folder / "bad.png")
+    assert gallery_index.lookup(str(folder / "bad.png"), st.st_mtime_ns, st.st_size)[0] == "fixed prompt"
+
+
+def test_lookup_needs_the_exact_identity(folder, index):
+    gallery_index, _ = index
+    gallery_index.scan(str(folder))
+    st = os.stat(folder / "a.png")
+
+    assert gallery_index.lookup(str(folder / "a.png"), st.st_mtime_ns, st.st_size) == ("a red fox", "ok", None)
+    assert gallery_index.lookup(str(folder / "a.png"), st.st_mtime_ns + 1, st.st_size) is None
+    assert gallery_index.lookup(str(folder / "a.png"), st.st_mtime_ns, st.st_size + 1) is None
+
+
+def test_ratings_apply_to_unchanged_files(folder, index):
+    gallery_index, _ = index
+    (folder / "sub").mkdir()
+    (folder / "sub" / "e.png").write_text("deep stars=5", encoding="utf-8")
+    gallery_index.scan(str(folder))
+    gallery_index.scan(str(folder / "sub"))
+
+    ratings = gallery_index.ratings(str(folder))
+    assert {name: r[2] for name, r in ratings.items()} == {"a.png": 0.0, "b.png": 4.0, "c.jpg": 0.0}
+    under = gallery_index.ratings_under(str(folder))
+    assert under[os.path.normcase(str(folder / "sub" / "e.png"))][2] == 5.0
+    assert gallery_index.ratings_under(str(folder / "sub")).keys() == {os.path.normcase(str(folder / "sub" / "e.png"))}
+
+    # b.png changed after it was indexed: its stale rating is not applied
+    bump(folder / "b.png")
+    entries = {e["filename"]: e["rating"] for e in apply_ratings(listing.iter_directory(str(folder)), ratings)}
+    assert entries == {"a.png": 0.0, "b.png": 0, "c.jpg": 0.0}
+
+
+def test_fts_query_quotes_words():
+    assert fts_query('a "red" fox-') == '"a" "red" "fox"*'
+    assert fts_query("  ... ") is None
+
+
+def test_rating_from_metadata(tmp_path):
+    xmp = '<x:xmpmeta><rdf:Description xmp:Rating="4"/></x:xmpmeta>'
+    assert rating_from_metadata({"XML:com.adobe.xmp": xmp}, {}) == 4.0
+    assert rating_from_metadata({"xmp": b"<xmp:Rating>3</xmp:Rating>"}, {}) == 3.0
+    assert rating_from_metadata({}, {0x4746: 2}) == 2.0
+    assert rating_from_metadata({}, {0x4746: -1}) == 0.0
+    assert rating_from_metadata({}, {}) == 0.0
+
+    # Read back from a real PNG
+    meta = PngImagePlugin.PngInfo()
+    meta.add_itxt("XML:com.adobe.xmp", xmp)
+    Image.new("RGB", (4, 4)).save(tmp_path / "r.png", pnginfo=meta)
+    with Image.open(tmp_path / "r.png") as img:
+        assert rating_from_metadata(img.info, {}) == 4.0
@@ -0,0 +1,125 @@
+import random
+
+import pytest
+
+from graph_resolver import VALUE_KEYS, PromptGraph
+
+
+def baseline_get_node_input(node_id, input_key, prompt_json, visited=None):
+    # GravityGalleryNode.get_node_input before the resolver, as reference
+    if visited is None:
+        visited = set()
+    if node_id in visited:
+        return None
+    visited.add(node_id)
+    if node_id not in prompt_json:
+        return None
+    inputs = prompt_json[node_id].get("inputs", {})
+    if input_key not in inputs:
+        return None
+    val = inputs[input_key]
+    if isinstance(val, (str, int, float, bool)):
+        return str(val)
+    if isinstance(val, list) and len(val) == 2:
+        source_node_id = str(val[0])
+        if source_node_id in prompt_json:
+            source_inputs = prompt_json[source_node_id].get("inputs", {})
+            for key in ["text", "string", "value", "string_field", "prompt"]:
+                if key in source_inputs:
+                    res = baseline_get_node_input(source_node_id, key, prompt_json, visited)
+                    if res:
+                        return res
+        return f"<Link to Node {source_node_id}>"
+    return str(val)
+
+
+def random_graph(rng, size):
+    # One value input per node: a literal (sometimes empty), or a link to any
+    # node id, missing ones included; links may form chains and cycles
+    graph = {}
+    for i in range(1, size + 1):
+        key = rng.choice(VALUE_KEYS)
+        roll = rng.random()
+        if roll < 0.3:
+            value = rng.choice(["", f"text {i}", 7, 1.5, True])
+        else:
+            value = [str(rng.randint(1, size + 3)), 0]
+        graph[str(i)] = {"class_type": "PrimitiveNode", "inputs": {key: value}}
+    return graph
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_resolve_matches_baseline(seed):
+    rng = random.Random(seed)
+    prompt = random_graph(rng, 40)
+    graph = PromptGraph(prompt)
+
+    # One graph answers every query, so memoized results are checked too
+    for node_id, node in prompt.items():
+        for key in VALUE_KEYS + ("missing",):
+            assert graph.resolve(node_id, key) == baseline_get_node_input(node_id, key, prompt), (node_id, key)
+
+
+def test_resolve_links_and_missing_nodes():
+    prompt = {
+        "1": {"class_type": "PrimitiveNode", "inputs": {"value": "a cat"}},
+        "2": {"class_type": "Text Multiline", "inputs": {"text": ["1", 0]}},
+        "3": {"class_type": "CLIPTextEncode", "inputs": {"text": ["2", 0], "other": ["9", 0]}},
+    }
+    graph = PromptGraph(prompt)
+
+    assert graph.resolve("3", "text") == "a cat"
+    assert graph.resolve("3", "other") == "<Link to Node 9>"
+    assert graph.resolve("3", "missing") is None
+    assert graph.resolve("9", "text") is None
+
+
+def test_resolve_falls_back_to_later_value_inputs():
+    # The first value inputs of the sources are empty: the text comes from a
+    # later one. The baseline shared its visited set between those attempts,
+    # so it gave up with "<Link to Node 1>" here.
+    prompt = {
+        "1": {"class_type": "PrimitiveNode", "inputs": {"text": "", "value": "empty first input"}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": ["1", 0]}},
+        "3": {"class_type": "PrimitiveNode", "inputs": {"string": "", "string_field": "", "prompt": "last input"}},
+        "4": {"class_type": "CLIPTextEncode", "inputs": {"text": ["3", 0]}},
+    }
+    graph = PromptGraph(prompt)
+
+    assert graph.resolve("2", "text") == "empty first input"
+    assert graph.resolve("4", "text") == "last input"
+    assert baseline_get_node_input("2", "text", prompt) == "<Link to Node 1>"
+
+
+def test_resolve_cycle():
+    prompt = {
+        "1": {"class_type": "Text", "inputs": {"text": ["2", 0]}},
+        "2": {"class_type": "Text", "inputs": {"text": ["1", 0]}},
+    }
+    graph = PromptGraph(prompt)
+
+    assert graph.resolve("1", "text") == baseline_get_node_input("1", "text", prompt) == "<Link to Node 1>"
+    assert graph.resolve("2", "text") == baseline_get_node_input("2", "text", prompt) == "<Link to Node 2>"
+
+
+def test_resolve_deep_chain():
+    # Far deeper than the recursion limit the baseline walk was bound by
+    depth = 20000
+    prompt = {"0": {"class_type": "PrimitiveNode", "inputs": {"value": "deep"}}}
+    for i in range(1, depth):
+        prompt[str(i)] = {"class_type": "Text", "inputs": {"text": [str(i - 1), 0]}}
+
+    assert PromptGraph(prompt).resolve(str(depth - 1), "text") == "deep"
+
+
+def test_classify_and_sampler_roles():
+    prompt = {
+        "1": {"class_type": "CLIPTextEncode", "inputs": {"text": "good"}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "bad"}},
+        "3": {"class_type": "ConditioningCombine", "inputs": {"conditioning_1": ["1", 0]}},
+        "4": {"class_type": "KSampler", "inputs": {"positive": ["3", 0], "negative": ["2", 0]}},
+    }
+    roles = PromptGraph(prompt).classify()
+
+    assert roles.get("1") == "positive"
+    assert roles.get("2") == "negative"
@@ -0,0 +1,70 @@
+import os
+from email.utils import formatdate
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+import http_cache
+
+MTIME = 1700000000.75
+
+
+def request(**headers):
+    return make_mocked_request("GET", "/gravity/gallery/view", headers=headers)
+
+
+@pytest.fixture
+def etag(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"png")
+    os.utime(path, (MTIME, MTIME))
+    return http_cache.file_etag(os.stat(path), "256-webp")
+
+
+def test_file_etag_varies_with_file_and_variant(tmp_path, etag):
+    st = os.stat(tmp_path / "a.png")
+
+    assert etag.startswith('"') and etag.endswith('-256-webp"')
+    assert http_cache.file_etag(st) != http_cache.file_etag(st, "256-webp")
+    os.utime(tmp_path / "a.png", (MTIME + 1, MTIME + 1))
+    assert http_cache.file_etag(os.stat(tmp_path / "a.png"), "256-webp") != etag
+
+
+def test_no_validators():
+    assert not http_cache.is_not_modified(request(), '"x"', MTIME)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("{etag}", True),
+    ("W/{etag}", True),
+    ('"other", {etag}', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_if_none_match(etag, header, expected):
+    assert http_cache.is_not_modified(request(**{"If-None-Match": header.format(etag=etag)}), etag, MTIME) is expected
+
+
+@pytest.mark.parametrize("since, expected", [
+    (MTIME, True),  # Sub-second mtimes match their whole second
+    (MTIME + 60, True),
+    (MTIME - 60, False),
+])
+def test_if_modified_since(etag, since, expected):
+    headers = {"If-Modified-Since": formatdate(since, usegmt=True)}
+    assert http_cache.is_not_modified(request(**headers), etag, MTIME) is expected
+
+
+def test_if_none_match_wins_over_if_modified_since(etag):
+    headers = {"If-None-Match": '"other"', "If-Modified-Since": formatdate(MTIME + 60, usegmt=True)}
+    assert not http_cache.is_not_modified(request(**headers), etag, MTIME)
+
+
+def test_validator_headers(etag):
+    headers = http_cache.validator_headers(etag, MTIME, http_cache.IMMUTABLE)
+
+    assert headers == {
+        "ETag": etag,
+        "Last-Modified": formatdate(MTIME, usegmt=True),
+        "Cache-Control": http_cache.IMMUTABLE,
+    }
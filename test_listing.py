@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import listing
+from listing import paginate, parse_page_params, parse_scan_params, sort_entries
+
+
+def entries(count):
+    return [{"filename": f"{i:03}.png", "mtime": float(i), "size": i, "rating": i % 3} for i in range(count)]
+
+
+def test_paginate_walks_the_whole_listing():
+    files = entries(25)
+    pages, offset = [], 0
+    while True:
+        page, cursor = paginate(files, offset, 10)
+        pages.append(page)
+        if cursor is None:
+            break
+        _, _, offset, _ = parse_page_params({"cursor": cursor})
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert sum(pages, []) == files
+
+
+def test_paginate_edges():
+    files = entries(20)
+
+    assert paginate(files, 0, None) == (files, None)
+    assert paginate(files, 5, None) == (files[5:], None)
+    assert paginate(files, 10, 10) == (files[10:], None)  # Exactly the last page
+    assert paginate(files, 30, 10) == ([], None)
+    assert paginate([], 0, 10) == ([], None)
+
+
+def test_parse_page_params_defaults():
+    assert parse_page_params({}) == ("filename", "asc", 0, None)
+    assert parse_page_params({"sort": "mtime"}) == ("mtime", "desc", 0, None)
+    assert parse_page_params({"sort": "rating", "order": "asc", "offset": "40", "limit": "20"}) == ("rating", "asc", 40, 20)
+
+
+def test_parse_page_params_cursor_wins_over_offset():
+    assert parse_page_params({"offset": "5", "cursor": "60", "limit": "30"})[2] == 60
+    assert parse_page_params({"offset": "5", "cursor": ""})[2] == 5
+
+
+@pytest.mark.parametrize("query", [
+    {"sort": "name"},
+    {"order": "up"},
+    {"offset": "-1"},
+    {"limit": "0"},
+    {"limit": "ten"},
+    {"cursor": "abc"},
+])
+def test_parse_page_params_rejects(query):
+    with pytest.raises(ValueError):
+        parse_page_params(query)
+
+
+def test_sort_entries_breaks_ties_stably():
+    files = [
+        {"filename": "b.png", "mtime": 1.0, "size": 5, "rating": 0},
+        {"filename": "a.png", "mtime": 1.0, "size": 5, "rating": 2},
+        {"filename": "c.png", "mtime": 2.0, "size": 1, "rating": 2},
+    ]
+
+    names = lambda: [e["filename"] for e in files]
+    sort_entries(files, "mtime", descending=True)
+    assert names() == ["c.png", "a.png", "b.png"]
+    sort_entries(files, "size", descending=False)
+    assert names() == ["c.png", "a.png", "b.png"]
+    sort_entries(files, "rating", descending=True)
+    assert names() == ["c.png", "a.png", "b.png"]
+    sort_entries(files, "filename", descending=False)
+    assert names() == ["a.png", "b.png", "c.png"]
+
+
+def test_parse_scan_params():
+    assert parse_scan_params({}) == listing.TOP_LEVEL
+    options = parse_scan_params({"recursive": "1", "depth": "2", "exclude": " tmp*, ,a/b "})
+    assert options == listing.ScanOptions(True, 2, ("tmp*", "a/b"))
+    with pytest.raises(ValueError):
+        parse_scan_params({"depth": "deep"})
+
+
+def test_parse_roots(tmp_path):
+    one, two = tmp_path / "one", tmp_path / "two"
+    one.mkdir()
+    two.mkdir()
+
+    assert listing.parse_roots(str(one)) == [str(one)]
+    assert listing.parse_roots(f"{one}{os.pathsep} {two} {os.pathsep}") == [str(one), str(two)]
+    assert listing.roots_exist(f"{one}{os.pathsep}{two}")
+    assert not listing.roots_exist(f"{one}{os.pathsep}{tmp_path / 'missing'}")
+
+
+def test_iter_directory_lists_images_only(tmp_path):
+    for name in ("a.png", "b.JPG", "c.webp", "d.bmp", "notes.txt"):
+        (tmp_path / name).write_bytes(b"x")
+    (tmp_path / "folder.png").mkdir()
+
+    assert sorted(e["filename"] for e in listing.iter_directory(str(tmp_path))) == ["a.png", "b.JPG", "c.webp", "d.bmp"]
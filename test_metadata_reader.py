@@ -0,0 +1,129 @@
+import io
+import json
+import zlib
+import struct
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+import metadata_reader
+from metadata_reader import MetadataError, read_metadata, read_metadata_file, read_image_size
+
+
+def save_png(path, texts=(), ztexts=(), itexts=(), size=(64, 48), exif=None):
+    meta = PngImagePlugin.PngInfo()
+    for key, value in texts:
+        meta.add_text(key, value)
+    for key, value in ztexts:
+        meta.add_text(key, value, zip=True)
+    for key, value in itexts:
+        meta.add_itxt(key, value, zip=True)
+    kwargs = {"pnginfo": meta}
+    if exif is not None:
+        kwargs["exif"] = exif
+    Image.new("RGB", size, "red").save(path, "PNG", **kwargs)
+
+
+def make_exif(description=None, user_comment=None):
+    exif = Image.Exif()
+    if description is not None:
+        exif[270] = description
+    if user_comment is not None:
+        exif.get_ifd(metadata_reader.EXIF_IFD_POINTER)[0x9286] = user_comment
+    return exif
+
+
+def test_png_text_chunks_match_pil(tmp_path):
+    path = tmp_path / "a.png"
+    prompt = json.dumps({"1": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat"}}})
+    save_png(
+        path,
+        texts=[("prompt", prompt)],
+        ztexts=[("workflow", "{\"nodes\": []}" * 50)],
+        itexts=[("parameters", "ein Bild, größer\nSteps: 20")],
+    )
+
+    info, ifd0, exif_ifd = read_metadata(path)
+
+    with Image.open(path) as img:
+        assert info == img.text
+    assert info["prompt"] == prompt
+    assert info["parameters"] == "ein Bild, größer\nSteps: 20"
+    assert (ifd0, exif_ifd) == ({}, {})
+
+
+def test_png_exif_chunk(tmp_path):
+    path = tmp_path / "a.png"
+    comment = b"UNICODE\0" + "a dog".encode("utf-16be")
+    save_png(path, texts=[("prompt", "{}")], exif=make_exif("Made in tests", comment))
+
+    info, ifd0, exif_ifd = read_metadata(path)
+
+    assert info == {"prompt": "{}"}
+    assert ifd0[270] == "Made in tests"
+    assert exif_ifd[0x9286] == comment
+
+
+def test_png_stops_at_image_data(tmp_path):
+    path = tmp_path / "a.png"
+    save_png(path, texts=[("prompt", "before")])
+    data = path.read_bytes()
+    # A text chunk after IDAT is not read (PIL defers those as well)
+    iend = data.rindex(b"IEND") - 4
+    chunk = b"tEXt" + b"late\0after"
+    late = struct.pack(">I", len(chunk) - 4) + chunk + struct.pack(">I", zlib.crc32(chunk))
+    path.write_bytes(data[:iend] + late + data[iend:])
+
+    info, _, _ = read_metadata(path)
+
+    assert info == {"prompt": "before"}
+
+
+def test_png_truncated_chunk_raises():
+    chunk = b"tEXt" + b"prompt\0" + b"x" * 10
+    data = metadata_reader.PNG_SIGNATURE + struct.pack(">I", 100) + chunk
+
+    with pytest.raises(MetadataError):
+        read_metadata_file(io.BytesIO(data))
+
+
+def test_webp_exif_matches_pil(tmp_path):
+    path = tmp_path / "a.webp"
+    comment = b"ASCII\0\0\0Steps: 20, Sampler: Euler"
+    Image.new("RGB", (40, 30), "blue").save(path, "WEBP", exif=make_exif("desc", comment))
+
+    info, ifd0, exif_ifd = read_metadata(path)
+
+    assert info == {}
+    with Image.open(path) as img:
+        exif = img.getexif()
+        assert ifd0[270] == exif[270]
+        assert exif_ifd[0x9286] == exif.get_ifd(metadata_reader.EXIF_IFD_POINTER)[0x9286]
+
+
+def test_webp_without_exif(tmp_path):
+    path = tmp_path / "a.webp"
+    Image.new("RGB", (40, 30), "blue").save(path, "WEBP")
+
+    assert read_metadata(path) == ({}, {}, {})
+
+
+def test_other_formats_return_none(tmp_path):
+    path = tmp_path / "a.jpg"
+    Image.new("RGB", (8, 8)).save(path, "JPEG")
+
+    assert read_metadata(path) is None
+    assert read_image_size(path) is None
+
+
+@pytest.mark.parametrize("fmt, kwargs", [
+    ("PNG", {}),
+    ("WEBP", {"lossless": True}),
+    ("WEBP", {"quality": 80}),
+    ("WEBP", {"exif": make_exif("extended header")}),
+])
+def test_image_size_from_header(tmp_path, fmt, kwargs):
+    path = tmp_path / f"a.{fmt.lower()}"
+    Image.new("RGB", (123, 45), "green").save(path, fmt, **kwargs)
+
+    assert read_image_size(path) == (123, 45)
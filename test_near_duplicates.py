@@ -0,0 +1,131 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import near_duplicates
+from near_duplicates import HashStore, cluster, collapse, dhash
+
+Stat = namedtuple("Stat", ("st_size", "st_mtime_ns"))
+
+
+def brute_force(hashes, max_distance):
+    # Label of each hash: smallest index of its cluster, from every pair
+    values = [int(h) for h in hashes]
+    labels = list(range(len(values)))
+    changed = True
+    while changed:
+        changed = False
+        for a in range(len(values)):
+            for b in range(a + 1, len(values)):
+                if bin(values[a] ^ values[b]).count("1") <= max_distance and labels[a] != labels[b]:
+                    low = min(labels[a], labels[b])
+                    labels[a] = labels[b] = low
+                    changed = True
+    return np.array(labels)
+
+
+def near_copies(rng, bases, copies, flips):
+    hashes = [bases]
+    for _ in range(copies):
+        noise = np.zeros(len(bases), dtype=np.uint64)
+        for _ in range(flips):
+            noise |= np.uint64(1) << rng.integers(0, 64, len(bases)).astype(np.uint64)
+        hashes.append(bases ^ noise)
+    hashes = np.concatenate(hashes)
+    return hashes[rng.permutation(len(hashes))]
+
+
+@pytest.mark.parametrize("flips", [1, 3, 6, 10])
+def test_cluster_matches_brute_force(flips):
+    rng = np.random.default_rng(flips)
+    bases = rng.integers(0, 2**64 - 1, 40, dtype=np.uint64, endpoint=True)
+    hashes = near_copies(rng, bases, 3, flips)
+    for distance in range(near_duplicates.MAX_DISTANCE + 1):
+        assert (cluster(hashes, distance) == brute_force(hashes, distance)).all(), distance
+
+
+def test_cluster_chains_are_transitive():
+    # Each step flips 4 new bits: neighbours are 4 apart, the ends 16
+    value, chain = 0, []
+    for step in range(5):
+        chain.append(value)
+        value ^= 0xF << (4 * step)
+    hashes = np.array(chain[::-1], dtype=np.uint64)
+
+    assert cluster(hashes, 4).tolist() == [0] * 5
+    assert cluster(hashes, 3).tolist() == list(range(5))
+
+
+def test_cluster_identical_hashes_and_small_inputs():
+    assert cluster([], 6).tolist() == []
+    assert cluster([123], 6).tolist() == [0]
+    hashes = [5, 2**63, 5, 2**63 + 1, 2**64 - 1]
+    assert cluster(hashes, 0).tolist() == [0, 1, 0, 3, 4]
+    assert cluster(hashes, 1).tolist() == [0, 1, 0, 1, 4]
+
+
+def test_cluster_in_chunks(monkeypatch):
+    # Crowded bands expand their candidate pairs a chunk at a time
+    monkeypatch.setattr(near_duplicates, "_PAIR_CHUNK", 7)
+    rng = np.random.default_rng(1)
+    bases = rng.integers(0, 2**16, 30, dtype=np.uint64)  # Three bands all zero
+    hashes = near_copies(rng, bases, 2, 3)
+    for distance in (2, 6, 11):
+        assert (cluster(hashes, distance) == brute_force(hashes, distance)).all(), distance
+
+
+@pytest.mark.parametrize("distance", [-1, near_duplicates.MAX_DISTANCE + 1])
+def test_cluster_rejects_distance(distance):
+    with pytest.raises(ValueError):
+        cluster([1, 2], distance)
+
+
+def test_dhash_near_copies():
+    img = Image.new("RGB", (256, 256), "white")
+    draw = ImageDraw.Draw(img)
+    for x in range(0, 256, 32):
+        draw.rectangle((x, x // 2, x + 20, x // 2 + 90), fill=(x, 255 - x, 128))
+    resized = img.resize((200, 200))
+    other = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+
+    assert bin(dhash(img) ^ dhash(resized)).count("1") <= 4
+    assert bin(dhash(img) ^ dhash(other)).count("1") > near_duplicates.MAX_DISTANCE
+
+
+def test_hash_store_keys_on_size_and_mtime(tmp_path):
+    store = HashStore(str(tmp_path / "hashes.sqlite3"))
+    path = str(tmp_path / "a.png")
+    store.put(path, Stat(10, 1000), 2**64 - 1)
+
+    assert store.has(path, Stat(10, 1000))
+    assert not store.has(path, Stat(10, 2000))
+    assert not store.has(path, Stat(11, 1000))
+    assert store.under(str(tmp_path)) == {os.path.normcase(path): (10, 1000, 2**64 - 1)}
+    assert store.under(str(tmp_path / "a")) == {}
+
+
+def test_collapse(tmp_path):
+    store = HashStore(str(tmp_path / "hashes.sqlite3"))
+    folder = tmp_path / "images"
+    folder.mkdir()
+    entries = []
+    for name, value in [("a.png", 0b1111), ("b.png", 0b1110), ("c.png", 2**60), ("d.png", 0b1100), ("e.png", 0)]:
+        path = folder / name
+        path.write_bytes(b"x" * len(entries))
+        st = os.stat(path)
+        entries.append({"filename": name, "mtime": st.st_mtime, "size": st.st_size, "rating": 0})
+        if name != "e.png":
+            store.put(str(path), st, value)
+    # d.png changed since it was hashed
+    os.utime(folder / "d.png", ns=(0, 10**9))
+    entries[3]["mtime"] = 1.0
+
+    collapsed, hashed = collapse(entries, [str(folder)], store, 2)
+
+    assert hashed == 3
+    assert [e["filename"] for e in collapsed] == ["a.png", "c.png", "d.png", "e.png"]
+    assert collapsed[0]["duplicates"] == 1
+    assert all("duplicates" not in e for e in collapsed[1:])
@@ -1,4 +1,5 @@
 import os
+import json
 from PIL import Image, PngImagePlugin
 from gallery_node import GravityGalleryNode
 import shutil
@@ -56,5 +57,21 @@ def test_gallery_node():
     # Cleanup
     shutil.rmtree(test_dir)
 
+def test_negative_prompts_stay_in_prompt_string(tmp_path):
+    prompt_data = {
+        "1": {"class_type": "CLIPTextEncode", "inputs": {"text": "a castle"}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry"}},
+        "3": {"class_type": "KSampler", "inputs": {"positive": ["1", 0], "negative": ["2", 0], "steps": 20}},
+    }
+    meta = PngImagePlugin.PngInfo()
+    meta.add_text("prompt", json.dumps(prompt_data))
+    Image.new('RGB', (8, 8)).save(tmp_path / "neg.png", "PNG", pnginfo=meta)
+
+    result = GravityGalleryNode().process(str(tmp_path), ["neg.png"])
+
+    assert result[0] == "a castle\n---\nblurry"
+    assert result[2] == "blurry"
+    assert result[3] == 20
+
 if __name__ == "__main__":
     test_gallery_node()
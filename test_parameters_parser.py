@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from parameters_parser import decode_user_comment, parse_civitai_json, parse_parameters, parse_user_comment
+
+A1111 = (
+    "masterpiece, a cat on a sofa, <lora:fluffy:0.8>\n"
+    "Negative prompt: blurry, lowres\n"
+    "second negative line\n"
+    'Steps: 28, Sampler: DPM++ 2M Karras, CFG scale: 6.5, Seed: 1234567890, Size: 832x1216, '
+    'Model hash: abc123, Model: dreamshaper_8, Lora hashes: "fluffy: 0a1b2c, other: ffee00", '
+    'TI hashes: "easynegative: 123abc", Version: v1.9.4'
+)
+
+
+def test_parse_parameters_fields():
+    record = parse_parameters(A1111)
+
+    assert record["positive"] == "masterpiece, a cat on a sofa, <lora:fluffy:0.8>"
+    assert record["negative"] == "blurry, lowres\nsecond negative line"
+    assert record["steps"] == 28
+    assert record["sampler"] == "DPM++ 2M Karras"
+    assert record["cfg"] == 6.5
+    assert record["seed"] == 1234567890
+    assert (record["width"], record["height"]) == (832, 1216)
+    assert record["settings"]["Version"] == "v1.9.4"
+    assert record["resources"] == [
+        {"type": "checkpoint", "name": "dreamshaper_8", "hash": "abc123"},
+        {"type": "lora", "name": "fluffy", "hash": "0a1b2c"},
+        {"type": "lora", "name": "other", "hash": "ffee00"},
+        {"type": "embed", "name": "easynegative", "hash": "123abc"},
+    ]
+
+
+def test_parse_parameters_prompt_only():
+    record = parse_parameters("  just a prompt, nothing else \n")
+
+    assert record["positive"] == "just a prompt, nothing else"
+    assert record["negative"] == ""
+    assert record["steps"] == 0
+    assert record["resources"] == []
+
+
+def test_parse_parameters_without_negative():
+    record = parse_parameters("a dog\nSteps: 20, Sampler: Euler a, Seed: 7")
+
+    assert record["positive"] == "a dog"
+    assert record["negative"] == ""
+    assert (record["steps"], record["sampler"], record["seed"]) == (20, "Euler a", 7)
+
+
+def test_parse_parameters_negative_ends_at_other_settings_key():
+    # No "Steps:" line: the negative prompt stops at the next settings key on a new line
+    record = parse_parameters("a dog\nNegative prompt: ugly\nSampler: Euler, Seed: 3")
+
+    assert record["negative"] == "ugly"
+    assert (record["sampler"], record["seed"]) == ("Euler", 3)
+
+
+def test_parse_parameters_civitai_resources_json():
+    resources = [{"type": "checkpoint", "modelName": "Pony", "modelVersionId": 1}]
+    text = f"a fox\nSteps: 30, Civitai resources: {json.dumps(resources)}, Civitai metadata: {{}}"
+
+    record = parse_parameters(text)
+
+    assert record["positive"] == "a fox"
+    assert record["resources"] == resources
+
+
+def test_parse_parameters_bad_numbers_default_to_zero():
+    record = parse_parameters("x\nSteps: many, CFG scale: high, Seed: -, Size: big")
+
+    assert (record["steps"], record["cfg"], record["seed"]) == (0, 0.0, 0)
+    assert (record["width"], record["height"]) == (0, 0)
+
+
+def test_parse_civitai_json():
+    extra = {"prompt": "a bird", "negativePrompt": "bad", "steps": 25, "cfgScale": 7, "seed": 99,
+             "sampler": "Euler", "width": 512, "height": 768}
+    text = json.dumps({"extraMetadata": json.dumps(extra), "resources": [{"type": "lora"}, "junk"]})
+
+    record = parse_civitai_json(text)
+
+    assert record["positive"] == "a bird"
+    assert record["negative"] == "bad"
+    assert (record["steps"], record["cfg"], record["seed"]) == (25, 7.0, 99)
+    assert (record["width"], record["height"]) == (512, 768)
+    assert record["resources"] == [{"type": "lora"}]
+
+
+@pytest.mark.parametrize("text", ["not json", "{broken", json.dumps({"extraMetadata": "{}"}), "[]"])
+def test_parse_civitai_json_rejects(text):
+    assert parse_civitai_json(text) is None
+
+
+@pytest.mark.parametrize("value", [
+    b"UNICODE\0" + "a cat, Steps: 20".encode("utf-16be"),
+    b"UNICODE\0" + "a cat, Steps: 20".encode("utf-16le"),
+    b"UNICODE\0" + b"\xff\xfe" + "a cat, Steps: 20".encode("utf-16le"),
+    b"ASCII\0\0\0" + b"a cat, Steps: 20",
+    b"\0" * 8 + b"a cat, Steps: 20",
+    "a cat, Steps: 20".encode("utf-16le"),
+    b"a cat, Steps: 20",
+    "UNICODE a cat, Steps: 20",
+    "a cat, Steps: 20",
+])
+def test_decode_user_comment(value):
+    assert decode_user_comment(value) == "a cat, Steps: 20"
+
+
+def test_decode_user_comment_non_ascii_utf16():
+    text = "größer, 猫"
+    assert decode_user_comment(b"UNICODE\0" + text.encode("utf-16be")) == text
+    assert decode_user_comment(b"UNICODE\0" + text.encode("utf-16le")) == text
+
+
+def test_parse_user_comment():
+    record = parse_user_comment(b"UNICODE\0" + A1111.encode("utf-16be"))
+
+    assert record == parse_parameters(A1111)
@@ -0,0 +1,73 @@
+import threading
+
+from result_cache import LRUCache
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    assert cache.get("a") == "xxxx"  # b is now the oldest
+    cache.put("c", "xxxx")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "xxxx" and cache.get("c") == "xxxx"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_evicts_by_entry_count():
+    cache = LRUCache(max_entries=2, max_bytes=1000)
+    for key in "abc":
+        cache.put(key, key)
+
+    assert len(cache) == 2
+    assert cache.get("a") is None
+
+
+def test_replacing_a_key_updates_its_size():
+    cache = LRUCache(max_entries=10, max_bytes=10)
+    cache.put("a", "x" * 8)
+    cache.put("a", "x" * 2)
+    cache.put("b", "x" * 8)
+
+    assert cache.get("a") == "xx"
+    assert cache.stats()["bytes"] == 10
+
+
+def test_values_larger_than_the_bound_are_not_cached():
+    cache = LRUCache(max_entries=10, max_bytes=10)
+    cache.put("small", "x")
+    cache.put("huge", "x" * 11)
+
+    assert cache.get("huge") is None
+    assert cache.get("small") == "x"
+    assert cache.stats()["bytes"] == 1
+
+
+def test_custom_sizeof_and_stats():
+    cache = LRUCache(max_entries=10, max_bytes=100, sizeof=lambda value: sum(len(s) for s in value))
+    cache.put("k", ("a" * 60, "b" * 30))
+    cache.put("j", ("c" * 20,))
+
+    assert cache.get("k") is None  # Pushed out: 90 + 20 > 100
+    assert cache.get("j") == ("c" * 20,)
+    assert cache.get("missing", "default") == "default"
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (1, 20, 1, 2)
+
+
+def test_byte_bound_holds_under_concurrent_puts():
+    cache = LRUCache(max_entries=1000, max_bytes=500)
+
+    def fill(worker):
+        for i in range(500):
+            cache.put((worker, i), "x" * (i % 17 + 1))
+
+    threads = [threading.Thread(target=fill, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert cache.stats()["bytes"] <= 500
+    assert cache.stats()["bytes"] == sum(len(cache.get(key)) for key in list(cache._data))
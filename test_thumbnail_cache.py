@@ -0,0 +1,59 @@
+import os
+import threading
+
+from thumbnail_cache import ThumbnailCache
+
+
+def test_lru_order_and_byte_budget(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=10)
+    cache.put("aa1", b"xxxx")
+    cache.put("bb2", b"xxxx")
+    assert cache.get("aa1") == b"xxxx"  # bb2 is now the oldest
+    cache.put("cc3", b"xxxx")
+
+    assert cache.get("bb2") is None
+    assert not os.path.exists(cache._path_for("bb2"))
+    assert cache.stats()["bytes"] == 8 and cache.evictions == 1
+
+    # The order survives a restart through the files' mtimes
+    again = ThumbnailCache(str(tmp_path), max_bytes=10)
+    assert again.contains("cc3")
+    assert list(again._entries) == ["aa1", "cc3"]
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=100)
+    cache.put("aa1", b"xxxx")
+    os.remove(cache._path_for("aa1"))
+
+    assert cache.get("aa1") is None
+    assert not cache.contains("aa1")
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (0, 0, 0, 1)
+
+
+def test_file_reads_do_not_hold_the_lock(tmp_path, monkeypatch):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=100)
+    cache.put("aa1", b"slow")
+    cache.put("bb2", b"fast")
+    reading, release = threading.Event(), threading.Event()
+    real_open = open
+
+    def gated_open(path, *args, **kwargs):
+        if path.endswith("aa1"):
+            reading.set()
+            release.wait(5)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", gated_open)
+    results = {}
+    slow = threading.Thread(target=lambda: results.update(slow=cache.get("aa1")))
+    slow.start()
+    assert reading.wait(5)
+
+    # While the first read is stuck on disk, other lookups still go through
+    assert cache.get("bb2") == b"fast"
+    assert cache.get("missing") is None
+    release.set()
+    slow.join(5)
+    assert results == {"slow": b"slow"}
@@ -0,0 +1,77 @@
+import os
+import time
+import threading
+import types
+
+import watcher
+from watcher import DirectoryWatcher
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def bump(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_poll_reports_changes(tmp_path):
+    events = []
+    w = DirectoryWatcher(lambda *args: events.append(args), full_scan_every=2)
+    (tmp_path / "a.png").write_bytes(b"a")
+    (tmp_path / "b.png").write_bytes(b"b")
+
+    w.poll(str(tmp_path))  # Baseline
+    assert events == []
+
+    (tmp_path / "c.png").write_bytes(b"c")
+    (tmp_path / "b.png").unlink()
+    bump(tmp_path)
+    w.poll(str(tmp_path))
+    directory, added, removed, modified = events.pop()
+    assert (directory, [e["filename"] for e in added], removed, modified) == (str(tmp_path), ["c.png"], ["b.png"], [])
+
+    # Rewritten in place: the folder mtime stays, the periodic full scan sees it
+    (tmp_path / "a.png").write_bytes(b"aaaa")
+    w.poll(str(tmp_path))
+    assert events == []
+    w.poll(str(tmp_path))
+    _, added, removed, modified = events.pop()
+    assert (added, removed, [e["filename"] for e in modified]) == ([], [], ["a.png"])
+    w.poll(str(tmp_path))
+    assert events == []
+
+
+def test_lease_expires_and_renews(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watcher, "time", types.SimpleNamespace(monotonic=clock.monotonic, sleep=time.sleep))
+    changed = threading.Event()
+    w = DirectoryWatcher(lambda *args: changed.set(), interval=0.001, lease_seconds=60)
+    folder = str(tmp_path)
+
+    w.watch(folder)
+    thread = w._thread
+    # The watcher is running: it sees a new file
+    while folder not in w._state:
+        time.sleep(0.001)
+    (tmp_path / "new.png").write_bytes(b"x")
+    bump(tmp_path)
+    assert changed.wait(5)
+
+    # Renewing pushes the expiry out
+    clock.now += 50
+    w.watch(folder)
+    clock.now += 50
+    time.sleep(0.01)
+    assert w.watched() == [folder] and thread.is_alive()
+
+    # Past the lease: the folder is dropped and the idle thread stops
+    clock.now += 61
+    thread.join(5)
+    assert not thread.is_alive()
+    assert w.watched() == [] and w._state == {}
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+import pytest
+
+from workers import PoolBusy, WorkerPool
+
+
+async def until(condition):
+    for _ in range(5000):
+        if condition():
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("timed out")
+
+
+class Gate:
+    """A blocking job that records that it started and waits to be released."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, value):
+        self.started.set()
+        self.release.wait(5)
+        return value
+
+
+def test_requests_for_one_key_share_the_job():
+    async def main():
+        pool = WorkerPool(max_workers=2, max_pending=4)
+        gate, done = Gate(), []
+        first = asyncio.ensure_future(pool.run("key", gate, "thumb", on_done=done.append))
+        second = asyncio.ensure_future(pool.run("key", gate, "other"))
+        await until(gate.started.is_set)
+        gate.release.set()
+
+        assert await asyncio.gather(first, second) == ["thumb", "thumb"]
+        assert done == ["thumb"]
+        assert (pool.submitted, pool.coalesced, pool.stats()["pending"]) == (1, 1, 0)
+
+    asyncio.run(main())
+
+
+def test_job_of_a_disconnected_client_is_dropped_before_it_runs():
+    async def main():
+        pool = WorkerPool(max_workers=1, max_pending=4)
+        gate, ran = Gate(), []
+        busy = asyncio.ensure_future(pool.run("busy", gate, "a"))
+        await until(gate.started.is_set)
+
+        # Queued behind the busy job; its client goes away meanwhile
+        alive = [True]
+        queued = asyncio.ensure_future(pool.run("queued", ran.append, "b", is_alive=lambda: alive[0]))
+        await asyncio.sleep(0)
+        alive[0] = False
+        gate.release.set()
+
+        assert await busy == "a"
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert ran == []
+        assert pool.cancelled == 1 and pool.stats()["pending"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_cancels_a_queued_job():
+    async def main():
+        pool = WorkerPool(max_workers=1, max_pending=4)
+        gate, ran = Gate(), []
+        busy = asyncio.ensure_future(pool.run("busy", gate, "a"))
+        await until(gate.started.is_set)
+
+        queued = asyncio.ensure_future(pool.run("queued", ran.append, "b"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.sleep(0)
+        gate.release.set()
+
+        assert await busy == "a"
+        assert ran == []
+        assert pool.cancelled == 1
+        await until(lambda: pool.stats()["pending"] == 0)
+
+    asyncio.run(main())
+
+
+def test_full_queue_rejects():
+    async def main():
+        pool = WorkerPool(max_workers=1, max_pending=1)
+        gate = Gate()
+        busy = asyncio.ensure_future(pool.run("busy", gate, "a"))
+        await until(gate.started.is_set)
+
+        with pytest.raises(PoolBusy):
+            await pool.run("more", gate, "b")
+        gate.release.set()
+        assert await busy == "a"
+        assert pool.rejected == 1
+
+    asyncio.run(main())
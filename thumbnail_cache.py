@@ -0,0 +1,147 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ThumbnailCache:
+    """
+    Persistent on-disk cache of encoded thumbnails with an LRU byte budget.
+
+    Entries are keyed by the source file identity (absolute path, mtime, size)
+    plus the requested thumbnail size, so an edited or replaced image never
+    serves a stale thumbnail. Recency is stored in the cache files' mtime,
+    which lets the LRU order survive ComfyUI restarts.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> byte size, least recently used first
+        self._total_bytes = 0
+        self._loaded = False
+
+    @staticmethod
+    def make_key(file_path, stat, size, fmt="jpeg"):
+        raw = f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}|{fmt}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path_for(self, key):
+        # Two-level fan-out keeps individual directories small
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load(self):
+        # Rebuild the LRU order from what is already on disk (called with lock held)
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        found = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                found.append((st.st_mtime_ns, entry.name, st.st_size))
+
+        found.sort()
+        for _, key, nbytes in found:
+            self._entries[key] = nbytes
+            self._total_bytes += nbytes
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, nbytes = self._entries.popitem(last=False)
+            self._total_bytes -= nbytes
+            self.evictions += 1
+            try:
+                os.remove(self._path_for(key))
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        # File I/O outside the lock, so one slow read doesn't stall every lookup
+        path = self._path_for(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            with self._lock:
+                if isinstance(e, FileNotFoundError) and key in self._entries:
+                    # Removed behind our back
+                    self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # Persist recency for the next restart
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def contains(self, key):
+        """True if key is cached. Unlike get, neither reads nor touches the entry."""
+        with self._lock:
+            self._load()
+            return key in self._entries
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Gravity Gallery: could not write thumbnail cache entry: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._load()
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,211 @@
+import os
+import time
+from io import BytesIO
+from PIL import Image, ExifTags, features
+
+try:
+    from . import settings
+    from . import archives
+    from . import near_duplicates
+    from .thumbnail_cache import ThumbnailCache
+    from .workers import WorkerPool
+except ImportError:
+    import settings
+    import archives
+    import near_duplicates
+    from thumbnail_cache import ThumbnailCache
+    from workers import WorkerPool
+
+thumbnail_cache = ThumbnailCache(settings.THUMBNAIL_CACHE_DIR, settings.THUMBNAIL_CACHE_BYTES)
+thumbnail_pool = WorkerPool(
+    settings.THUMBNAIL_WORKERS,
+    settings.THUMBNAIL_MAX_PENDING,
+    use_processes=settings.THUMBNAIL_USE_PROCESSES,
+)
+
+# Sizes thumbnails are rendered at. Requests snap up to the next bucket so
+# thumbnail_size slider steps reuse cached thumbnails (the gallery JS snaps
+# its requests to the same list).
+SIZE_BUCKETS = (128, 192, 256, 384, 512, 768)
+
+# name -> (Pillow format, content type, save options), in order of preference
+OUTPUT_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 75, "method": 2}),
+    "avif": ("AVIF", "image/avif", {"quality": 55, "speed": 8}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 70}),
+}
+
+
+def _encoder_available(name):
+    if name == "jpeg":
+        return True
+    # Older Pillow versions don't know the feature at all
+    return name in features.modules and features.check_module(name)
+
+
+AVAILABLE_FORMATS = tuple(name for name in OUTPUT_FORMATS if _encoder_available(name))
+
+
+def bucket_size(size):
+    """Smallest size bucket that covers size (the largest one beyond that)."""
+    for bucket in SIZE_BUCKETS:
+        if size <= bucket:
+            return bucket
+    return SIZE_BUCKETS[-1]
+
+
+def negotiate_format(accept):
+    """Output format for an Accept header: WebP, then AVIF, then JPEG."""
+    accepted = set()
+    for part in (accept or "").lower().split(","):
+        media, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        if q > 0:
+            accepted.add(media.strip())
+
+    for name in AVAILABLE_FORMATS:
+        if OUTPUT_FORMATS[name][1] in accepted:
+            return name
+    return "jpeg"
+
+
+def content_type(fmt):
+    return OUTPUT_FORMATS[fmt][1]
+
+
+# EXIF IFD1 tags pointing at an embedded JPEG thumbnail
+_EXIF_THUMB_OFFSET = 0x0201
+_EXIF_THUMB_LENGTH = 0x0202
+
+
+def _embedded_exif_thumbnail(img, size):
+    """
+    Return the JPEG thumbnail embedded in the EXIF block when it is at least
+    as large as the requested size and has the same aspect ratio as the full
+    image (camera thumbnails are often letterboxed). Otherwise None.
+    """
+    raw = img.info.get("exif")
+    if not raw:
+        return None
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(_EXIF_THUMB_OFFSET)
+        length = ifd1.get(_EXIF_THUMB_LENGTH)
+        if not offset or not length:
+            return None
+
+        # Offsets are relative to the TIFF header that follows the "Exif\0\0" marker
+        base = 6 if raw.startswith(b"Exif\x00\x00") else 0
+        data = raw[base + offset:base + offset + length]
+        thumb = Image.open(BytesIO(data))
+        tw, th = thumb.size
+        if max(tw, th) < min(size, max(img.size)):
+            return None
+        if abs(tw / th - img.width / img.height) > 0.02:
+            return None
+        thumb.load()
+        return thumb
+    except Exception:
+        return None
+
+
+def _open_reduced(img, size):
+    """
+    Return an image decoded at the lowest resolution that still covers size.
+    JPEG can reuse an embedded EXIF thumbnail or have the decoder scale down
+    in the DCT domain (1/2, 1/4 or 1/8), which skips most of the IDCT work.
+    """
+    if img.format == "JPEG":
+        thumb = _embedded_exif_thumbnail(img, size)
+        if thumb is not None:
+            return thumb
+        img.draft("RGB", (size, size))
+    return img
+
+
+def _has_alpha(img):
+    return img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in img.info
+
+
+def render_thumbnail(file_path, size, fmt="jpeg"):
+    """Decode, resize and encode a thumbnail in one of OUTPUT_FORMATS. Returns the encoded bytes."""
+    return render_thumbnail_timed(file_path, size, fmt)[0]
+
+
+def render_thumbnail_timed(file_path, size, fmt="jpeg"):
+    """
+    render_thumbnail, also returning [(stage, seconds)] for the decode, resize,
+    encode and hash steps, and the image's dHash (near_duplicates.dhash),
+    which costs little on the already resized image. Returns (bytes, stages,
+    dhash): plain data, so it comes back from worker processes too.
+    """
+    pil_format, _, options = OUTPUT_FORMATS[fmt]
+    start = time.perf_counter()
+    with archives.open_file(file_path) as f, Image.open(f) as img:
+        reduced = _open_reduced(img, size)
+        reduced.load()
+        decoded = time.perf_counter()
+        if reduced.format == "JPEG":
+            # Already near the target size, one resample pass is enough
+            reduced.thumbnail((size, size), reducing_gap=None)
+        else:
+            # Full-size decode: let Pillow box-reduce before the final resample,
+            # which measured faster than a single Lanczos pass on large PNGs
+            reduced.thumbnail((size, size))
+        img = reduced
+
+        if pil_format == "JPEG":
+            # Convert to RGB if necessary (e.g. for RGBA PNGs saving as JPEG)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+        else:
+            # WebP and AVIF keep transparency
+            mode = "RGBA" if _has_alpha(img) else "RGB"
+            if img.mode != mode:
+                img = img.convert(mode)
+        resized = time.perf_counter()
+
+        buffer = BytesIO()
+        img.save(buffer, format=pil_format, **options)
+        encoded = time.perf_counter()
+        dhash = near_duplicates.dhash(img)
+        stages = [
+            ("thumbnail.decode", decoded - start),
+            ("thumbnail.resize", resized - decoded),
+            ("thumbnail.encode", encoded - resized),
+            ("thumbnail.hash", time.perf_counter() - encoded),
+        ]
+        return buffer.getvalue(), stages, dhash
+
+
+def lookup_thumbnail(file_path, size, stat=None, fmt="jpeg"):
+    """
+    Return (cache_key, body) for a thumbnail. body is None on a cache miss,
+    in which case the caller renders it and stores it under cache_key.
+    stat may pass the source file's os.stat result if the caller has it.
+    """
+    if stat is None:
+        stat = archives.stat(file_path)
+    key = ThumbnailCache.make_key(file_path, stat, size, fmt)
+    return key, thumbnail_cache.get(key)
+
+
+def get_thumbnail(file_path, size, fmt="jpeg"):
+    """
+    Return (body, content_type, cache_hit) for a thumbnail, serving it from
+    the on-disk cache when the source file is unchanged.
+    """
+    key, body = lookup_thumbnail(file_path, size, fmt=fmt)
+    if body is not None:
+        return body, content_type(fmt), True
+
+    body = render_thumbnail(file_path, size, fmt)
+    thumbnail_cache.put(key, body)
+    return body, content_type(fmt), False
@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import bisect
+import functools
+import threading
+from collections import Counter
+
+# Lightweight instrumentation: latency histograms per route and per pipeline
+# stage, plain counters, per-call stage timings for debug output, and an
+# on-demand sampling profiler.
+
+# Histogram bucket upper bounds in seconds: 8 per decade from 10 us to 100 s,
+# so percentiles are accurate to within one bucket (about 33%)
+BUCKET_BOUNDS = tuple(10 ** (e / 8) for e in range(-40, 17))
+
+
+class LatencyHistogram:
+    """Counts of observations per log-spaced bucket; constant memory and O(log n) recording."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-quantile (never above the max seen)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                bound = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.percentile(0.50),
+            "p95_ms": 1000 * self.percentile(0.95),
+            "p99_ms": 1000 * self.percentile(0.99),
+            "max_ms": 1000 * self.max,
+        }
+
+
+class Metrics:
+    """
+    Process-wide latency histograms and counters. Names starting with
+    "route." are request handlers, everything else is a pipeline stage.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = Counter()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def timer(self, name):
+        """Context manager recording the time spent in its block as name."""
+        return _Timer(self, name)
+
+    def timed_route(self, name):
+        """Decorator for aiohttp handlers: latency as "route.<name>", plus counters per status."""
+        def decorate(handler):
+            @functools.wraps(handler)
+            async def wrapper(request):
+                start = time.perf_counter()
+                status = 500
+                try:
+                    response = await handler(request)
+                    status = response.status
+                    return response
+                except Exception as e:
+                    status = getattr(e, "status", 500)  # aiohttp HTTPExceptions carry one
+                    raise
+                finally:
+                    self.observe(f"route.{name}", time.perf_counter() - start)
+                    self.count(f"route.{name}.status.{status}")
+            return wrapper
+        return decorate
+
+    def snapshot(self):
+        with self._lock:
+            summaries = {name: h.summary() for name, h in sorted(self._histograms.items())}
+            counters = dict(sorted(self._counters.items()))
+        return {
+            "uptime_s": time.time() - self.started,
+            "routes": {name[6:]: s for name, s in summaries.items() if name.startswith("route.")},
+            "stages": {name: s for name, s in summaries.items() if not name.startswith("route.")},
+            "counters": counters,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+metrics = Metrics()
+
+
+class CallTimings:
+    """
+    Stage timings of one call (e.g. one extraction). mark(stage) records the
+    time since the previous mark, so straight-line code is instrumented by a
+    mark after each step. Stages also feed the shared metrics.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = metrics if registry is None else registry
+        self.stages = []
+        self.started = self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.stages.append((stage, elapsed))
+        self.registry.observe(stage, elapsed)
+        return elapsed
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        parts = [f"{stage} {1000 * seconds:.2f} ms" for stage, seconds in self.stages]
+        parts.append(f"total {1000 * self.elapsed:.2f} ms")
+        return "Timings: " + ", ".join(parts)
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread at hz and counts collapsed
+    stacks ("thread;outer;...;inner" -> samples): the folded format flame
+    graph tools read. Only one profile runs at a time.
+    """
+
+    MAX_DEPTH = 64
+
+    def __init__(self):
+        self._running = threading.Lock()
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _stacks(self, own_ident):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.MAX_DEPTH:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            yield ";".join(reversed(stack))
+
+    def profile(self, seconds, hz=100):
+        """Sample for seconds (blocking). Returns a Counter, or None if a profile is already running."""
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            samples = Counter()
+            own_ident = threading.get_ident()
+            interval = 1.0 / hz
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                samples.update(self._stacks(own_ident))
+                time.sleep(interval)
+            return samples
+        finally:
+            self._running.release()
+
+    @staticmethod
+    def folded(samples, limit=None):
+        """Folded stack lines, most sampled first."""
+        return "\n".join(f"{stack} {n}" for stack, n in samples.most_common(limit))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,104 @@
+import os
+import time
+import threading
+
+try:
+    from . import listing
+except ImportError:
+    import listing
+
+
+class DirectoryWatcher:
+    """
+    Polls directories that have an open gallery and reports added, removed
+    and modified images.
+
+    Galleries hold a lease on a directory and renew it periodically; a
+    directory stops being watched when its lease runs out. Each poll first
+    compares the directory mtime (which changes when files are created,
+    renamed or deleted) and only re-lists it when that changed, or every
+    full_scan_every polls to catch files rewritten in place.
+
+    notify(directory, added, removed, modified) is called from the watcher
+    thread: added/modified are listing entries, removed are filenames.
+    """
+
+    def __init__(self, notify, interval=2.0, lease_seconds=60.0, full_scan_every=15):
+        self.notify = notify
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.full_scan_every = full_scan_every
+        self._lock = threading.Lock()
+        self._leases = {}  # directory -> expiry (monotonic)
+        self._state = {}  # directory -> (dir_mtime_ns, {filename: entry}, polls since full scan)
+        self._thread = None
+
+    def watch(self, directory):
+        """Start watching a directory, or renew its lease."""
+        with self._lock:
+            self._leases[directory] = time.monotonic() + self.lease_seconds
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="gravity-gallery-watcher", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, directory):
+        with self._lock:
+            self._leases.pop(directory, None)
+            self._state.pop(directory, None)
+
+    def watched(self):
+        with self._lock:
+            return list(self._leases)
+
+    def _snapshot(self, directory):
+        return {entry["filename"]: entry for entry in listing.iter_directory(directory)}
+
+    def poll(self, directory):
+        """Diff a directory against its last snapshot and notify on changes."""
+        try:
+            dir_mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return
+
+        state = self._state.get(directory)
+        if state is None:
+            # First poll only records the baseline
+            self._state[directory] = (dir_mtime_ns, self._snapshot(directory), 0)
+            return
+
+        last_mtime_ns, files, polls = state
+        if dir_mtime_ns == last_mtime_ns and polls + 1 < self.full_scan_every:
+            self._state[directory] = (last_mtime_ns, files, polls + 1)
+            return
+
+        current = self._snapshot(directory)
+        added = [entry for name, entry in current.items() if name not in files]
+        removed = [name for name in files if name not in current]
+        modified = [
+            entry for name, entry in current.items()
+            if name in files and (entry["mtime"], entry["size"]) != (files[name]["mtime"], files[name]["size"])
+        ]
+        self._state[directory] = (dir_mtime_ns, current, 0)
+
+        if added or removed or modified:
+            self.notify(directory, added, removed, modified)
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                for directory, expiry in list(self._leases.items()):
+                    if expiry < now:
+                        del self._leases[directory]
+                        self._state.pop(directory, None)
+                directories = list(self._leases)
+                if not directories:
+                    self._thread = None
+                    return
+
+            for directory in directories:
+                try:
+                    self.poll(directory)
+                except Exception as e:
+                    print(f"Gravity Gallery: watching {directory} failed: {e}")
+            time.sleep(self.interval)
@@ -65,6 +65,17 @@ style.textContent = `
         border-radius: 2px;
         pointer-events: none;
     }
+    .gravity-gallery-item-duplicates {
+        position: absolute;
+        top: 4px;
+        right: 4px;
+        background: rgba(0,0,0,0.7);
+        color: #9ecbff;
+        font-size: 10px;
+        padding: 0 4px;
+        border-radius: 2px;
+        pointer-events: none;
+    }
     .gravity-gallery-controls {
         position: sticky;
         top: 0;
@@ -105,9 +116,87 @@ style.textContent = `
     .gravity-gallery-controls .sort-direction-btn:active {
         background: #555;
     }
+    .gravity-gallery-controls .collapse-btn.active {
+        background: #2a4a6b;
+        border-color: #4a7ab0;
+    }
+    .gravity-gallery-controls .search-input {
+        flex: 1;
+        min-width: 40px;
+        background: #222;
+        color: white;
+        border: 1px solid #444;
+        font-size: 10px;
+        padding: 2px 4px;
+    }
 `;
 document.head.appendChild(style);
 
+// Sizes the server renders thumbnails at (thumbnails.SIZE_BUCKETS). Requests
+// are snapped up to one so slider changes keep hitting the same cached URLs.
+const THUMB_SIZE_BUCKETS = [128, 192, 256, 384, 512, 768];
+const thumbBucketSize = (size) =>
+    THUMB_SIZE_BUCKETS.find(bucket => size <= bucket) || THUMB_SIZE_BUCKETS[THUMB_SIZE_BUCKETS.length - 1];
+
+// Formats the batch route may answer with, best first (<img> requests send the browser's own Accept)
+const THUMB_ACCEPT = "image/webp,image/avif,image/jpeg";
+
+// Thumbnails fetched through the batch route, by thumbnail URL (the URL carries
+// the file's mtime, so entries never go stale). Shared by every gallery node so
+// re-renders and re-sorts don't fetch again; the oldest entries go first.
+const THUMB_BLOB_CACHE_MAX = 1000;
+const thumbBlobCache = new Map();
+
+const cacheThumbBlob = (url, blob) => {
+    thumbBlobCache.delete(url);
+    thumbBlobCache.set(url, blob);
+    if (thumbBlobCache.size > THUMB_BLOB_CACHE_MAX) {
+        thumbBlobCache.delete(thumbBlobCache.keys().next().value);
+    }
+};
+
+const getThumbBlob = (url) => {
+    const blob = thumbBlobCache.get(url);
+    if (blob) cacheThumbBlob(url, blob); // Mark as recently used
+    return blob;
+};
+
+const showThumbBlob = (img, blob) => {
+    const objectUrl = URL.createObjectURL(blob);
+    // A loaded image stays decoded, so the object URL is only needed until then
+    const revoke = () => URL.revokeObjectURL(objectUrl);
+    img.addEventListener("load", revoke, { once: true });
+    img.addEventListener("error", revoke, { once: true });
+    img.src = objectUrl;
+};
+
+// Batch thumbnail responses are a stream of frames: index (uint32), status
+// (uint8, 0 = ok), body length (uint32), all big-endian, then the image bytes
+const THUMB_FRAME_HEADER = 9;
+const readThumbFrames = async (response, onFrame) => {
+    const reader = response.body.getReader();
+    let buffered = new Uint8Array(0);
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        const merged = new Uint8Array(buffered.length + value.length);
+        merged.set(buffered);
+        merged.set(value, buffered.length);
+        buffered = merged;
+
+        let pos = 0;
+        while (buffered.length - pos >= THUMB_FRAME_HEADER) {
+            const header = new DataView(buffered.buffer, buffered.byteOffset + pos, THUMB_FRAME_HEADER);
+            const length = header.getUint32(5);
+            const start = pos + THUMB_FRAME_HEADER;
+            if (buffered.length - start < length) break; // Rest of the body not here yet
+            onFrame(header.getUint32(0), header.getUint8(4), buffered.slice(start, start + length));
+            pos = start + length;
+        }
+        buffered = buffered.slice(pos);
+    }
+};
+
 app.registerExtension({
     name: "Gravity.Gallery",
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
@@ -147,6 +236,18 @@ app.registerExtension({
                     return w ? w.value : null;
                 };
 
+                // Listing options (recursive scan, depth, exclude globs) as request parameters
+                const scanParams = () => {
+                    const params = {};
+                    if (getConfigValue("recursive")) {
+                        params.recursive = "1";
+                        params.depth = getConfigValue("max_depth") ?? 8;
+                    }
+                    const exclude = getConfigValue("exclude");
+                    if (exclude) params.exclude = exclude;
+                    return params;
+                };
+
                 const imageWidget = getWidget("image");
                 if (!imageWidget) {
                     console.error("Gravity Gallery: Could not find image widget");
@@ -166,20 +267,125 @@ app.registerExtension({
                 document.body.appendChild(galleryDiv);
 
                 // Track state
-                let currentFiles = []; // Array of {filename, rating, mtime}
+                let allFiles = []; // Full directory listing: Array of {filename, rating, mtime}
+                let currentFiles = []; // What the grid shows: allFiles, or search results
                 let selectedFile = imageWidget.value || "";
                 let currentSort = "mtime";
                 let sortAscending = false; // false = descending (newest/highest first)
+                let collapseDuplicates = false; // One image per cluster of near-duplicates (server side)
+                let unhashedCount = 0; // Files the server could not collapse yet (never thumbnailed)
                 let isAlive = true;
 
                 // Cleanup on removal
                 const originalOnRemoved = node.onRemoved;
                 node.onRemoved = function () {
                     isAlive = false;
+                    clearInterval(watchTimer);
+                    stopPrewarm();
+                    api.removeEventListener("gravity.gallery.changes", onDirectoryChanges);
+                    abortThumbBatches();
                     if (originalOnRemoved) originalOnRemoved.apply(this, arguments);
                     if (galleryDiv.parentNode) galleryDiv.parentNode.removeChild(galleryDiv);
                 };
 
+                // Prompt search (server-side full-text index). The input lives across
+                // re-renders so typing isn't interrupted when the grid rebuilds.
+                const SEARCH_PAGE_SIZE = 200;
+                let searchQuery = "";
+                let searchTotal = 0;
+                let searchSeq = 0;
+                let searchTimer = null;
+                let searchLoading = false;
+
+                const searchInput = document.createElement("input");
+                searchInput.type = "search";
+                searchInput.className = "search-input";
+                searchInput.placeholder = "Search prompts";
+                searchInput.addEventListener("keydown", (e) => e.stopPropagation());
+                searchInput.addEventListener("input", () => {
+                    clearTimeout(searchTimer);
+                    searchTimer = setTimeout(() => runSearch(), 250);
+                });
+
+                const toFileEntry = (f) => typeof f === "string" ? { filename: f, rating: 0, mtime: 0 } : f;
+
+                const fetchSearchPage = async (offset) => {
+                    const dir = getConfigValue("directory");
+                    const url = `/gravity/gallery/search?directory=${encodeURIComponent(dir)}&q=${encodeURIComponent(searchQuery)}&offset=${offset}&limit=${SEARCH_PAGE_SIZE}`;
+                    const response = await api.fetchApi(url);
+                    return await response.json();
+                };
+
+                const resultsToEntries = (filenames) => {
+                    const byName = new Map(allFiles.map(f => [f.filename, f]));
+                    return filenames.map(f => byName.get(f) || toFileEntry(f));
+                };
+
+                const runSearch = async () => {
+                    searchQuery = searchInput.value.trim();
+                    const seq = ++searchSeq;
+
+                    if (!searchQuery) {
+                        searchTotal = 0;
+                        currentFiles = allFiles;
+                        renderGallery();
+                        return;
+                    }
+
+                    try {
+                        const data = await fetchSearchPage(0);
+                        if (seq !== searchSeq) return; // A newer query superseded this one
+                        if (data.error) console.warn("Gravity Gallery search:", data.error);
+                        searchTotal = data.total || 0;
+                        currentFiles = resultsToEntries(data.files || []);
+                        renderGallery(); // Keep relevance order
+                    } catch (e) {
+                        console.error("Error searching gallery", e);
+                    }
+                };
+
+                const loadMoreSearchResults = async (dir) => {
+                    if (searchLoading) return;
+                    searchLoading = true;
+                    const seq = searchSeq;
+                    try {
+                        const data = await fetchSearchPage(currentFiles.length);
+                        if (seq !== searchSeq || !data.files) return;
+                        currentFiles = currentFiles.concat(resultsToEntries(data.files));
+                        appendItems(renderedCount, BATCH_SIZE, dir);
+                        recheckSentinel();
+                    } catch (e) {
+                        console.error("Error loading more search results", e);
+                    } finally {
+                        searchLoading = false;
+                    }
+                };
+
+                // Live updates: hold a lease on the directory so the server watches it and
+                // pushes add/remove/modify events, which are patched into the grid in place.
+                // The watcher polls the top level of each root, so recursive and filtered
+                // views are left to "Refresh List".
+                const WATCH_RENEW_MS = 20000;
+                let watched = null; // Last lease: { watching, roots, separator }
+                const liveUpdates = () => Object.keys(scanParams()).length === 0;
+                const renewWatch = () => {
+                    const dir = getConfigValue("directory");
+                    if (!isAlive || !dir || !liveUpdates()) {
+                        watched = null;
+                        return;
+                    }
+                    api.fetchApi("/gravity/gallery/watch", {
+                        method: "POST",
+                        headers: { "Content-Type": "application/json" },
+                        body: JSON.stringify({ directory: dir }),
+                    }).then(r => r.ok ? r.json() : null).then(data => {
+                        if (data) watched = data;
+                    }).catch(() => { });
+                };
+                const watchTimer = setInterval(renewWatch, WATCH_RENEW_MS);
+                const onDirectoryChanges = (event) => applyChanges(event.detail);
+                api.addEventListener("gravity.gallery.changes", onDirectoryChanges);
+
                 // Add Refresh Button
                 node.addWidget("button", "Refresh List", null, () => {
                     updateImageList();
@@ -210,6 +416,190 @@ app.registerExtension({
                 let renderedCount = 0;
                 let observer = null;
                 let sentinel = null;
+                let thumbObserver = null;
+                const itemElements = new Map(); // filename -> rendered grid cell
+
+                // Thumbnails that came near the viewport together are fetched with one
+                // batch request; a batch whose images all scrolled away is aborted so
+                // the server can drop the queued decodes.
+                const THUMB_BATCH_MAX = 100;
+                const pendingThumbs = new Set();
+                const inflightThumbs = new Map(); // img -> batch it is waiting on
+                let thumbFlushQueued = false;
+
+                // Load an image through its single-thumbnail URL (retries 503s, falls back to the full image)
+                const loadThumbDirect = (img) => {
+                    if (img.isConnected && !img.getAttribute("src")) img.src = img.dataset.src;
+                };
+
+                const fetchThumbBatch = async (imgs) => {
+                    const batch = { controller: new AbortController(), waiting: new Set(imgs) };
+                    for (const img of imgs) inflightThumbs.set(img, batch);
+                    try {
+                        const response = await api.fetchApi("/gravity/gallery/thumbnails", {
+                            method: "POST",
+                            headers: { "Content-Type": "application/json", "Accept": THUMB_ACCEPT },
+                            body: JSON.stringify({
+                                directory: imgs[0].dataset.dir,
+                                size: Number(imgs[0].dataset.size),
+                                filenames: imgs.map(img => img.dataset.filename),
+                            }),
+                            signal: batch.controller.signal,
+                        });
+                        if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+                        const type = response.headers.get("X-Gravity-Thumbnail-Type") || "image/jpeg";
+                        await readThumbFrames(response, (index, status, body) => {
+                            const img = imgs[index];
+                            if (!img) return;
+                            batch.waiting.delete(img);
+                            if (inflightThumbs.get(img) === batch) inflightThumbs.delete(img);
+                            if (status !== 0) {
+                                loadThumbDirect(img);
+                                return;
+                            }
+                            const blob = new Blob([body], { type });
+                            cacheThumbBlob(img.dataset.src, blob);
+                            if (img.isConnected && !img.getAttribute("src")) showThumbBlob(img, blob);
+                        });
+                    } catch (e) {
+                        if (batch.controller.signal.aborted) return;
+                        console.warn("Gravity Gallery: batch thumbnail request failed, loading one by one", e);
+                    }
+                    // Anything the stream did not deliver is loaded individually
+                    for (const img of batch.waiting) {
+                        if (inflightThumbs.get(img) === batch) inflightThumbs.delete(img);
+                        loadThumbDirect(img);
+                    }
+                };
+
+                const flushThumbs = () => {
+                    thumbFlushQueued = false;
+                    const groups = new Map(); // One request per directory and size
+                    for (const img of pendingThumbs) {
+                        if (!img.isConnected) continue;
+                        const key = `${img.dataset.dir}\n${img.dataset.size}`;
+                        if (!groups.has(key)) groups.set(key, []);
+                        groups.get(key).push(img);
+                    }
+                    pendingThumbs.clear();
+                    for (const group of groups.values()) {
+                        for (let i = 0; i < group.length; i += THUMB_BATCH_MAX) {
+                            fetchThumbBatch(group.slice(i, i + THUMB_BATCH_MAX));
+                        }
+                    }
+                };
+
+                const requestThumb = (img) => {
+                    if (img.getAttribute("src") || inflightThumbs.has(img)) return;
+                    const blob = getThumbBlob(img.dataset.src);
+                    if (blob) {
+                        showThumbBlob(img, blob);
+                        return;
+                    }
+                    pendingThumbs.add(img);
+                    if (!thumbFlushQueued) {
+                        thumbFlushQueued = true;
+                        setTimeout(flushThumbs, 0);
+                    }
+                };
+
+                const cancelThumb = (img) => {
+                    pendingThumbs.delete(img);
+                    const batch = inflightThumbs.get(img);
+                    if (!batch) return;
+                    inflightThumbs.delete(img);
+                    batch.waiting.delete(img);
+                    if (batch.waiting.size === 0) batch.controller.abort();
+                };
+
+                // The grid is being rebuilt: requests for the old cells are moot
+                const abortThumbBatches = () => {
+                    for (const batch of new Set(inflightThumbs.values())) batch.controller.abort();
+                    inflightThumbs.clear();
+                    pendingThumbs.clear();
+                };
+
+                // Calculate desired size (taking high DPI into account)
+                const thumbRequestSize = () => thumbBucketSize(Math.ceil((lastState.thumbnailSize || 100) * 1.5));
+
+                // Background pre-warming: report which files are on screen and around it
+                // so the server renders those thumbnails first, then the rest of the
+                // folder while idle. Reports are throttled and renewed with the watch lease.
+                const PREWARM_AHEAD_SCREENS = 3;
+                const PREWARM_WINDOW_MAX = 1000; // Server limit per report
+                const prewarmSession = `${node.id}-${Math.random().toString(36).slice(2)}`;
+                let prewarmTimer = null;
+
+                // Index range of currentFiles in the viewport, from the grid geometry
+                const visibleRange = () => {
+                    const first = galleryDiv.querySelector(".gravity-gallery-item-wrapper");
+                    if (!first || !first.offsetHeight) return null;
+                    const style = getComputedStyle(galleryDiv);
+                    const cols = Math.max(1, style.gridTemplateColumns.split(" ").length);
+                    const rowHeight = first.offsetHeight + (parseFloat(style.rowGap) || 0);
+                    const startRow = Math.max(0, Math.floor((galleryDiv.scrollTop - first.offsetTop) / rowHeight));
+                    const rows = Math.ceil(galleryDiv.clientHeight / rowHeight) + 1;
+                    const start = Math.min(startRow * cols, currentFiles.length);
+                    return { start, end: Math.min(currentFiles.length, start + rows * cols), perScreen: rows * cols };
+                };
+
+                const reportViewport = () => {
+                    prewarmTimer = null;
+                    const dir = getConfigValue("directory");
+                    const range = isAlive && dir ? visibleRange() : null;
+                    if (!range) return;
+                    const room = Math.max(0, Math.floor((PREWARM_WINDOW_MAX - (range.end - range.start)) / 2));
+                    const ahead = Math.min(range.perScreen * PREWARM_AHEAD_SCREENS, room);
+                    const from = Math.max(0, range.start - ahead);
+                    const to = Math.min(currentFiles.length, range.end + ahead);
+                    api.fetchApi("/gravity/gallery/prewarm", {
+                        method: "POST",
+                        headers: { "Content-Type": "application/json", "Accept": THUMB_ACCEPT },
+                        body: JSON.stringify({
+                            session: prewarmSession,
+                            directory: dir,
+                            size: thumbRequestSize(),
+                            sort: currentSort,
+                            order: sortAscending ? "asc" : "desc",
+                            ...scanParams(),
+                            window: currentFiles.slice(from, to).map(f => f.filename),
+                            visible_start: range.start - from,
+                            visible_end: range.end - from,
+                        }),
+                    }).catch(() => { });
+                };
+
+                const scheduleViewportReport = () => {
+                    if (!prewarmTimer) prewarmTimer = setTimeout(reportViewport, 250);
+                };
+                galleryDiv.addEventListener("scroll", scheduleViewportReport, { passive: true });
+                const prewarmRenewTimer = setInterval(reportViewport, WATCH_RENEW_MS);
+
+                const stopPrewarm = () => {
+                    clearTimeout(prewarmTimer);
+                    clearInterval(prewarmRenewTimer);
+                    api.fetchApi("/gravity/gallery/prewarm", {
+                        method: "POST",
+                        headers: { "Content-Type": "application/json" },
+                        body: JSON.stringify({ session: prewarmSession, stop: true }),
+                    }).catch(() => { });
+                };
+
+                // Thumbnails load only while near the viewport. Clearing src on an image
+                // that scrolled away before finishing aborts the request, so the server
+                // can drop the queued decode.
+                const createThumbObserver = () => new IntersectionObserver((entries) => {
+                    for (const entry of entries) {
+                        const img = entry.target;
+                        if (entry.isIntersecting) {
+                            requestThumb(img);
+                        } else if (img.getAttribute("src") && !img.complete) {
+                            img.removeAttribute("src");
+                        } else if (!img.getAttribute("src")) {
+                            cancelThumb(img);
+                        }
+                    }
+                }, { root: galleryDiv, rootMargin: "200px" });
 
                 // CSS Optimization for items
                 const itemStyle = `
@@ -218,49 +608,80 @@ app.registerExtension({
                     contain-intrinsic-size: 100px;
                 `;
 
+                // Build the grid cell for one file
+                const createItem = (fileData, dir) => {
+                    const f = fileData.filename;
+                    const rating = fileData.rating || 0;
+
+                    const wrapper = document.createElement("div");
+                    wrapper.className = "gravity-gallery-item-wrapper";
+                    // wrapper.style.cssText = itemStyle; // Apply CSS optimization
+
+                    const img = document.createElement("img");
+                    // lastState.thumbnailSize might be old, so we rely on CSS, but request a decent size
+                    const requestSize = thumbRequestSize();
+                    // The mtime version makes the URL change whenever the file does
+                    const version = Math.round((fileData.mtime || 0) * 1000);
+                    img.dataset.src = `/gravity/gallery/thumbnail?directory=${encodeURIComponent(dir)}&filename=${encodeURIComponent(f)}&size=${requestSize}&v=${version}`;
+                    img.dataset.dir = dir;
+                    img.dataset.filename = f;
+                    img.dataset.size = requestSize;
+                    img.className = "gravity-gallery-item";
+                    img.onerror = () => {
+                        // Server queue full (503): retry a few times once things calm down
+                        const retries = Number(img.dataset.retries || 0);
+                        if (retries < 3 && img.getAttribute("src")) {
+                            img.dataset.retries = retries + 1;
+                            setTimeout(() => {
+                                if (img.isConnected && img.getAttribute("src")) img.src = img.dataset.src;
+                            }, 1000 * (retries + 1));
+                        }
+                    };
+                    if (thumbObserver) {
+                        thumbObserver.observe(img); // src is assigned once it nears the viewport
+                    } else {
+                        requestThumb(img);
+                    }
+                    if (f === selectedFile) img.classList.add("selected");
+
+                    img.onclick = (e) => {
+                        e.stopPropagation();
+                        selectedFile = f;
+                        imageWidget.value = f;
+
+                        Array.from(galleryDiv.querySelectorAll(".gravity-gallery-item")).forEach(c => c.classList.remove("selected"));
+                        img.classList.add("selected");
+
+                        if (imageWidget.callback) imageWidget.callback(f);
+                    };
+
+                    wrapper.appendChild(img);
+
+                    if (rating > 0) {
+                        const ratingTag = document.createElement("div");
+                        ratingTag.className = "gravity-gallery-item-rating";
+                        ratingTag.innerText = "★ " + rating.toFixed(1);
+                        wrapper.appendChild(ratingTag);
+                    }
+
+                    if (fileData.duplicates > 0) {
+                        const duplicatesTag = document.createElement("div");
+                        duplicatesTag.className = "gravity-gallery-item-duplicates";
+                        duplicatesTag.innerText = "+" + fileData.duplicates;
+                        wrapper.title = `${fileData.duplicates} near-duplicate${fileData.duplicates === 1 ? "" : "s"} hidden`;
+                        wrapper.appendChild(duplicatesTag);
+                    }
+
+                    itemElements.set(f, wrapper);
+                    return wrapper;
+                };
+
                 const appendItems = (startIndex, count, dir) => {
                     const fragment = document.createDocumentFragment();
                     const limit = Math.min(startIndex + count, currentFiles.length);
 
                     for (let i = startIndex; i < limit; i++) {
-                        const fileData = currentFiles[i];
-                        const f = fileData.filename;
-                        const rating = fileData.rating || 0;
-
-                        const wrapper = document.createElement("div");
-                        wrapper.className = "gravity-gallery-item-wrapper";
-                        // wrapper.style.cssText = itemStyle; // Apply CSS optimization
-
-                        const img = document.createElement("img");
-                        // Calculate desired size (taking high DPI into account)
-                        // lastState.thumbnailSize might be old, so we rely on CSS, but request a decent size
-                        const requestSize = Math.ceil((lastState.thumbnailSize || 100) * 1.5);
-                        img.dataset.src = `/gravity/gallery/thumbnail?directory=${encodeURIComponent(dir)}&filename=${encodeURIComponent(f)}&size=${requestSize}`;
-                        img.src = img.dataset.src; // Trigger load
-                        img.loading = "lazy"; // Native lazy loading
-                        img.className = "gravity-gallery-item";
-                        if (f === selectedFile) img.classList.add("selected");
-
-                        img.onclick = (e) => {
-                            e.stopPropagation();
-                            selectedFile = f;
-                            imageWidget.value = f;
-
-                            Array.from(galleryDiv.querySelectorAll(".gravity-gallery-item")).forEach(c => c.classList.remove("selected"));
-                            img.classList.add("selected");
-
-                            if (imageWidget.callback) imageWidget.callback(f);
-                        };
-
-                        wrapper.appendChild(img);
-
-                        if (rating > 0) {
-                            const ratingTag = document.createElement("div");
-                            ratingTag.className = "gravity-gallery-item-rating";
-                            ratingTag.innerText = "★ " + rating.toFixed(1);
-                            wrapper.appendChild(ratingTag);
-                        }
-
+                        const wrapper = createItem(currentFiles[i], dir);
                         fragment.appendChild(wrapper);
                     }
 
@@ -273,6 +694,15 @@ app.registerExtension({
                     renderedCount = limit;
                 };
 
+                // The sentinel observer only fires on visibility changes; re-observing makes it
+                // report again when a batch was appended but the sentinel is still on screen
+                const recheckSentinel = () => {
+                    if (observer && sentinel) {
+                        observer.unobserve(sentinel);
+                        observer.observe(sentinel);
+                    }
+                };
+
                 // Update Gallery Content
                 const renderGallery = () => {
                     // Cleanup old observer
@@ -280,8 +710,16 @@ app.registerExtension({
                         observer.disconnect();
                         observer = null;
                     }
+                    if (thumbObserver) {
+                        thumbObserver.disconnect();
+                    }
+                    abortThumbBatches();
+                    thumbObserver = createThumbObserver();
+                    scheduleViewportReport();
 
+                    const searchHadFocus = document.activeElement === searchInput;
                     galleryDiv.innerHTML = "";
+                    itemElements.clear();
                     const dir = getConfigValue("directory");
 
                     if (!dir) {
@@ -311,6 +749,7 @@ app.registerExtension({
                             <option value="filename">Name</option>
                         </select>
                         <button class="sort-direction-btn" title="Toggle sort direction">${sortAscending ? '↑' : '↓'}</button>
+                        <button class="collapse-btn${collapseDuplicates ? ' active' : ''}">≈</button>
                     `;
 
                     // ... (Event handlers for controls - same as before) ...
@@ -329,7 +768,20 @@ app.registerExtension({
                         sortAndRender();
                     };
 
+                    const collapseBtn = controls.querySelector(".collapse-btn");
+                    collapseBtn.title = !collapseDuplicates
+                        ? "Collapse near-duplicates"
+                        : unhashedCount > 0
+                            ? `Show near-duplicates (${unhashedCount} files without a thumbnail yet are not collapsed; refresh after scrolling)`
+                            : "Show near-duplicates";
+                    collapseBtn.onclick = () => {
+                        collapseDuplicates = !collapseDuplicates;
+                        updateImageList();
+                    };
+
+                    controls.appendChild(searchInput);
                     galleryDiv.appendChild(controls);
+                    if (searchHadFocus) searchInput.focus();
 
                     // Initial Batch Render
                     renderedCount = 0;
@@ -346,43 +798,272 @@ app.registerExtension({
 
                     // Setup Observer
                     observer = new IntersectionObserver((entries) => {
-                        if (entries[0].isIntersecting && renderedCount < currentFiles.length) {
+                        if (!entries[0].isIntersecting) return;
+                        if (renderedCount < currentFiles.length) {
                             appendItems(renderedCount, BATCH_SIZE, dir);
+                            recheckSentinel();
+                        } else if (searchQuery && currentFiles.length < searchTotal) {
+                            loadMoreSearchResults(dir);
+                        } else if (!searchQuery && listCursor) {
+                            loadMoreListPage(dir);
                         }
                     }, { root: galleryDiv, rootMargin: "200px" });
 
                     observer.observe(sentinel);
                 };
 
+                const compareFiles = (a, b) => {
+                    if (currentSort === "rating") {
+                        const ratingDiff = sortAscending ? a.rating - b.rating : b.rating - a.rating;
+                        return ratingDiff !== 0 ? ratingDiff : b.mtime - a.mtime; // Secondary sort by newest
+                    }
+                    if (currentSort === "filename") {
+                        const cmp = a.filename.localeCompare(b.filename);
+                        return sortAscending ? cmp : -cmp;
+                    }
+                    return sortAscending ? a.mtime - b.mtime : b.mtime - a.mtime;
+                };
+
+                const sortLocal = (files) => {
+                    files.sort(compareFiles);
+                };
+
+                // Index at which entry belongs in an array sorted by compareFiles
+                const sortedIndex = (files, entry) => {
+                    let lo = 0, hi = files.length;
+                    while (lo < hi) {
+                        const mid = (lo + hi) >> 1;
+                        if (compareFiles(files[mid], entry) <= 0) lo = mid + 1;
+                        else hi = mid;
+                    }
+                    return lo;
+                };
+
+                // Apply a change notification from the server's directory watcher in place:
+                // only the affected cells are touched, the grid is not rebuilt.
+                const applyChanges = ({ directory, added, removed, modified }) => {
+                    const dir = getConfigValue("directory");
+                    if (!isAlive || !watched || watched.watching !== dir || !liveUpdates()) return;
+                    if (!watched.roots.includes(directory)) return;
+                    if (watched.roots.length > 1) {
+                        // Several roots list absolute filenames, as the server joins them
+                        const sep = watched.separator;
+                        const prefix = directory.endsWith(sep) || directory.endsWith("/") ? directory : directory + sep;
+                        added = added.map(e => ({ ...e, filename: prefix + e.filename }));
+                        modified = modified.map(e => ({ ...e, filename: prefix + e.filename }));
+                        removed = removed.map(name => prefix + name);
+                    }
+                    if (collapseDuplicates) {
+                        // Clusters are the server's; fetch them again once changes settle
+                        clearTimeout(collapsedRefreshTimer);
+                        collapsedRefreshTimer = setTimeout(() => {
+                            if (isAlive && collapseDuplicates) updatePagedList(getConfigValue("directory"), ++listSeq);
+                        }, 1000);
+                        return;
+                    }
+
+                    // Modified files are taken out and re-inserted, as their sort position may change
+                    const incoming = added.concat(modified).map(toFileEntry);
+                    const gone = new Set(removed.concat(modified.map(e => e.filename)));
+                    const known = new Set(allFiles.map(f => f.filename));
+                    const showsAll = currentFiles === allFiles;
+
+                    if (gone.size) {
+                        // Search results keep modified files where they are
+                        const goneFromView = showsAll ? gone : new Set(removed);
+                        for (const name of goneFromView) {
+                            const el = itemElements.get(name);
+                            if (el) {
+                                el.remove();
+                                itemElements.delete(name);
+                                renderedCount--;
+                            }
+                        }
+                        allFiles = allFiles.filter(f => !gone.has(f.filename));
+                        currentFiles = showsAll ? allFiles : currentFiles.filter(f => !goneFromView.has(f.filename));
+                    }
+
+                    for (const entry of incoming) {
+                        // Skip files a listing in progress already delivered
+                        if (known.has(entry.filename) && !gone.has(entry.filename)) continue;
+                        const index = sortedIndex(allFiles, entry);
+                        allFiles.splice(index, 0, entry);
+                        if (!showsAll) continue; // Search results are left as they are
+
+                        // Render it only if it lands inside the already rendered range
+                        const everythingRendered = renderedCount >= currentFiles.length - 1;
+                        if (index < renderedCount || everythingRendered) {
+                            const next = currentFiles[index + 1];
+                            const before = (next && itemElements.get(next.filename)) || sentinel;
+                            const wrapper = createItem(entry, dir);
+                            if (before && before.parentNode === galleryDiv) {
+                                galleryDiv.insertBefore(wrapper, before);
+                            } else {
+                                galleryDiv.appendChild(wrapper);
+                            }
+                            renderedCount++;
+                        }
+                    }
+                    setWidgetValues();
+                };
+
                 const sortAndRender = () => {
-                    if (currentSort === "mtime") {
-                        currentFiles.sort((a, b) => sortAscending ? a.mtime - b.mtime : b.mtime - a.mtime);
-                    } else if (currentSort === "rating") {
-                        currentFiles.sort((a, b) => {
-                            const ratingDiff = sortAscending ? a.rating - b.rating : b.rating - a.rating;
-                            return ratingDiff !== 0 ? ratingDiff : b.mtime - a.mtime; // Secondary sort by newest
-                        });
-                    } else if (currentSort === "filename") {
-                        currentFiles.sort((a, b) => {
-                            const cmp = a.filename.localeCompare(b.filename);
-                            return sortAscending ? cmp : -cmp;
-                        });
+                    if (!searchQuery && (listCursor || collapseDuplicates)) {
+                        // Only part of a paged listing is loaded, or the order decides which
+                        // image stands for each cluster: let the server sort it
+                        updatePagedList(getConfigValue("directory"), ++listSeq);
+                        return;
                     }
+                    sortLocal(currentFiles);
                     renderGallery();
                 };
 
+                // Fallback when streaming is unavailable: the listing is fetched a page
+                // at a time, already sorted by the server
+                const LIST_PAGE_SIZE = 200;
+                let listCursor = null;
+                let listSeq = 0;
+                let listLoading = false;
+                let collapsedRefreshTimer = null;
+
+                const fetchListPage = async (dir, cursor) => {
+                    const params = new URLSearchParams({
+                        directory: dir,
+                        sort: currentSort,
+                        order: sortAscending ? "asc" : "desc",
+                        limit: LIST_PAGE_SIZE,
+                        ...scanParams(),
+                    });
+                    if (cursor) params.set("cursor", cursor);
+                    if (collapseDuplicates) params.set("collapse", "1");
+                    const response = await api.fetchApi(`/gravity/gallery/list?${params}`);
+                    return await response.json();
+                };
+
+                const setWidgetValues = () => {
+                    const names = allFiles.map(f => f.filename);
+                    if (selectedFile && !names.includes(selectedFile)) names.push(selectedFile);
+                    imageWidget.options.values = names;
+                };
+
+                // Read an NDJSON response, calling onLines with each chunk's parsed lines.
+                // onLines returns false to stop reading.
+                const readNdjson = async (response, onLines) => {
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffered = "";
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffered += decoder.decode(value, { stream: true });
+                        const parts = buffered.split("\n");
+                        buffered = parts.pop();
+                        const lines = parts.filter(l => l.trim()).map(l => JSON.parse(l));
+                        if (lines.length && onLines(lines) === false) {
+                            reader.cancel();
+                            return;
+                        }
+                    }
+                    if (buffered.trim()) onLines([JSON.parse(buffered)]);
+                };
+
+                // Stream the listing so the first thumbnails show while a big (or slow,
+                // network-mounted) directory is still being scanned; sort once complete.
                 const updateImageList = async () => {
                     const dir = getConfigValue("directory");
                     if (!dir) return;
+                    const seq = ++listSeq;
+                    if (collapseDuplicates) {
+                        // Only the paged listing can collapse near-duplicates
+                        await updatePagedList(dir, seq);
+                        return;
+                    }
+
+                    let response;
+                    try {
+                        const params = new URLSearchParams({
+                            directory: dir,
+                            sort: currentSort,
+                            order: sortAscending ? "asc" : "desc",
+                            ...scanParams(),
+                        });
+                        response = await api.fetchApi(`/gravity/gallery/list/stream?${params}`);
+                    } catch (e) {
+                        response = null;
+                    }
+                    const isStream = response && response.ok && response.body &&
+                        (response.headers.get("Content-Type") || "").includes("ndjson");
+                    if (!isStream) {
+                        await updatePagedList(dir, seq);
+                        return;
+                    }
+                    if (seq !== listSeq) return;
 
+                    allFiles = [];
+                    listCursor = null;
+                    if (!searchQuery) {
+                        currentFiles = allFiles;
+                        renderGallery();
+                    }
+
+                    try {
+                        let complete = false;
+                        let sorted = false; // The server sends a listing it already holds in order
+                        await readNdjson(response, (lines) => {
+                            if (seq !== listSeq) return false; // Superseded by a newer refresh
+                            for (const line of lines) {
+                                if (line.filename !== undefined) {
+                                    allFiles.push(toFileEntry(line));
+                                } else if (line.error) {
+                                    console.error("Gravity Gallery listing error:", line.error);
+                                } else if (line.done) {
+                                    complete = true;
+                                    sorted = !!line.sorted;
+                                }
+                            }
+                            // Fill the first screen as soon as entries arrive; further batches
+                            // are appended by the infinite-scroll sentinel
+                            if (!searchQuery && renderedCount < BATCH_SIZE) {
+                                appendItems(renderedCount, BATCH_SIZE - renderedCount, dir);
+                                recheckSentinel();
+                            }
+                        });
+                        if (seq !== listSeq) return;
+                        if (!complete) console.warn("Gravity Gallery: listing stream ended early");
+                        renewWatch();
+
+                        setWidgetValues();
+                        if (searchQuery) {
+                            runSearch();
+                        } else if (!sorted) {
+                            // Streamed as scanned: the grid so far is in scan order
+                            sortLocal(allFiles);
+                            renderGallery();
+                        }
+                    } catch (e) {
+                        console.error("Error streaming gallery list", e);
+                        galleryDiv.textContent = "Error loading files";
+                    }
+                };
+
+                const updatePagedList = async (dir, seq) => {
+                    if (!dir) return;
                     try {
-                        const response = await api.fetchApi(`/gravity/gallery/list?directory=${encodeURIComponent(dir)}`);
-                        const data = await response.json();
+                        const data = await fetchListPage(dir, null);
+                        if (seq !== listSeq) return; // Superseded by a newer refresh or sort
 
                         if (data.files) {
-                            currentFiles = data.files;
-                            imageWidget.options.values = data.files.map(f => typeof f === 'string' ? f : f.filename);
-                            sortAndRender();
+                            allFiles = data.files.map(toFileEntry);
+                            listCursor = data.next_cursor || null;
+                            unhashedCount = data.unhashed || 0;
+                            setWidgetValues();
+                            renewWatch();
+                            if (searchQuery) {
+                                runSearch();
+                            } else {
+                                currentFiles = allFiles;
+                                renderGallery();
+                            }
                         }
                     } catch (e) {
                         console.error("Error fetching gallery list", e);
@@ -390,6 +1071,28 @@ app.registerExtension({
                     }
                 };
 
+                const loadMoreListPage = async (dir) => {
+                    if (listLoading || !listCursor) return;
+                    listLoading = true;
+                    const seq = listSeq;
+                    try {
+                        const data = await fetchListPage(dir, listCursor);
+                        if (seq !== listSeq || !data.files) return;
+                        allFiles = allFiles.concat(data.files.map(toFileEntry));
+                        listCursor = data.next_cursor || null;
+                        setWidgetValues();
+                        if (!searchQuery) {
+                            currentFiles = allFiles;
+                            appendItems(renderedCount, BATCH_SIZE, dir);
+                            recheckSentinel();
+                        }
+                    } catch (e) {
+                        console.error("Error loading more gallery files", e);
+                    } finally {
+                        listLoading = false;
+                    }
+                };
+
                 const syncGallery = () => {
                     requestAnimationFrame(syncGallery);
 
@@ -516,6 +1219,17 @@ app.registerExtension({
                         updateImageList();
                     };
 
+                    // Listing options change which files are shown
+                    for (const name of ["recursive", "max_depth", "exclude"]) {
+                        const widget = getWidget(name);
+                        if (!widget) continue;
+                        const originalCallback = widget.callback;
+                        widget.callback = function () {
+                            if (originalCallback) originalCallback.apply(this, arguments);
+                            updateImageList();
+                        };
+                    }
+
                     // Hijack callback of size widget to trigger redraw
                     const sizeWidget = getWidget("thumbnail_size");
                     const originalSizeCallback = sizeWidget.callback;
@@ -0,0 +1,123 @@
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class PoolBusy(Exception):
+    """Raised when the pending queue of a WorkerPool is full."""
+
+
+class _Job:
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.started = False
+        self.alive_checks = []
+
+    def abandoned(self):
+        if self.waiters == 0:
+            return True
+        # Handlers are not always cancelled when the client goes away, so also
+        # ask each waiter whether its connection is still open
+        if self.alive_checks:
+            return not any(check() for check in self.alive_checks)
+        return False
+
+
+class WorkerPool:
+    """
+    Runs blocking work off the aiohttp event loop on a bounded executor.
+
+    Jobs are identified by a key: a request for a key that is already queued
+    or running waits on the existing job instead of starting a new one. A job
+    whose waiters have all gone away before it reached a worker is dropped.
+    """
+
+    def __init__(self, max_workers, max_pending, use_processes=False):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self.use_processes = use_processes
+        self.submitted = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._executor = None
+        self._slots = None
+        self._inflight = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gravity-gallery")
+        return self._executor
+
+    def _get_slots(self):
+        # Created lazily so the semaphore binds to the running server loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._slots
+
+    async def _execute(self, key, job, fn, args, on_done):
+        try:
+            async with self._get_slots():
+                if job.abandoned():
+                    self.cancelled += 1
+                    raise asyncio.CancelledError()
+                job.started = True
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._get_executor(), fn, *args)
+            # Outside the slot, so a slow on_done doesn't hold up the next job
+            if on_done is not None:
+                done = on_done(result)
+                if inspect.isawaitable(done):
+                    await done
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def run(self, key, fn, *args, on_done=None, is_alive=None):
+        """
+        Run fn(*args) on the pool and return its result. on_done is called
+        once on the event loop with the result, however many requests were
+        coalesced onto the job; if it returns an awaitable, the job (and its
+        waiters) finish once that is done. is_alive lets a caller report that its client
+        disconnected so queued work can be skipped.
+        """
+        job = self._inflight.get(key)
+        if job is None:
+            if len(self._inflight) >= self.max_pending:
+                self.rejected += 1
+                raise PoolBusy(f"{len(self._inflight)} jobs pending")
+            job = _Job()
+            self._inflight[key] = job
+            job.task = asyncio.ensure_future(self._execute(key, job, fn, args, on_done))
+            self.submitted += 1
+        else:
+            self.coalesced += 1
+
+        job.waiters += 1
+        if is_alive is not None:
+            job.alive_checks.append(is_alive)
+        try:
+            return await asyncio.shield(job.task)
+        finally:
+            job.waiters -= 1
+            if is_alive is not None:
+                job.alive_checks.remove(is_alive)
+            if job.waiters == 0 and not job.started and not job.task.done():
+                job.task.cancel()
+                self.cancelled += 1
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "processes": self.use_processes,
+            "pending": len(self._inflight),
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }